@@ -0,0 +1,84 @@
+"""Wire format for observation events shared by the game loop and modules B and C.
+
+Two content types are supported:
+
+- application/msgpack: msgpack, with numpy arrays carried as an extension
+  type holding a small struct header (dtype string, ndim, uint32 shape)
+  followed by the raw little-endian buffer. Decoded arrays
+  are read-only views over the received bytes (no copy).
+- application/json: the previous format. numpy arrays are converted with
+  `.tolist()`, so dtype and shape are lost.
+"""
+import json
+import struct
+
+import msgpack
+import numpy as np
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, JSON_CONTENT_TYPE)
+
+_NDARRAY_EXT = 1
+
+
+def _pack_default(obj):
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            raise TypeError("Cannot encode numpy arrays with dtype=object")
+        array = obj.astype(obj.dtype.newbyteorder("<"), order="C", copy=False)
+        dtype = array.dtype.str.encode()
+        header = struct.pack(f"<B{len(dtype)}sB{array.ndim}I", len(dtype), dtype, array.ndim, *array.shape)
+        return msgpack.ExtType(_NDARRAY_EXT, header + array.tobytes())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot encode object of type {type(obj).__name__}")
+
+
+def _ext_hook(code, data):
+    if code != _NDARRAY_EXT:
+        return msgpack.ExtType(code, data)
+    dtype_length = data[0]
+    dtype = data[1:1 + dtype_length].decode()
+    ndim = data[1 + dtype_length]
+    offset = 2 + dtype_length + 4 * ndim
+    shape = struct.unpack_from(f"<{ndim}I", data, 2 + dtype_length)
+    return np.frombuffer(data, dtype=dtype, offset=offset).reshape(shape)
+
+
+def _json_default(obj):
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def normalize_content_type(content_type):
+    """Strip parameters from a Content-Type value, defaulting to JSON."""
+    if not content_type:
+        return JSON_CONTENT_TYPE
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def encode(obj, content_type=MSGPACK_CONTENT_TYPE):
+    content_type = normalize_content_type(content_type)
+    if content_type == MSGPACK_CONTENT_TYPE:
+        return msgpack.packb(obj, default=_pack_default, use_bin_type=True)
+    if content_type == JSON_CONTENT_TYPE:
+        return json.dumps(obj, default=_json_default, separators=(",", ":")).encode()
+    raise ValueError(f"Unsupported content type: {content_type}")
+
+
+def decode(body, content_type=MSGPACK_CONTENT_TYPE):
+    content_type = normalize_content_type(content_type)
+    if content_type == MSGPACK_CONTENT_TYPE:
+        return msgpack.unpackb(body, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+    if content_type == JSON_CONTENT_TYPE:
+        return json.loads(body)
+    raise ValueError(f"Unsupported content type: {content_type}")
+
+
+def negotiate(accept):
+    """Pick the response content type from an Accept header (JSON unless msgpack is asked for)."""
+    if accept and MSGPACK_CONTENT_TYPE in accept:
+        return MSGPACK_CONTENT_TYPE
+    return JSON_CONTENT_TYPE
@@ -0,0 +1,40 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from starlette.requests import ClientDisconnect
+
+from common import codec
+from common.timing import measure_serialization
+
+
+def decoded_body(expected_type):
+    """FastAPI dependency decoding the request body according to its Content-Type.
+
+    Replaces FastAPI's JSON-only body parsing so endpoints accept both JSON and
+    msgpack. Bodies that do not decode to `expected_type` are rejected with 422.
+    """
+    async def dependency(request: Request):
+        content_type = codec.normalize_content_type(request.headers.get("content-type"))
+        if content_type not in codec.CONTENT_TYPES:
+            raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+        try:
+            raw = await request.body()
+        except ClientDisconnect:
+            # The caller gave up, e.g. a cancelled hedge; nobody reads the answer.
+            raise HTTPException(status_code=499, detail="Client closed the request")
+        try:
+            with measure_serialization():
+                body = codec.decode(raw, content_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed {content_type} body: {e}")
+        if not isinstance(body, expected_type):
+            raise HTTPException(status_code=422, detail=f"Expected a {expected_type.__name__} body")
+        return body
+    return dependency
+
+
+def encoded_response(request, payload, status_code=200):
+    """Encode `payload` in the content type the client's Accept header asks for."""
+    content_type = codec.negotiate(request.headers.get("accept"))
+    with measure_serialization():
+        body = codec.encode(payload, content_type)
+    return Response(body, status_code=status_code, media_type=content_type)
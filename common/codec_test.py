@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+
+from common import codec
+from common.codec_http import decoded_body, encoded_response
+
+
+def test_msgpack_round_trips_arrays_with_dtype_and_shape():
+    observation = {
+        "left_team": np.arange(22, dtype=np.float32).reshape(11, 2),
+        "left_team_roles": np.arange(11, dtype=np.int64),
+        "sticky_actions": np.array([0, 1, 0], dtype=np.uint8),
+        "score": [np.int64(1), 2],
+        "game_mode": 0,
+    }
+    decoded = codec.decode(codec.encode(observation))
+    for key in ("left_team", "left_team_roles", "sticky_actions"):
+        assert decoded[key].dtype == observation[key].dtype
+        np.testing.assert_array_equal(decoded[key], observation[key])
+    assert decoded["score"] == [1, 2]
+    assert decoded["game_mode"] == 0
+
+
+def test_big_endian_arrays_are_sent_little_endian():
+    array = np.arange(4, dtype=">i4")
+    decoded = codec.decode(codec.encode(array))
+    assert decoded.dtype == np.dtype("<i4")
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_json_fallback_converts_arrays_to_lists():
+    body = codec.encode({"ball": np.array([0.5, 0.0])}, "application/json; charset=utf-8")
+    assert json.loads(body) == {"ball": [0.5, 0.0]}
+    assert codec.decode(body, codec.JSON_CONTENT_TYPE) == {"ball": [0.5, 0.0]}
+
+
+def test_object_arrays_and_unknown_content_types_are_rejected():
+    with pytest.raises(TypeError):
+        codec.encode(np.array([object()]))
+    with pytest.raises(ValueError):
+        codec.encode({}, "text/plain")
+
+
+def test_negotiate_prefers_json_unless_msgpack_is_asked_for():
+    assert codec.negotiate(None) == codec.JSON_CONTENT_TYPE
+    assert codec.negotiate("application/msgpack, application/json") == codec.MSGPACK_CONTENT_TYPE
+
+
+app = FastAPI()
+
+
+@app.post("/echo")
+async def echo(request: Request, body: dict = Depends(decoded_body(dict))):
+    return encoded_response(request, body)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_decoded_body_accepts_both_formats_and_answers_as_asked(client):
+    body = codec.encode({"ball": np.array([1.0, 2.0])})
+    response = client.post("/echo", content=body, headers={"content-type": codec.MSGPACK_CONTENT_TYPE,
+                                                             "accept": codec.MSGPACK_CONTENT_TYPE})
+    assert response.headers["content-type"] == codec.MSGPACK_CONTENT_TYPE
+    np.testing.assert_array_equal(codec.decode(response.content)["ball"], [1.0, 2.0])
+    assert client.post("/echo", json={"ball": [1.0]}).json() == {"ball": [1.0]}
+
+
+def test_decoded_body_rejects_bad_bodies(client):
+    assert client.post("/echo", content=b"x", headers={"content-type": "text/plain"}).status_code == 415
+    assert client.post("/echo", content=b"\xc1", headers={"content-type": codec.MSGPACK_CONTENT_TYPE}).status_code == 400
+    assert client.post("/echo", json=[1, 2]).status_code == 422
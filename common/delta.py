@@ -0,0 +1,110 @@
+"""Delta encoding for per-match observation streams.
+
+The sender ships a keyframe holding every field every `keyframe_interval`
+steps and, in between, only the fields whose value changed since the previous
+step. Receivers rebuild the full observation per match. Each message carries a
+sequence number; a delta that does not directly follow the last message the
+receiver saw raises `KeyframeRequired`, and the sender should answer by calling
+`DeltaEncoder.force_keyframe()`. A message that is not a keyframe or delta
+raises ValueError.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+class KeyframeRequired(Exception):
+    """The receiver cannot apply a delta and needs a fresh keyframe."""
+
+
+def values_equal(a, b):
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        # Observation arrays are tiny; comparing raw bytes beats np.array_equal.
+        return (isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and
+                a.dtype == b.dtype and a.shape == b.shape and a.tobytes() == b.tobytes())
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(values_equal(x, y) for x, y in zip(a, b))
+    return type(a) is type(b) and a == b
+
+
+class DeltaEncoder:
+    """Turns consecutive observations of one match into keyframe/delta messages.
+
+    Observations must not be mutated after they are passed to `encode`, since
+    the encoder keeps them as the base for the next delta.
+    """
+
+    def __init__(self, keyframe_interval=50):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.keyframe_interval = keyframe_interval
+        self._seq = 0
+        self._previous = None
+        self._since_keyframe = 0
+
+    def force_keyframe(self):
+        self._previous = None
+
+    def encode(self, observation):
+        self._seq += 1
+        if self._previous is None or self._since_keyframe + 1 >= self.keyframe_interval:
+            self._previous = observation
+            self._since_keyframe = 0
+            return {"type": "key", "seq": self._seq, "fields": dict(observation)}
+        previous = self._previous
+        changed = {key: value for key, value in observation.items()
+                   if key not in previous or not values_equal(value, previous[key])}
+        removed = [key for key in previous if key not in observation]
+        self._previous = observation
+        self._since_keyframe += 1
+        message = {"type": "delta", "seq": self._seq, "fields": changed}
+        if removed:
+            message["removed"] = removed
+        return message
+
+
+class DeltaDecoder:
+    """Rebuilds full observations from one match's keyframe/delta messages."""
+
+    def __init__(self):
+        self._seq = None
+        self._state = None
+
+    def decode(self, message):
+        if not isinstance(message, dict) or "seq" not in message or not isinstance(message.get("fields"), dict):
+            raise ValueError("Delta messages need a seq and a fields mapping")
+        if message.get("type") == "key":
+            self._state = dict(message["fields"])
+        elif message.get("type") == "delta":
+            if self._state is None or message["seq"] != self._seq + 1:
+                self._state = None
+                raise KeyframeRequired(f"Cannot apply delta {message['seq']} after {self._seq}")
+            self._state = {**self._state, **message["fields"]}
+            for key in message.get("removed", ()):
+                self._state.pop(key, None)
+        else:
+            raise ValueError(f"Unknown delta message type: {message.get('type')!r}")
+        self._seq = message["seq"]
+        return self._state
+
+
+class DeltaStreams:
+    """One DeltaDecoder per match, keeping at most `max_matches` least recently used."""
+
+    def __init__(self, max_matches=10000):
+        self.max_matches = max_matches
+        self.keyframes_required = 0
+        self._decoders = OrderedDict()
+
+    def decode(self, match_id, message):
+        decoder = self._decoders.pop(match_id, None) or DeltaDecoder()
+        self._decoders[match_id] = decoder
+        while len(self._decoders) > self.max_matches:
+            self._decoders.popitem(last=False)
+        try:
+            return decoder.decode(message)
+        except KeyframeRequired:
+            self.keyframes_required += 1
+            raise
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from common.delta import DeltaDecoder, DeltaEncoder, DeltaStreams, KeyframeRequired, values_equal
+
+
+def observations(count):
+    for step in range(count):
+        yield {"ball": np.array([step / 100, 0.0, 0.1]), "roles": np.arange(11), "score": [0, step // 5],
+               "steps_left": 3000 - step}
+
+
+def test_decoder_rebuilds_every_observation():
+    encoder, decoder = DeltaEncoder(keyframe_interval=4), DeltaDecoder()
+    kinds = []
+    for observation in observations(10):
+        message = encoder.encode(observation)
+        kinds.append(message["type"])
+        decoded = decoder.decode(message)
+        assert decoded.keys() == observation.keys()
+        assert all(values_equal(decoded[key], observation[key]) for key in observation)
+    assert kinds == ["key", "delta", "delta", "delta"] * 2 + ["key", "delta"]
+
+
+def test_deltas_only_carry_changed_and_removed_fields():
+    encoder = DeltaEncoder()
+    encoder.encode({"a": 1, "b": np.array([1, 2]), "c": 3})
+    message = encoder.encode({"a": 1, "b": np.array([1, 3])})
+    assert set(message["fields"]) == {"b"}
+    assert message["removed"] == ["c"]
+
+
+def test_gap_requires_a_keyframe_until_one_arrives():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    first, second, third, fourth = (encoder.encode(o) for o in observations(4))
+    decoder.decode(first)
+    with pytest.raises(KeyframeRequired):
+        decoder.decode(third)
+    # The decoder dropped its state: even the next delta in sequence is refused.
+    with pytest.raises(KeyframeRequired):
+        decoder.decode(fourth)
+    encoder.force_keyframe()
+    message = encoder.encode({"steps_left": 1})
+    assert message["type"] == "key"
+    assert decoder.decode(message) == {"steps_left": 1}
+
+
+def test_streams_keep_one_decoder_per_match_and_count_resyncs():
+    streams = DeltaStreams(max_matches=2)
+    encoders = {match: DeltaEncoder() for match in "ab"}
+    for observation in observations(3):
+        for match, encoder in encoders.items():
+            assert streams.decode(match, encoder.encode(observation))["steps_left"] == observation["steps_left"]
+    with pytest.raises(KeyframeRequired):
+        streams.decode("c", {"type": "delta", "seq": 5, "fields": {}})
+    assert streams.keyframes_required == 1
+
+
+@pytest.mark.parametrize("message", [
+    {"type": "patch", "seq": 0, "fields": {}},
+    {"type": "key", "fields": {}},
+    {"type": "key", "seq": 0},
+    "key",
+])
+def test_malformed_messages_raise_value_error(message):
+    with pytest.raises(ValueError):
+        DeltaDecoder().decode(message)
+
+
+def test_values_equal_compares_arrays_by_content_and_dtype():
+    assert values_equal(np.array([1, 2]), np.array([1, 2]))
+    assert not values_equal(np.array([1, 2]), np.array([1.0, 2.0]))
+    assert not values_equal(np.array([1, 2]), [1, 2])
+    assert values_equal([1, (2, 3)], [1, [2, 3]])
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from urllib.parse import quote, unquote, urlsplit
+
+import websockets
+
+from common.local import LocalWebSocket, local_app
+
+
+UNIX_WS_SCHEME = "ws+unix://"
+
+
+def to_ws_url(url):
+    """Turn a module's http(s) base URL into the matching ws(s) URL.
+
+    A unix:///path/to/socket URL becomes ws+unix:// with the percent-encoded
+    socket path as its host, so that paths can still be appended to it.
+    """
+    if url.startswith("unix://"):
+        return UNIX_WS_SCHEME + quote(url[len("unix://"):], safe="")
+    if url.startswith("https://"):
+        return "wss://" + url[len("https://"):]
+    if url.startswith("http://"):
+        return "ws://" + url[len("http://"):]
+    return url
+
+
+class EventStream:
+    """Client side of a windowed WebSocket event stream.
+
+    Each payload is sent as {"seq": n, "data": payload} and the peer answers
+    with {"type": "ack", "seq": n}. At most `window` messages may be
+    unacknowledged at once, so a slow peer pushes back on the sender instead of
+    letting messages pile up in socket buffers. Every other message the peer
+    pushes is handed to the async `on_message` callback.
+    """
+
+    def __init__(self, url, window=64, on_message=None):
+        self.url = url
+        self.window = window
+        self.on_message = on_message
+        self.closed = False
+        self._seq = 0
+        self._credits = asyncio.Semaphore(window)
+        self._ws = None
+        self._reader = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        """Open the stream; raises ConnectionError if the peer cannot be reached or refuses it."""
+        try:
+            app = local_app(self.url)
+            if app is not None:
+                self._ws = await LocalWebSocket(app, self.url).connect()
+            elif self.url.startswith(UNIX_WS_SCHEME):
+                parts = urlsplit(self.url)
+                self._ws = await websockets.unix_connect(unquote(parts.netloc), uri=f"ws://localhost{parts.path}")
+            else:
+                self._ws = await websockets.connect(self.url)
+        except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake, websockets.InvalidURI) as e:
+            self.closed = True
+            raise ConnectionError(f"Cannot open event stream to {self.url}: {e}") from e
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        self.closed = True
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def send(self, payload):
+        """Send `payload` once the window has room and return its sequence number.
+
+        Raises ConnectionError straight away once the stream is closed, and
+        wakes senders waiting for credit when it closes under them.
+        """
+        if self.closed:
+            raise ConnectionError(f"Event stream to {self.url} is closed")
+        await self._credits.acquire()
+        if self.closed:
+            # Hand the wake-up on to the next waiting sender.
+            self._credits.release()
+            raise ConnectionError(f"Event stream to {self.url} is closed")
+        self._seq += 1
+        try:
+            await self._ws.send(json.dumps({"seq": self._seq, "data": payload}))
+        except websockets.ConnectionClosed as e:
+            self.closed = True
+            self._credits.release()
+            raise ConnectionError(f"Event stream to {self.url} is closed") from e
+        return self._seq
+
+    async def _read(self):
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if message.get("type") == "ack":
+                    self._credits.release()
+                elif self.on_message is not None:
+                    await self.on_message(message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.closed = True
+            # Wake a sender still waiting for credit; each one wakes the next.
+            self._credits.release()
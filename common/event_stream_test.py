@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from common.event_stream import EventStream, to_ws_url
+from common.local import register_local_app, unregister_local_app
+
+BASE_URL = "http://event-stream-test"
+
+app = FastAPI()
+
+
+@app.websocket("/acks")
+async def acks(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_json()
+            await websocket.send_json({"type": "echo", "data": message["data"]})
+            await websocket.send_json({"type": "ack", "seq": message["seq"]})
+    except WebSocketDisconnect:
+        pass
+
+
+@app.websocket("/hang_up_after/{count}")
+async def hang_up_after(websocket: WebSocket, count: int):
+    await websocket.accept()
+    for _ in range(count):
+        await websocket.receive_json()
+    await websocket.close()
+
+
+@pytest.fixture(autouse=True)
+def local_app():
+    register_local_app(BASE_URL, app)
+    yield
+    unregister_local_app(BASE_URL)
+
+
+def test_to_ws_url():
+    assert to_ws_url("http://host:8002") == "ws://host:8002"
+    assert to_ws_url("https://host") == "wss://host"
+    assert to_ws_url("unix:///tmp/c.sock") == "ws+unix://%2Ftmp%2Fc.sock"
+
+
+def test_acked_messages_free_the_window_and_others_reach_on_message():
+    received = []
+
+    async def on_message(message):
+        received.append(message["data"])
+
+    async def main():
+        async with EventStream(to_ws_url(BASE_URL) + "/acks", window=2, on_message=on_message) as stream:
+            seqs = [await asyncio.wait_for(stream.send(n), 1) for n in range(10)]
+            while len(received) < 10:
+                await asyncio.sleep(0.001)
+        return seqs
+
+    assert asyncio.run(main()) == list(range(1, 11))
+    assert received == list(range(10))
+
+
+def test_send_fails_fast_after_close():
+    async def main():
+        stream = EventStream(to_ws_url(BASE_URL) + "/acks", window=2)
+        await stream.connect()
+        await stream.close()
+        for n in range(5):
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(stream.send(n), 1)
+
+    asyncio.run(main())
+
+
+def test_senders_waiting_for_credit_are_woken_when_the_peer_hangs_up():
+    async def main():
+        stream = EventStream(to_ws_url(BASE_URL) + "/hang_up_after/2", window=2)
+        await stream.connect()
+        await stream.send(0)
+        await stream.send(1)
+        # The peer never acks: these wait for credit until it hangs up.
+        waiting = [asyncio.create_task(stream.send(n)) for n in range(2, 6)]
+        results = await asyncio.wait_for(asyncio.gather(*waiting, return_exceptions=True), 1)
+        await stream.close()
+        return results
+
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(main()))
+
+
+def test_connect_failure_raises_connection_error():
+    async def main():
+        with pytest.raises(ConnectionError):
+            await EventStream("ws://127.0.0.1:9/comments/stream/m").connect()
+
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+"""Consistent hashing, used to assign matches to module B shards and module C replicas."""
+import bisect
+import hashlib
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto shards.
+
+    Each shard is placed at `points` pseudo-random positions on a 64-bit ring
+    and a key belongs to the first shard position at or after the key's hash.
+    Adding or removing a shard only moves the keys next to its positions.
+    """
+
+    def __init__(self, shards, points=64):
+        if not shards:
+            raise ValueError("HashRing needs at least one shard")
+        ring = sorted((_hash(f"{shard}#{point}"), shard) for shard in shards for point in range(points))
+        self._hashes = [position for position, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard(self, key):
+        index = bisect.bisect_left(self._hashes, _hash(key))
+        return self._shards[index % len(self._shards)]
@@ -0,0 +1,30 @@
+from collections import Counter
+
+import pytest
+
+from common.hash_ring import HashRing
+
+
+def test_keys_map_to_the_same_shard_every_time():
+    ring = HashRing(range(4))
+    assert [ring.shard(f"match-{n}") for n in range(100)] == [HashRing(range(4)).shard(f"match-{n}")
+                                                              for n in range(100)]
+
+
+def test_keys_spread_over_all_shards():
+    ring = HashRing(range(4))
+    counts = Counter(ring.shard(f"match-{n}") for n in range(4000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 500
+
+
+def test_adding_a_shard_only_moves_keys_onto_it():
+    before, after = HashRing(range(4)), HashRing(range(5))
+    moved = [n for n in range(4000) if before.shard(f"match-{n}") != after.shard(f"match-{n}")]
+    assert all(after.shard(f"match-{n}") == 4 for n in moved)
+    assert len(moved) < 4000 // 3
+
+
+def test_needs_a_shard():
+    with pytest.raises(ValueError):
+        HashRing([])
@@ -0,0 +1,130 @@
+"""Calls over downstream replicas, with optional request hedging.
+
+Calls go to replicas round-robin, or, given a key, always to the replica the
+key hashes to (`Replicas.replica`), so one match's calls reach one replica in
+order and its retries find the result of an earlier attempt there.
+
+With hedging on, a call that has not completed within the observed latency
+percentile of recent calls (HEDGE_PERCENTILE, default 0.95) is sent again to
+the next replica, and whichever finishes first wins; the other is cancelled.
+Until enough calls have been observed there is no estimate and nothing is
+hedged. Hedges draw from a `RetryBudget` of HEDGE_BUDGET_RATIO per call
+(default 0.1), so a slow downstream never sees more than that extra load.
+
+Hedged calls must be safe to repeat: callers send the same Idempotency-Key
+header on both copies so the downstream can process the request once. The
+hedge reaches a different replica, so that only holds when the replicas share
+their idempotency store (module C's IDEMPOTENCY_DIR). Each
+copy runs as a task with its own request timing (`create_timed_task`); only
+the copy whose answer is used counts towards the caller's downstream time.
+"""
+import asyncio
+import time
+from collections import deque
+
+from common.hash_ring import HashRing
+from common.metrics import Counter
+from common.resilience import RetryBudget
+from common.timing import account, create_timed_task
+
+HEDGES = Counter("http_client_hedges_total", "Hedged calls, by downstream and outcome (sent, won, no_budget).",
+                 ("downstream", "outcome"))
+
+
+class LatencyTracker:
+    """Sliding window of call latencies with a cached percentile estimate."""
+
+    def __init__(self, percentile=0.95, window=1000, min_samples=50, refresh_every=50):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._samples = deque(maxlen=window)
+        self._since_refresh = 0
+        self._estimate = None
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh_every and len(self._samples) >= self.min_samples:
+            self._since_refresh = 0
+            ordered = sorted(self._samples)
+            self._estimate = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def estimate(self):
+        return self._estimate
+
+
+class Replicas:
+    """Spreads calls over `clients`, hedging slow ones when `hedge` is set."""
+
+    def __init__(self, clients, downstream, hedge=False, percentile=0.95, min_delay=0.001, budget_ratio=0.1):
+        if not clients:
+            raise ValueError("At least one replica client is required")
+        self.clients = list(clients)
+        self.downstream = downstream
+        self.hedge = hedge
+        self.min_delay = min_delay
+        self.latency = LatencyTracker(percentile)
+        self.budget = RetryBudget(ratio=budget_ratio, min_per_second=1.0, max_tokens=10.0)
+        self._next = 0
+        self._ring = HashRing(list(range(len(self.clients))))
+
+    @property
+    def primary(self):
+        return self.clients[0]
+
+    def _pick(self):
+        index = self._next
+        self._next = (self._next + 1) % len(self.clients)
+        return index
+
+    def replica(self, key):
+        """The index of the replica calls for `key` go to."""
+        return self._ring.shard(key)
+
+    async def call(self, send, replica=None):
+        """Await `send(client)` on `replica`, or the next one round-robin, hedged onto the following one if slow."""
+        index = self._pick() if replica is None else replica
+        if not self.hedge:
+            return await send(self.clients[index])
+        self.budget.deposit()
+        started = time.perf_counter()
+        delay = self.latency.estimate()
+        tasks = {}
+        timings = {}
+
+        def start(client):
+            task, timings[task] = create_timed_task(send(client))
+            tasks[task] = time.perf_counter()
+            return task
+
+        first = start(self.clients[index])
+        hedged = False
+        error = None
+        try:
+            while tasks:
+                timeout = None
+                if not hedged and delay is not None:
+                    timeout = max(self.min_delay, delay) - (time.perf_counter() - started)
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if self.budget.withdraw():
+                        HEDGES.inc(self.downstream, "sent")
+                        start(self.clients[(index + 1) % len(self.clients)])
+                    else:
+                        HEDGES.inc(self.downstream, "no_budget")
+                    continue
+                for task in done:
+                    task_started = tasks.pop(task)
+                    if task.exception() is None:
+                        account(timings[task])
+                        self.latency.observe(time.perf_counter() - task_started)
+                        if task is not first:
+                            HEDGES.inc(self.downstream, "won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
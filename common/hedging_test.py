@@ -0,0 +1,83 @@
+import asyncio
+
+from common import timing
+from common.hedging import HEDGES, LatencyTracker, Replicas
+
+
+class Replica:
+    def __init__(self, name, delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+
+
+def send_to(replica):
+    async def send():
+        replica.calls += 1
+        current = timing._current.get()
+        if current is not None:
+            current.downstream_entries.append(replica.name)
+        await asyncio.sleep(replica.delay)
+        return replica.name
+    return send()
+
+
+def warmed(replicas, hedge=True, seconds=0.001):
+    calls = Replicas(replicas, "hedging-test", hedge=hedge, min_delay=0.0, budget_ratio=1.0)
+    for _ in range(calls.latency.refresh_every):
+        calls.latency.observe(seconds)
+    return calls
+
+
+def test_latency_tracker_estimates_after_enough_samples():
+    tracker = LatencyTracker(percentile=0.9, min_samples=10, refresh_every=10)
+    for value in range(9):
+        tracker.observe(value)
+    assert tracker.estimate() is None
+    tracker.observe(9)
+    assert tracker.estimate() == 9
+
+
+def test_calls_without_a_key_go_round_robin():
+    replicas = [Replica("a"), Replica("b")]
+    calls = Replicas(replicas, "hedging-test")
+
+    async def main():
+        return [await calls.call(send_to) for _ in range(4)]
+
+    assert asyncio.run(main()) == ["a", "b", "a", "b"]
+
+
+def test_keys_stick_to_one_replica():
+    calls = Replicas([Replica(str(index)) for index in range(4)], "hedging-test")
+    assert len({calls.replica("match-1") for _ in range(10)}) == 1
+    assert len({calls.replica(f"match-{index}") for index in range(100)}) == 4
+
+
+def test_slow_calls_are_hedged_onto_the_next_replica():
+    replicas = [Replica("slow", delay=0.5), Replica("fast")]
+    calls = warmed(replicas)
+    won = HEDGES._series.get(("hedging-test", "won"), 0)
+
+    async def main():
+        return await calls.call(send_to, replica=0)
+
+    assert asyncio.run(main()) == "fast"
+    assert [replica.calls for replica in replicas] == [1, 1]
+    assert HEDGES._series[("hedging-test", "won")] == won + 1
+
+
+def test_only_the_winning_copy_counts_towards_request_timing():
+    replicas = [Replica("slow", delay=0.5), Replica("fast")]
+    calls = warmed(replicas)
+
+    async def main():
+        request = timing.RequestTiming("req", 0.0)
+        token = timing._current.set(request)
+        try:
+            await calls.call(send_to, replica=0)
+        finally:
+            timing._current.reset(token)
+        return request.downstream_entries
+
+    assert asyncio.run(main()) == ["fast"]
@@ -0,0 +1,82 @@
+import httpx
+
+from common import timing
+from common.local import local_app
+from common.metrics import InstrumentedTransport
+from common.resilience import ResilientTransport
+from common.response_cache import CachingTransport, ResponseCache
+from common.settings import env_number
+
+
+UNIX_SCHEME = "unix://"
+
+
+def unix_socket_path(url):
+    """The socket path of a unix:///path/to/socket URL, or None for any other URL."""
+    return url[len(UNIX_SCHEME):] if url.startswith(UNIX_SCHEME) else None
+
+
+def create_http_client(base_url, downstream=None, transport=None, cache_ttls=None, **kwargs):
+    """Build the pooled, keep-alive async client a module uses for one downstream.
+
+    Pool limits and timeouts are read from the environment so they can be
+    tuned per deployment without code changes:
+
+    - HTTP_MAX_CONNECTIONS: total open connections to the downstream (default 200)
+    - HTTP_MAX_KEEPALIVE: idle connections kept in the pool (default 100)
+    - HTTP_KEEPALIVE_EXPIRY: seconds an idle connection is kept (default 30)
+    - HTTP_TIMEOUT: read/write timeout in seconds (default 10)
+    - HTTP_CONNECT_TIMEOUT: connect timeout in seconds (default 5)
+    - HTTP_POOL_TIMEOUT: seconds to wait for a free pooled connection (default 5)
+
+    A `unix:///path/to/socket` base URL connects over that Unix domain socket
+    instead of TCP, for modules running on the same host.
+
+    Outbound latency is recorded under the `downstream` metrics label (the base
+    URL by default). Requests made while handling an incoming request carry its
+    request ID and start time downstream, and their wait is recorded (see
+    common.timing).
+
+    Every call is bounded by the current request's deadline and goes through
+    the downstream's retry budget and circuit breaker (see common.resilience).
+
+    `cache_ttls` maps route paths to seconds; GETs on those routes are served
+    from an LRU response cache of RESPONSE_CACHE_MAX_ENTRIES responses (default
+    1000) with concurrent misses coalesced (see common.response_cache). Cache
+    hits skip the downstream, so they are not counted as outbound requests.
+
+    If an app was registered for the base URL's host with
+    common.local.register_local_app, the client calls it in-process instead of
+    opening connections.
+
+    The client must be closed by the caller; modules open it in their lifespan.
+    """
+    limits = httpx.Limits(
+        max_connections=env_number("HTTP_MAX_CONNECTIONS", 200, int),
+        max_keepalive_connections=env_number("HTTP_MAX_KEEPALIVE", 100, int),
+        keepalive_expiry=env_number("HTTP_KEEPALIVE_EXPIRY", 30.0, float),
+    )
+    timeout = httpx.Timeout(
+        env_number("HTTP_TIMEOUT", 10.0, float),
+        connect=env_number("HTTP_CONNECT_TIMEOUT", 5.0, float),
+        pool=env_number("HTTP_POOL_TIMEOUT", 5.0, float),
+    )
+    downstream = downstream or base_url
+    socket_path = unix_socket_path(base_url)
+    if socket_path is not None:
+        base_url = "http://localhost"
+    if transport is None:
+        app = local_app(base_url) if socket_path is None else None
+        if app is not None:
+            # Like a real server, answer app errors with a 500 rather than raising them into the caller.
+            transport = httpx.ASGITransport(app, raise_app_exceptions=False)
+        else:
+            transport = httpx.AsyncHTTPTransport(limits=limits, uds=socket_path)
+    transport = InstrumentedTransport(transport, downstream)
+    transport = ResilientTransport(transport, downstream)
+    if cache_ttls:
+        cache = ResponseCache(max_entries=env_number("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+        transport = CachingTransport(transport, cache_ttls, cache, downstream=downstream)
+    event_hooks = {"request": [timing.on_request], "response": [timing.on_response]}
+    return httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport,
+                             event_hooks=event_hooks, **kwargs)
@@ -0,0 +1,65 @@
+import asyncio
+import tempfile
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from common.event_stream import EventStream, to_ws_url
+from common.http_client import create_http_client, unix_socket_path
+from common.local import register_local_app, unregister_local_app
+
+app = FastAPI()
+
+
+@app.get("/hello")
+async def hello():
+    return {"hello": "world"}
+
+
+@app.websocket("/acks")
+async def acks(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_json()
+            await websocket.send_json({"type": "ack", "seq": message["seq"]})
+    except WebSocketDisconnect:
+        pass
+
+
+def test_unix_socket_path():
+    assert unix_socket_path("unix:///tmp/c.sock") == "/tmp/c.sock"
+    assert unix_socket_path("http://127.0.0.1:8002") is None
+
+
+def test_unix_urls_connect_over_the_socket():
+    async def main(path):
+        server = uvicorn.Server(uvicorn.Config(app, uds=path, log_level="warning"))
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        try:
+            async with create_http_client(f"unix://{path}", downstream="uds-test") as client:
+                response = await client.get("/hello")
+            # With a window of one, the second send only returns once the first was acked.
+            async with EventStream(f"{to_ws_url(f'unix://{path}')}/acks", window=1) as stream:
+                seqs = [await stream.send({"step": step}) for step in range(2)]
+            return response.json(), seqs
+        finally:
+            server.should_exit = True
+            await task
+
+    with tempfile.TemporaryDirectory() as directory:
+        assert asyncio.run(main(f"{directory}/c.sock")) == ({"hello": "world"}, [1, 2])
+
+
+def test_registered_apps_are_called_in_process():
+    register_local_app("http://http-client-test", app)
+    try:
+        async def main():
+            async with create_http_client("http://http-client-test") as client:
+                return (await client.get("/hello")).json()
+
+        assert asyncio.run(main()) == {"hello": "world"}
+    finally:
+        unregister_local_app("http://http-client-test")
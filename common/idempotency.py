@@ -0,0 +1,157 @@
+"""Process each Idempotency-Key once across retries and hedged copies.
+
+`IdempotentResults.run(key, work)` awaits `work()` for the first request with
+a key and answers later requests with that key from its result for `ttl`
+seconds. A request arriving while the first is still running waits for it
+instead of running the work again, the way `CachingTransport` coalesces
+concurrent misses.
+
+Results held in the process only dedupe requests reaching the same worker.
+Give every module C worker and replica on a host the same `directory`
+(IDEMPOTENCY_DIR) to dedupe across them, as hedged copies need: the first
+process to create a key's file (O_EXCL) runs the work and atomically replaces
+the empty file with the result, and the others poll the file until the result
+is there. A process whose work fails removes its claim so a waiter can take
+over; a claim older than `claim_timeout`, left by a process that died, is
+taken over too. Nothing is fsynced: entries only have to outlive the
+requests racing each other. The files are claimed, read, written and removed
+in a thread, off the event loop.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+from common import codec
+from common.response_cache import ResponseCache
+
+
+class IdempotentResults:
+    """Results by Idempotency-Key, in process and optionally in a directory shared between processes."""
+
+    def __init__(self, ttl=300.0, max_keys=10000, directory=None, claim_timeout=30.0, poll_interval=0.005):
+        self.ttl = ttl
+        self.directory = directory
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self.duplicates = 0
+        self._results = ResponseCache(max_entries=max_keys)
+        self._inflight = {}
+        self._pruned_at = time.monotonic()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    async def run(self, key, work):
+        """Return the result of `work()`, or of the earlier request with the same `key`."""
+        result = self._results.get(key)
+        if result is not None:
+            self.duplicates += 1
+            return result
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request we were waiting on was cancelled, not us: try again.
+                return await self.run(key, work)
+            self.duplicates += 1
+            return result
+
+        pending = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            if self.directory is None:
+                result = await work()
+            else:
+                result, duplicate = await self._run_shared(key, work)
+                self.duplicates += duplicate
+            self._results.set(key, result, self.ttl)
+            pending.set_result(result)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Waiters see the exception; mark it retrieved so an unwaited future does not warn.
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        if self.directory is not None and time.monotonic() - self._pruned_at >= self.ttl:
+            self._pruned_at = time.monotonic()
+            asyncio.get_running_loop().run_in_executor(None, self.prune)
+        return result
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    async def _run_shared(self, key, work):
+        path = self._path(key)
+        while not await asyncio.to_thread(_claim, path):
+            result = await self._wait_for(path)
+            if result is not None:
+                return result, True
+        try:
+            result = await work()
+        except BaseException:
+            await asyncio.to_thread(_remove, path)
+            raise
+        await asyncio.to_thread(_store, path, codec.encode(result))
+        return result, False
+
+    async def _wait_for(self, path):
+        """Poll a claimed key's file; its result, or None once the claim is gone or abandoned."""
+        while True:
+            try:
+                data, age = await asyncio.to_thread(_read, path)
+            except FileNotFoundError:
+                return None
+            if data and age < self.ttl:
+                return codec.decode(data)
+            if data or age >= self.claim_timeout:
+                # An expired result, or a claim whose owner is gone.
+                await asyncio.to_thread(_remove, path)
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    def prune(self):
+        """Delete results older than `ttl` and abandoned claims from the shared directory."""
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime >= (self.ttl if stat.st_size else self.claim_timeout):
+                    _remove(entry.path)
+
+
+def _claim(path):
+    """Create `path` if no one has; return whether this call did."""
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _read(path):
+    """Contents of `path` and its age in seconds."""
+    with open(path, "rb") as f:
+        return f.read(), time.time() - os.fstat(f.fileno()).st_mtime
+
+
+def _store(path, data):
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from common import idempotency
+from common.idempotency import IdempotentResults
+
+
+class Work:
+    """Counts runs; each run waits for `gate` and returns its run number."""
+
+    def __init__(self):
+        self.runs = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self):
+        self.runs += 1
+        run = self.runs
+        await self.gate.wait()
+        return {"run": run}
+
+
+@pytest.fixture(params=["process", "shared"])
+def make_results(request, tmp_path):
+    directory = str(tmp_path) if request.param == "shared" else None
+    return lambda **kwargs: IdempotentResults(directory=directory, **kwargs)
+
+
+def test_repeats_get_the_first_result(make_results):
+    async def main():
+        results, work = make_results(), Work()
+        first = await results.run("k", work)
+        second = await results.run("k", work)
+        other = await results.run("other", work)
+        return first, second, other, work.runs, results.duplicates
+
+    assert asyncio.run(main()) == ({"run": 1}, {"run": 1}, {"run": 2}, 2, 1)
+
+
+def test_concurrent_requests_wait_for_the_first(make_results):
+    async def main():
+        results, work = make_results(), Work()
+        work.gate.clear()
+        tasks = [asyncio.create_task(results.run("k", work)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        work.gate.set()
+        return await asyncio.gather(*tasks), work.runs, results.duplicates
+
+    answers, runs, duplicates = asyncio.run(main())
+    assert answers == [{"run": 1}] * 5
+    assert (runs, duplicates) == (1, 4)
+
+
+def test_failures_are_not_remembered(make_results):
+    async def fail():
+        raise RuntimeError("scheduler stopped")
+
+    async def main():
+        results, work = make_results(), Work()
+        with pytest.raises(RuntimeError):
+            await results.run("k", fail)
+        return await results.run("k", work)
+
+    assert asyncio.run(main()) == {"run": 1}
+
+
+def test_a_cancelled_first_request_lets_a_waiter_run_the_work(make_results):
+    async def main():
+        results, work = make_results(), Work()
+        work.gate.clear()
+        first = asyncio.create_task(results.run("k", work))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(results.run("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        work.gate.set()
+        return await waiter, work.runs
+
+    assert asyncio.run(main()) == ({"run": 2}, 2)
+
+
+def test_processes_sharing_a_directory_run_the_work_once(tmp_path):
+    async def main():
+        # Two instances stand in for two replicas: they share nothing but the directory.
+        first, second = IdempotentResults(directory=str(tmp_path)), IdempotentResults(directory=str(tmp_path))
+        work = Work()
+        work.gate.clear()
+        original = asyncio.create_task(first.run("k", work))
+        await asyncio.sleep(0.01)
+        hedge = asyncio.create_task(second.run("k", work))
+        await asyncio.sleep(0.02)
+        work.gate.set()
+        return await original, await hedge, work.runs, second.duplicates
+
+    assert asyncio.run(main()) == ({"run": 1}, {"run": 1}, 1, 1)
+
+
+def test_abandoned_claims_and_expired_results_are_taken_over(tmp_path):
+    async def main():
+        results = IdempotentResults(ttl=0.05, directory=str(tmp_path), claim_timeout=0.05)
+        work = Work()
+        # A claim left behind by a process that died while running the work.
+        open(results._path("abandoned"), "wb").close()
+        abandoned = await results.run("abandoned", work)
+        await results.run("expired", work)
+        await asyncio.sleep(0.06)
+        expired = await IdempotentResults(ttl=0.05, directory=str(tmp_path)).run("expired", work)
+        return abandoned, expired
+
+    assert asyncio.run(main()) == ({"run": 1}, {"run": 3})
+
+
+def test_prune_deletes_old_results_and_claims(tmp_path):
+    results = IdempotentResults(ttl=60.0, directory=str(tmp_path), claim_timeout=1.0)
+    for name, content, age in (("fresh", b"x", 0), ("expired", b"x", 120), ("claim", b"", 0), ("abandoned", b"", 5)):
+        path = tmp_path / name
+        path.write_bytes(content)
+        os.utime(path, (time.time() - age, time.time() - age))
+    results.prune()
+    assert sorted(os.listdir(tmp_path)) == ["claim", "fresh"]
+
+
+def test_shared_directory_is_not_touched_on_the_event_loop(tmp_path, monkeypatch):
+    calls = []
+
+    def watched(function):
+        def wrapper(*args):
+            calls.append((function.__name__, threading.current_thread() is threading.main_thread()))
+            return function(*args)
+        return wrapper
+
+    for name in ("_claim", "_read", "_store", "_remove"):
+        monkeypatch.setattr(idempotency, name, watched(getattr(idempotency, name)))
+
+    async def main():
+        a, b = IdempotentResults(directory=str(tmp_path)), IdempotentResults(directory=str(tmp_path))
+        return await a.run("k", Work()), await b.run("k", Work())
+
+    assert asyncio.run(main()) == ({"run": 1}, {"run": 1})
+    assert {name for name, _ in calls} >= {"_claim", "_read", "_store"}
+    assert not any(on_loop for _, on_loop in calls)
@@ -0,0 +1,92 @@
+"""In-process transports for modules composed into one ASGI app.
+
+`register_local_app(url, app)` marks `app` as serving every URL on the same
+host and port as `url`. Clients from `common.http_client` and event streams
+from `common.event_stream` created for such URLs call the app directly, over
+`httpx.ASGITransport` and `LocalWebSocket`, instead of opening sockets. URLs
+on any other host are unaffected, so the same module code runs either way.
+"""
+import asyncio
+from urllib.parse import urlsplit
+
+_apps = {}
+
+
+def register_local_app(url, app):
+    _apps[urlsplit(url).netloc] = app
+
+
+def unregister_local_app(url):
+    _apps.pop(urlsplit(url).netloc, None)
+
+
+def local_app(url):
+    """The in-process app serving `url` (http or ws scheme), or None."""
+    return _apps.get(urlsplit(url).netloc) if _apps else None
+
+
+class LocalWebSocket:
+    """Drives an ASGI WebSocket endpoint in-process, offering the subset of the
+    `websockets` client API that `EventStream` uses: send, close and async
+    iteration over incoming messages."""
+
+    def __init__(self, app, url):
+        self.app = app
+        self.url = url
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        self._task = None
+        self._closed = False
+
+    async def connect(self):
+        parts = urlsplit(self.url)
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": parts.scheme or "ws",
+            "path": parts.path or "/",
+            "raw_path": (parts.path or "/").encode(),
+            "root_path": "",
+            "query_string": parts.query.encode(),
+            "headers": [(b"host", parts.netloc.encode())],
+            "client": ("127.0.0.1", 0),
+            "server": (parts.hostname or "127.0.0.1", parts.port or 80),
+            "subprotocols": [],
+        }
+        await self._to_app.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self._run(scope))
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            await self._task
+            raise ConnectionError(f"In-process WebSocket to {self.url} was rejected")
+        return self
+
+    async def _run(self, scope):
+        try:
+            await self.app(scope, self._to_app.get, self._from_app.put)
+        finally:
+            # However the endpoint ended, let readers see the connection close.
+            await self._from_app.put({"type": "websocket.close", "code": 1000})
+
+    async def send(self, data):
+        if self._closed:
+            raise ConnectionError(f"In-process WebSocket to {self.url} is closed")
+        key = "bytes" if isinstance(data, bytes) else "text"
+        await self._to_app.put({"type": "websocket.receive", key: data})
+
+    async def close(self, code=1000):
+        if not self._closed:
+            self._closed = True
+            await self._to_app.put({"type": "websocket.disconnect", "code": code})
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self._from_app.get()
+        if message["type"] == "websocket.close":
+            self._closed = True
+            raise StopAsyncIteration
+        return message.get("text") if message.get("text") is not None else message.get("bytes")
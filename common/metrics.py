@@ -0,0 +1,209 @@
+"""Prometheus text-format metrics for modules A, B and C.
+
+Metrics are plain Python counters updated from the worker's event-loop thread,
+so recording a value is a dict lookup and an addition with no locks. Values
+that a component already counts itself (queue depth, drops) are exposed
+through callbacks read at scrape time instead of being mirrored on every
+update. Each uvicorn worker process keeps its own values.
+
+All modules in a process share one registry: request metrics carry a
+`module` label, so the composed app reports its three modules apart.
+Registering a name again (a reloaded module) replaces the earlier metric if it
+has the same type and labels.
+"""
+import time
+from bisect import bisect_left
+
+import httpx
+from fastapi.responses import Response
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._series = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _values(self):
+        if self.callback is None:
+            return self._series.items()
+        value = self.callback()
+        # Callbacks return either one number or a {label values: number} mapping.
+        return value.items() if isinstance(value, dict) else [((), value)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self._values():
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) - amount
+
+    def set(self, value, *labels):
+        self._series[labels] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry=registry)
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # Per-bucket (not cumulative) counts plus the running sum.
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None and (existing.type, existing.labelnames) != (metric.type, metric.labelnames):
+            raise ValueError(f"Metric {metric.name} is already registered as a {existing.type} "
+                             f"with labels {existing.labelnames}")
+        self._metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter("http_requests_total", "HTTP requests handled, by module, route, method and status.",
+                   ("module", "route", "method", "status"))
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Time to handle an HTTP request, by module and route.",
+                             ("module", "route", "method"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled, by module.",
+                           ("module",))
+OUTBOUND_DURATION = Histogram("http_client_request_duration_seconds",
+                              "Time until a downstream answered, by downstream, method and status.",
+                              ("downstream", "method", "status"))
+OUTBOUND_IN_FLIGHT = Gauge("http_client_requests_in_flight", "Outbound requests awaiting a response, by downstream.",
+                           ("downstream",))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts, latency and in-flight requests.
+
+    Routes are labelled with their path template (e.g. /events/stream/{match_id})
+    so per-match URLs do not create new series; paths no route of this app
+    matched share the "unmatched" label, even when the app is mounted under a
+    prefix whose Mount is already in the scope.
+    """
+
+    def __init__(self, app, module):
+        self.app = app
+        self.module = module
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        mount = scope.get("route")
+        REQUESTS_IN_FLIGHT.inc(self.module)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(self.module)
+            route = scope.get("route")
+            route = "unmatched" if route is None or route is mount else getattr(route, "path", "unmatched")
+            REQUEST_DURATION.observe(time.perf_counter() - start, self.module, route, scope["method"])
+            REQUESTS.inc(self.module, route, scope["method"], str(status))
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps an httpx transport to record outbound latency per downstream, errors included."""
+
+    def __init__(self, transport, downstream):
+        self.transport = transport
+        self.downstream = downstream
+
+    async def handle_async_request(self, request):
+        status = "error"
+        start = time.perf_counter()
+        OUTBOUND_IN_FLIGHT.inc(self.downstream)
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            OUTBOUND_IN_FLIGHT.dec(self.downstream)
+            OUTBOUND_DURATION.observe(time.perf_counter() - start, self.downstream, request.method, status)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def metrics_response():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,69 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from common.metrics import REQUESTS, Counter, Gauge, Histogram, MetricsMiddleware, Registry
+
+
+def make_app(module):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, module=module)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"item_id": item_id}
+
+    return app
+
+
+def requests(module, route):
+    return sum(value for labels, value in REQUESTS._series.items() if labels[:2] == (module, route))
+
+
+def test_routes_are_labelled_by_template_per_module():
+    composed = Starlette(routes=[Mount("/x", app=make_app("x")), Mount("/", app=make_app("y"))])
+    before = requests("x", "/items/{item_id}"), requests("y", "/items/{item_id}")
+    client = TestClient(composed)
+    client.get("/x/items/1")
+    client.get("/x/items/2")
+    client.get("/items/3")
+    assert requests("x", "/items/{item_id}") - before[0] == 2
+    assert requests("y", "/items/{item_id}") - before[1] == 1
+
+
+def test_unmatched_paths_under_a_mount_share_one_label():
+    composed = Starlette(routes=[Mount("/x", app=make_app("x"))])
+    before = requests("x", "unmatched")
+    assert TestClient(composed).get("/x/nowhere").status_code == 404
+    assert requests("x", "unmatched") - before == 1
+    assert requests("x", "/x") == 0
+
+
+def test_registering_a_name_again_replaces_a_matching_metric():
+    registry = Registry()
+    Counter("reloaded_total", "First import.", ("kind",), registry=registry).inc("a")
+    reloaded = Counter("reloaded_total", "Second import.", ("kind",), registry=registry)
+    reloaded.inc("b", amount=2)
+    assert registry.render().splitlines() == [
+        "# HELP reloaded_total Second import.",
+        "# TYPE reloaded_total counter",
+        'reloaded_total{kind="b"} 2',
+    ]
+    with pytest.raises(ValueError):
+        Gauge("reloaded_total", "Different type.", ("kind",), registry=registry)
+    with pytest.raises(ValueError):
+        Counter("reloaded_total", "Different labels.", ("other",), registry=registry)
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
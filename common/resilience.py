@@ -0,0 +1,291 @@
+"""Deadlines, retries and circuit breaking for outbound calls.
+
+Every request handled by a module gets a deadline: the caller's remaining
+budget from the X-Request-Timeout-Ms header, or REQUEST_DEADLINE_MS (default
+10000) at the first hop. `DeadlineMiddleware` answers 504 straight away when
+the budget is already spent on arrival. `ResilientTransport` wraps the
+transport of a client from `common.http_client`:
+
+- each outbound call is bounded by the remaining deadline, which is sent on
+  as X-Request-Timeout-Ms so every hop gives up at the same moment
+- failed attempts are retried up to RETRY_MAX_ATTEMPTS times with full-jitter
+  exponential backoff. A retry is only made while the `RetryBudget` has
+  tokens: every call deposits RETRY_BUDGET_RATIO tokens and a trickle of
+  RETRY_BUDGET_MIN_PER_SECOND refills it, so a failing downstream sees at
+  most that fraction of extra load instead of a retry storm
+- a `CircuitBreaker` per downstream opens when at least BREAKER_MIN_REQUESTS
+  calls in the last BREAKER_WINDOW_SECONDS failed at BREAKER_FAILURE_RATE or
+  more, fails calls fast for BREAKER_OPEN_SECONDS, then lets one probe through
+
+Connection failures are retried for any method since the request never left;
+timeouts and 503 answers only for idempotent methods and requests carrying an
+Idempotency-Key header. A module whose own
+downstream call failed answers 502 or 504 (`downstream_error_handler`), which
+callers do not retry: the hop next to the failure already did, and retrying at
+every hop would multiply the load on it.
+"""
+import asyncio
+import contextvars
+import random
+import time
+from collections import deque
+
+import httpx
+from fastapi.responses import JSONResponse
+
+from common.metrics import Counter, Gauge
+from common.settings import env_number
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+IDEMPOTENCY_HEADER = "idempotency-key"
+REQUEST_DEADLINE_MS = env_number("REQUEST_DEADLINE_MS", 10000.0, float)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRYABLE_STATUS = frozenset({503})
+
+RETRIES = Counter("http_client_retries_total", "Outbound retries, by downstream and outcome (sent, no_budget).",
+                  ("downstream", "outcome"))
+BREAKER_STATE = Gauge("http_client_circuit_state", "Circuit breaker state by downstream: 0 closed, 1 open, 2 half-open.",
+                      ("downstream",))
+BREAKER_REJECTED = Counter("http_client_circuit_rejected_total", "Outbound calls failed fast by an open circuit.",
+                           ("downstream",))
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The request's deadline passed before the downstream answered."""
+
+
+class CircuitOpen(httpx.TransportError):
+    """The downstream's circuit breaker is open, so the call was not made."""
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware setting the request deadline from X-Request-Timeout-Ms."""
+
+    def __init__(self, app, default_ms=None):
+        self.app = app
+        self.default_ms = REQUEST_DEADLINE_MS if default_ms is None else default_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget_ms = self.default_ms
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER.encode():
+                try:
+                    budget_ms = min(budget_ms, float(value))
+                except ValueError:
+                    pass
+                break
+        if budget_ms <= 0:
+            response = JSONResponse({"detail": "Deadline exceeded before the request was handled"}, status_code=504)
+            await response(scope, receive, send)
+            return
+        token = _deadline.set(time.monotonic() + budget_ms / 1e3)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+async def downstream_error_handler(request, exc):
+    """Map failed downstream calls to 504 (timeouts, including downstream ones) or 502."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status_code = 504 if exc.response.status_code == 504 else 502
+        detail = f"Downstream answered {exc.response.status_code}"
+    else:
+        status_code = 504 if isinstance(exc, httpx.TimeoutException) else 502
+        detail = f"Downstream call failed: {type(exc).__name__}: {exc}"
+    return JSONResponse({"detail": detail}, status_code=status_code)
+
+
+class RetryBudget:
+    """Token bucket capping retries to a fraction of calls plus a small steady allowance."""
+
+    def __init__(self, ratio=0.2, min_per_second=10.0, max_tokens=100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        self._refill()
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, downstream, failure_rate=0.5, min_requests=20, window=10.0, open_seconds=5.0):
+        self.downstream = downstream
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        BREAKER_STATE.set(self.CLOSED, downstream)
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"Circuit to {self.downstream} is now {('closed', 'open', 'half-open')[state]}")
+        self.state = state
+        BREAKER_STATE.set(state, self.downstream)
+
+    def allow(self):
+        """Whether a call may go out now; in half-open state only one probe at a time."""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, failed):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open(now)
+            else:
+                self._outcomes.clear()
+                self._failures = 0
+                self._set_state(self.CLOSED)
+            return
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._failures -= self._outcomes.popleft()[1]
+        if (self.state == self.CLOSED and len(self._outcomes) >= self.min_requests
+                and self._failures >= self.failure_rate * len(self._outcomes)):
+            self._open(now)
+
+    def abandon(self):
+        """Forget an in-progress probe whose caller went away, so the next call can probe."""
+        self._probing = False
+
+    def _open(self, now):
+        self._opened_at = now
+        self._set_state(self.OPEN)
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Applies the request deadline, retry budget and circuit breaker to every call."""
+
+    def __init__(self, transport, downstream, max_attempts=None, backoff=None, max_backoff=None,
+                 budget=None, breaker=None):
+        self.transport = transport
+        self.downstream = downstream
+        self.max_attempts = max_attempts or env_number("RETRY_MAX_ATTEMPTS", 3)
+        self.backoff = backoff if backoff is not None else env_number("RETRY_BACKOFF_MS", 25.0, float) / 1e3
+        self.max_backoff = (max_backoff if max_backoff is not None
+                            else env_number("RETRY_BACKOFF_MAX_MS", 1000.0, float) / 1e3)
+        self.budget = budget or RetryBudget(
+            ratio=env_number("RETRY_BUDGET_RATIO", 0.2, float),
+            min_per_second=env_number("RETRY_BUDGET_MIN_PER_SECOND", 10.0, float),
+        )
+        self.breaker = breaker or CircuitBreaker(
+            downstream,
+            failure_rate=env_number("BREAKER_FAILURE_RATE", 0.5, float),
+            min_requests=env_number("BREAKER_MIN_REQUESTS", 20),
+            window=env_number("BREAKER_WINDOW_SECONDS", 10.0, float),
+            open_seconds=env_number("BREAKER_OPEN_SECONDS", 5.0, float),
+        )
+
+    def _retryable(self, request, response=None, error=None):
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return True
+        if request.method not in IDEMPOTENT_METHODS and IDEMPOTENCY_HEADER not in request.headers:
+            return False
+        if error is not None:
+            return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+        return response.status_code in RETRYABLE_STATUS
+
+    async def handle_async_request(self, request):
+        left = remaining()
+        deadline = time.monotonic() + (REQUEST_DEADLINE_MS / 1e3 if left is None else left)
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            response = error = None
+            try:
+                response = await self._attempt(request, deadline)
+            except DeadlineExceeded:
+                raise
+            except httpx.TransportError as e:
+                error = e
+            if response is not None and not self._retryable(request, response):
+                return response
+            if error is not None and not self._retryable(request, error=error):
+                raise error
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            if (attempt >= self.max_attempts or isinstance(error, CircuitOpen)
+                    or time.monotonic() + delay >= deadline):
+                break
+            if not self.budget.withdraw():
+                RETRIES.inc(self.downstream, "no_budget")
+                break
+            RETRIES.inc(self.downstream, "sent")
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+        if error is not None:
+            raise error
+        return response
+
+    async def _attempt(self, request, deadline):
+        if not self.breaker.allow():
+            BREAKER_REJECTED.inc(self.downstream)
+            raise CircuitOpen(f"Circuit to {self.downstream} is open", request=request)
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before calling {self.downstream}", request=request)
+        request.headers[DEADLINE_HEADER] = str(int(left * 1e3))
+        # Per-phase timeouts never outlast the deadline; wait_for bounds the sum.
+        request.extensions["timeout"] = {phase: left if value is None else min(value, left)
+                                         for phase, value in request.extensions.get("timeout", {}).items()}
+        try:
+            response = await asyncio.wait_for(self.transport.handle_async_request(request), left)
+        except asyncio.TimeoutError:
+            self.breaker.record(True)
+            raise DeadlineExceeded(f"Deadline exceeded waiting for {self.downstream}", request=request)
+        except Exception:
+            # Transport errors and anything else the transport raises count as failures.
+            self.breaker.record(True)
+            raise
+        except BaseException:
+            # Cancelled: the call says nothing about the downstream, but a probe must be released.
+            self.breaker.abandon()
+            raise
+        self.breaker.record(response.status_code >= 500)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
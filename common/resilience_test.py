@@ -0,0 +1,154 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common.resilience import (DEADLINE_HEADER, CircuitBreaker, CircuitOpen, DeadlineExceeded, DeadlineMiddleware,
+                               ResilientTransport, RetryBudget, remaining)
+
+
+class Downstream(httpx.AsyncBaseTransport):
+    """Plays back `outcomes`: a status code, an exception to raise, or a delay in seconds as a float."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    async def handle_async_request(self, request):
+        self.requests.append(request)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, float):
+            await asyncio.sleep(outcome)
+            outcome = 200
+        return httpx.Response(outcome)
+
+
+def resilient(downstream, **kwargs):
+    kwargs.setdefault("max_attempts", 3)
+    kwargs.setdefault("backoff", 0.0)
+    kwargs.setdefault("max_backoff", 0.0)
+    kwargs.setdefault("budget", RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=10.0))
+    kwargs.setdefault("breaker", CircuitBreaker("test", min_requests=1000))
+    return ResilientTransport(downstream, "test", **kwargs)
+
+
+def call(transport, method="GET", headers=None):
+    async def main():
+        async with httpx.AsyncClient(transport=transport, base_url="http://c") as client:
+            return await client.request(method, "/", headers=headers)
+
+    return asyncio.run(main())
+
+
+def test_retry_budget_allows_a_fraction_of_calls():
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0, max_tokens=1.0)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_breaker_opens_on_failure_rate_and_probes_after_the_open_period():
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_requests=4, open_seconds=0.0)
+    for failed in (False, True, False):
+        breaker.record(failed)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_abandoned_probe_lets_the_next_call_probe():
+    breaker = CircuitBreaker("test", min_requests=1, open_seconds=0.0)
+    breaker.record(True)
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+
+def test_probe_failing_with_any_exception_is_released():
+    breaker = CircuitBreaker("test", min_requests=1, open_seconds=0.0)
+    breaker.record(True)
+    with pytest.raises(RuntimeError):
+        call(resilient(Downstream(RuntimeError("bug")), breaker=breaker))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert call(resilient(Downstream(200), breaker=breaker)).status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_idempotent_requests_are_retried_on_503():
+    downstream = Downstream(503, 503, 200)
+    assert call(resilient(downstream)).status_code == 200
+    assert len(downstream.requests) == 3
+
+
+def test_posts_are_retried_only_with_an_idempotency_key():
+    downstream = Downstream(503, 200)
+    assert call(resilient(downstream), "POST").status_code == 503
+    downstream = Downstream(503, 200)
+    assert call(resilient(downstream), "POST", {"Idempotency-Key": "k"}).status_code == 200
+
+
+def test_connection_failures_are_retried_for_any_method():
+    downstream = Downstream(httpx.ConnectError("refused"), 200)
+    assert call(resilient(downstream), "POST").status_code == 200
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    downstream = Downstream(503)
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0)
+    assert call(resilient(downstream, budget=budget)).status_code == 503
+    assert len(downstream.requests) == 2
+
+
+def test_open_breaker_fails_fast_without_calling():
+    downstream = Downstream(200)
+    breaker = CircuitBreaker("test", min_requests=1, open_seconds=60.0)
+    breaker.record(True)
+    with pytest.raises(CircuitOpen):
+        call(resilient(downstream, breaker=breaker))
+    assert downstream.requests == []
+
+
+def test_deadline_bounds_the_call_and_is_sent_downstream():
+    async def main():
+        downstream = Downstream(0.5)
+        app = FastAPI()
+        app.add_middleware(DeadlineMiddleware)
+
+        @app.get("/")
+        async def handler():
+            assert 0 < remaining() <= 0.05
+            async with httpx.AsyncClient(transport=resilient(downstream), base_url="http://c") as client:
+                with pytest.raises(DeadlineExceeded):
+                    await client.get("/")
+            return {}
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://a") as client:
+            response = await client.get("/", headers={DEADLINE_HEADER: "50"})
+        return response, downstream
+
+    response, downstream = asyncio.run(main())
+    assert response.status_code == 200
+    assert 0 < int(downstream.requests[0].headers[DEADLINE_HEADER]) <= 50
+
+
+def test_spent_deadline_is_answered_504():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/")
+    async def handler():
+        return {}
+
+    assert TestClient(app).get("/", headers={DEADLINE_HEADER: "0"}).status_code == 504
@@ -0,0 +1,144 @@
+"""Response cache for idempotent downstream GETs.
+
+`CachingTransport` wraps the transport of a client from `common.http_client`.
+GET responses on routes with a configured TTL are kept in a store and served
+from it until they expire. Concurrent misses for the same key are coalesced:
+the first one calls the downstream and the others wait for its response, so N
+simultaneous misses cost one downstream call.
+
+The store is pluggable: anything with `get(key)` returning the cached entry or
+None and `set(key, entry, ttl)` works. `ResponseCache`, an in-process LRU
+bounded to `max_entries`, is the default. Only 200 responses are cached.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+import httpx
+
+from common.metrics import Counter
+
+CACHE_REQUESTS = Counter("http_client_cache_requests_total",
+                         "Cacheable downstream GETs, by downstream and result (hit, miss, coalesced).",
+                         ("downstream", "result"))
+CACHE_EVICTIONS = Counter("http_client_cache_evictions_total",
+                          "Cached responses evicted to stay within the size bound, by downstream.",
+                          ("downstream",))
+
+
+def parse_ttls(value):
+    """Parse per-route TTLs written as "/route=seconds,/other=seconds"."""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        route, _, seconds = item.rpartition("=")
+        try:
+            ttls[route] = float(seconds)
+        except ValueError:
+            route = ""
+        if not route.startswith("/"):
+            raise RuntimeError(f"Invalid response cache TTL {item!r}, expected /route=seconds")
+    return ttls
+
+
+class ResponseCache:
+    """In-process LRU store with per-entry expiry."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, entry, ttl):
+        self._entries[key] = (time.monotonic() + ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Serves GETs on routes listed in `ttls` from `cache`, coalescing concurrent misses."""
+
+    def __init__(self, transport, ttls, cache=None, downstream="downstream"):
+        self.transport = transport
+        self.ttls = dict(ttls)
+        self.cache = ResponseCache() if cache is None else cache
+        self.downstream = downstream
+        self._inflight = {}
+
+    def _key(self, request):
+        # Accept is part of the key because responses are content-negotiated.
+        return (str(request.url), request.headers.get("accept", ""))
+
+    async def handle_async_request(self, request):
+        ttl = self.ttls.get(request.url.path) if request.method == "GET" else None
+        if not ttl:
+            return await self.transport.handle_async_request(request)
+        key = self._key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            CACHE_REQUESTS.inc(self.downstream, "hit")
+            return self._response(entry, request)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            CACHE_REQUESTS.inc(self.downstream, "coalesced")
+            try:
+                entry = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request we were waiting on was cancelled, not us: try again.
+                return await self.handle_async_request(request)
+            return self._response(entry, request)
+
+        CACHE_REQUESTS.inc(self.downstream, "miss")
+        pending = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self.transport.handle_async_request(request)
+            try:
+                content = b"".join([chunk async for chunk in response.stream])
+            finally:
+                await response.aclose()
+            # Hop timing belongs to the request that paid for it, not to later hits.
+            headers = [(name, value) for name, value in response.headers.raw if name.lower() != b"server-timing"]
+            entry = (response.status_code, headers, content)
+            if response.status_code == 200:
+                evictions = getattr(self.cache, "evictions", 0)
+                self.cache.set(key, entry, ttl)
+                CACHE_EVICTIONS.inc(self.downstream, amount=getattr(self.cache, "evictions", 0) - evictions)
+            pending.set_result(entry)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Waiters see the exception; mark it retrieved so an unwaited future does not warn.
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        return httpx.Response(response.status_code, headers=response.headers.raw, content=content, request=request)
+
+    def _response(self, entry, request):
+        status_code, headers, content = entry
+        return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common.response_cache import CachingTransport, ResponseCache, parse_ttls
+
+
+class Downstream(httpx.AsyncBaseTransport):
+    """Answers every request with its call number once `gate` is set."""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def handle_async_request(self, request):
+        self.calls += 1
+        call = self.calls
+        await self.gate.wait()
+        return httpx.Response(self.status_code, headers={"server-timing": "c-total;dur=1"}, content=str(call).encode())
+
+
+def client(downstream, ttls=None, cache=None):
+    transport = CachingTransport(downstream, {"/items": 60.0} if ttls is None else ttls, cache=cache)
+    return httpx.AsyncClient(transport=transport, base_url="http://c")
+
+
+def test_parse_ttls():
+    assert parse_ttls("/a=1.5, /b=30") == {"/a": 1.5, "/b": 30.0}
+    assert parse_ttls("") == {}
+    with pytest.raises(RuntimeError):
+        parse_ttls("a=1")
+    with pytest.raises(RuntimeError):
+        parse_ttls("/a=soon")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 60)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), cache.evictions) == (1, 3, 1)
+
+
+def test_entries_expire():
+    cache = ResponseCache()
+    cache.set("a", 1, 0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_hits_skip_the_downstream_and_drop_its_server_timing():
+    async def main():
+        downstream = Downstream()
+        async with client(downstream) as c:
+            first = await c.get("/items")
+            second = await c.get("/items")
+            other = await c.get("/items", params={"page": 2})
+        return downstream.calls, first, second, other
+
+    calls, first, second, other = asyncio.run(main())
+    assert calls == 2
+    assert first.text == second.text == "1"
+    assert "server-timing" in first.headers
+    assert "server-timing" not in second.headers
+    assert other.text == "2"
+
+
+def test_only_configured_gets_with_200_are_cached():
+    async def main():
+        downstream = Downstream()
+        async with client(downstream) as c:
+            for _ in range(2):
+                await c.get("/other")
+                await c.post("/items")
+        failing = Downstream(status_code=503)
+        async with client(failing) as c:
+            await c.get("/items")
+            await c.get("/items")
+        return downstream.calls, failing.calls
+
+    assert asyncio.run(main()) == (4, 2)
+
+
+def test_concurrent_misses_are_coalesced():
+    async def main():
+        downstream = Downstream()
+        downstream.gate.clear()
+        async with client(downstream) as c:
+            requests = [asyncio.create_task(c.get("/items")) for _ in range(10)]
+            await asyncio.sleep(0.01)
+            downstream.gate.set()
+            responses = await asyncio.gather(*requests)
+        return downstream.calls, {response.text for response in responses}
+
+    assert asyncio.run(main()) == (1, {"1"})
+
+
+def test_waiters_retry_when_the_first_request_is_cancelled():
+    async def main():
+        downstream = Downstream()
+        downstream.gate.clear()
+        async with client(downstream) as c:
+            first = asyncio.create_task(c.get("/items"))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(c.get("/items"))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            await asyncio.sleep(0.01)
+            downstream.gate.set()
+            response = await waiter
+        return first.cancelled(), downstream.calls, response.text
+
+    assert asyncio.run(main()) == (True, 2, "2")
@@ -0,0 +1,12 @@
+import os
+
+
+def env_number(var, default, cast=int):
+    """Read an optional numeric environment variable, falling back to `default`."""
+    value = os.environ.get(var)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise RuntimeError(f"Invalid value for environment variable {var}: {value!r}")
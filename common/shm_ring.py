@@ -0,0 +1,353 @@
+"""Shared-memory ring buffers carrying observations from a local game loop.
+
+A producer on the same host as module B, such as play_game.py, creates one
+ring per match with `RingWriter` and writes every step's observation into the
+next fixed-size slot. Module B's `RingPoller` finds the rings, copies new
+slots out and rebuilds the observation dicts. No encoding, sockets or system
+calls are involved per step.
+
+A ring is a `multiprocessing.shared_memory` block holding a header followed by
+`slots` records of `SLOT_DTYPE`. There is one writer per ring. Each slot is
+guarded by a sequence lock: the writer marks the slot odd while writing step n
+and `2 * n + 2` when done, then publishes n + 1 as the header's `written`. A
+reader copies a slot and checks that the marker was `2 * n + 2` before and
+after the copy. Otherwise the writer has lapped it and the step is counted as
+an overrun. This relies on stores becoming visible in program order, which
+holds on x86 and for CPython's aligned 8-byte numpy stores in practice.
+
+Every reader process ingests every step it reads, so only one `RingPoller`
+per `reader` name reads at a time: pollers hold an exclusive lock named after
+it, and one that cannot take it stays idle and tries again at each discovery.
+Of several uvicorn workers only one reads the rings, and another takes over
+if it exits. Module B shards each use their own name.
+"""
+import asyncio
+import fcntl
+import mmap
+import os
+import time
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+
+RING_PREFIX = "relator-ring-"
+READER_LOCK_PREFIX = "relator-ring-reader-"
+RING_MAGIC = 0x52494E47  # "RING"
+RING_VERSION = 1
+MAX_PLAYERS = 11
+STICKY_ACTIONS = 10
+SHM_DIRECTORY = "/dev/shm"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u4"), ("version", "<u4"), ("slots", "<u4"), ("slot_size", "<u4"),
+    ("written", "<u8"), ("closed", "<u1"), ("match_id", "S64"),
+], align=True)
+
+_TEAM_FIELDS = [
+    ("players", "<u1"),
+    ("team", "<f4", (MAX_PLAYERS, 2)),
+    ("team_direction", "<f4", (MAX_PLAYERS, 2)),
+    ("team_tired_factor", "<f4", MAX_PLAYERS),
+    ("team_active", "?", MAX_PLAYERS),
+    ("team_yellow_card", "?", MAX_PLAYERS),
+    ("team_roles", "<i1", MAX_PLAYERS),
+    ("team_designated_player", "<i1"),
+    ("agent_controlled_player", "<i1"),
+    ("agent_sticky_actions", "<u1", STICKY_ACTIONS),
+]
+
+# Positions are stored as float32, which is plenty for the pitch's [-1, 1] range.
+SLOT_DTYPE = np.dtype([
+    ("lock", "<u8"),
+    ("timestamp", "<f8"),
+    ("ball", "<f4", 3),
+    ("ball_direction", "<f4", 3),
+    ("ball_rotation", "<f4", 3),
+    ("ball_owned_team", "<i1"),
+    ("ball_owned_player", "<i1"),
+    ("game_mode", "<i1"),
+    ("score", "<i2", 2),
+    ("steps_left", "<i4"),
+] + [(f"{side}_{field[0]}",) + field[1:] for side in ("left", "right") for field in _TEAM_FIELDS], align=True)
+
+
+def _attach(name):
+    """Map an existing ring read-only.
+
+    Readers map the file under /dev/shm themselves rather than through
+    `SharedMemory`, whose resource tracker would unlink the writer's ring when
+    the reading process exits.
+    """
+    with open(os.path.join(SHM_DIRECTORY, name), "rb") as ring:
+        return mmap.mmap(ring.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _views(buffer):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buffer)
+    slots = np.ndarray((int(header["slots"]),), dtype=SLOT_DTYPE, buffer=buffer, offset=HEADER_DTYPE.itemsize)
+    return header, slots
+
+
+def ring_names():
+    """Names of the rings currently in shared memory (Linux keeps them in /dev/shm)."""
+    try:
+        return sorted(name for name in os.listdir(SHM_DIRECTORY)
+                      if name.startswith(RING_PREFIX) and not name.startswith(READER_LOCK_PREFIX))
+    except FileNotFoundError:
+        return []
+
+
+class RingWriter:
+    """Producer side of one match's ring. Not safe for concurrent writers."""
+
+    def __init__(self, match_id, slots=1024, name=None):
+        self.match_id = match_id
+        self.name = name or f"{RING_PREFIX}{uuid.uuid4().hex[:16]}"
+        size = HEADER_DTYPE.itemsize + slots * SLOT_DTYPE.itemsize
+        self._memory = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._memory.buf)
+        self._header["slots"] = slots
+        self._header["slot_size"] = SLOT_DTYPE.itemsize
+        self._header["match_id"] = match_id.encode()[:64]
+        self._header["version"] = RING_VERSION
+        _, self._slots = _views(self._memory.buf)
+        # Steps are assembled here and copied into their slot in one go.
+        self._staging = np.zeros((), dtype=SLOT_DTYPE)
+        self._fields = {name: self._staging[name] for name in SLOT_DTYPE.names}
+        self.written = 0
+        # Readers ignore the ring until the magic number is in place.
+        self._header["magic"] = RING_MAGIC
+
+    def write(self, observation, timestamp=None):
+        """Copy one raw observation (as from FootballEnv) into the next slot."""
+        fields = self._fields
+        fields["timestamp"][...] = time.time() if timestamp is None else timestamp
+        for name in ("ball", "ball_direction", "ball_rotation", "ball_owned_team", "ball_owned_player", "game_mode",
+                     "score", "steps_left"):
+            fields[name][...] = observation[name]
+        for side in ("left", "right"):
+            players = len(observation[f"{side}_team"])
+            fields[f"{side}_players"][...] = players
+            for name in ("team", "team_direction", "team_tired_factor", "team_active", "team_yellow_card",
+                         "team_roles"):
+                fields[f"{side}_{name}"][:players] = observation[f"{side}_{name}"]
+            fields[f"{side}_team_designated_player"][...] = observation[f"{side}_team_designated_player"]
+            controlled = observation.get(f"{side}_agent_controlled_player", ())
+            fields[f"{side}_agent_controlled_player"][...] = controlled[0] if len(controlled) else -1
+            sticky = observation.get(f"{side}_agent_sticky_actions", ())
+            fields[f"{side}_agent_sticky_actions"][...] = sticky[0] if len(sticky) else 0
+        index = self.written % len(self._slots)
+        fields["lock"][...] = 2 * self.written + 1
+        self._slots["lock"][index] = 2 * self.written + 1
+        self._slots[index] = self._staging
+        self._slots["lock"][index] = 2 * self.written + 2
+        self.written += 1
+        self._header["written"] = self.written
+
+    def close(self, unlink=True):
+        """Mark the ring finished; readers drain it and let go."""
+        self._header["closed"] = 1
+        del self._header, self._slots
+        self._memory.close()
+        if unlink:
+            self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def observation_from_slot(values):
+    """Rebuild the observation dict from a copied slot's `item()` tuple."""
+    slot = dict(zip(SLOT_DTYPE.names, values))
+    observation = {
+        "ball": slot["ball"],
+        "ball_direction": slot["ball_direction"],
+        "ball_rotation": slot["ball_rotation"],
+        "ball_owned_team": slot["ball_owned_team"],
+        "ball_owned_player": slot["ball_owned_player"],
+        "game_mode": slot["game_mode"],
+        "score": slot["score"].tolist(),
+        "steps_left": slot["steps_left"],
+    }
+    for side in ("left", "right"):
+        players = slot[f"{side}_players"]
+        for name in ("team", "team_direction", "team_tired_factor", "team_active", "team_yellow_card",
+                     "team_roles"):
+            observation[f"{side}_{name}"] = slot[f"{side}_{name}"][:players]
+        observation[f"{side}_team_designated_player"] = slot[f"{side}_team_designated_player"]
+        controlled = slot[f"{side}_agent_controlled_player"]
+        observation[f"{side}_agent_controlled_player"] = [controlled] if controlled >= 0 else []
+        observation[f"{side}_agent_sticky_actions"] = [slot[f"{side}_agent_sticky_actions"]]
+    return observation
+
+
+class RingReader:
+    """Consumer side of one ring. Starts at the oldest step still in the ring."""
+
+    def __init__(self, name):
+        self.name = name
+        self._memory = _attach(name)
+        self._header, self._slots = _views(self._memory)
+        if self._header["magic"] != RING_MAGIC or self._header["version"] != RING_VERSION:
+            self.close()
+            raise ValueError(f"{name} is not a version {RING_VERSION} observation ring")
+        self.match_id = self._header["match_id"].item().decode()
+        self.next_step = max(0, int(self._header["written"]) - len(self._slots))
+        self.overruns = 0
+
+    @property
+    def closed(self):
+        return bool(self._header["closed"])
+
+    def read(self, limit=256):
+        """Return up to `limit` new (step, timestamp, observation) tuples.
+
+        Steps the writer overwrote before they were read are skipped and
+        counted in `overruns`.
+        """
+        written = int(self._header["written"])
+        slots = len(self._slots)
+        if written - self.next_step > slots:
+            self.overruns += written - slots - self.next_step
+            self.next_step = written - slots
+        records = []
+        while self.next_step < written and len(records) < limit:
+            # Copy the contiguous run of new slots up to the end of the ring at once.
+            first = self.next_step
+            index = first % slots
+            count = min(written - first, limit - len(records), slots - index)
+            before = self._slots["lock"][index:index + count].copy()
+            chunk = self._slots[index:index + count].copy()
+            after = self._slots["lock"][index:index + count]
+            expected = 2 * np.arange(first, first + count, dtype=np.uint64) + 2
+            intact = (before == expected) & (after == expected)
+            self.next_step += count
+            self.overruns += count - int(intact.sum())
+            for offset in np.flatnonzero(intact).tolist():
+                values = chunk[offset].item()
+                records.append((first + offset, values[1], observation_from_slot(values)))
+        return records
+
+    def close(self):
+        self._header = self._slots = None
+        self._memory.close()
+
+
+class RingPoller:
+    """Module B's reader task: discovers rings and hands their steps to `on_steps`.
+
+    Every `poll_interval` seconds the poller reads whatever is new in each ring
+    it has attached and awaits `on_steps(match_id, records)` per ring. While
+    steps keep arriving it polls again straight away. New rings are picked up
+    every `discover_interval` seconds, when `accept(match_id)` is true and
+    this poller holds the lock for `reader`. Closed rings are drained and then
+    released.
+    """
+
+    def __init__(self, on_steps, poll_interval=0.005, discover_interval=1.0, batch=256, accept=None,
+                 reader="reader"):
+        self.on_steps = on_steps
+        self.poll_interval = poll_interval
+        self.discover_interval = discover_interval
+        self.batch = batch
+        self.accept = accept
+        self.reader = reader
+        self.steps = 0
+        self.released_overruns = 0
+        self._readers = {}
+        self._ignored = set()
+        self._lock = None
+        self._task = None
+
+    @property
+    def overruns(self):
+        return self.released_overruns + sum(reader.overruns for reader in self._readers.values())
+
+    def stats(self):
+        return {
+            "reading": self._lock is not None,
+            "rings": {reader.match_id: reader.next_step for reader in self._readers.values()},
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "poll_interval": self.poll_interval,
+        }
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        for name in list(self._readers):
+            self._release(name)
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def elect(self):
+        """Take the lock for `reader` if it is free; return whether this poller holds it."""
+        if self._lock is None:
+            lock = open(os.path.join(SHM_DIRECTORY, f"{READER_LOCK_PREFIX}{self.reader}.lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                return False
+            self._lock = lock
+            print(f"Reading shared memory rings as {self.reader!r} in process {os.getpid()}")
+        return True
+
+    def discover(self):
+        for name in ring_names():
+            if name in self._readers or name in self._ignored:
+                continue
+            try:
+                reader = RingReader(name)
+            except (FileNotFoundError, ValueError):
+                continue
+            if self.accept is not None and not self.accept(reader.match_id):
+                # Another module B shard owns this match.
+                reader.close()
+                self._ignored.add(name)
+                continue
+            self._readers[name] = reader
+            print(f"Reading observations for match {reader.match_id} from shared memory ring {name}")
+
+    def _release(self, name):
+        reader = self._readers.pop(name)
+        self.released_overruns += reader.overruns
+        reader.close()
+
+    async def poll(self):
+        """Read every attached ring once; return the number of steps handed on."""
+        count = 0
+        for name, reader in list(self._readers.items()):
+            closed = reader.closed
+            records = reader.read(self.batch)
+            if records:
+                count += len(records)
+                await self.on_steps(reader.match_id, records)
+            elif closed:
+                self._release(name)
+        self.steps += count
+        return count
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_discovery = loop.time()
+        while True:
+            if loop.time() >= next_discovery:
+                if self.elect():
+                    self.discover()
+                self._ignored.intersection_update(ring_names())
+                next_discovery = loop.time() + self.discover_interval
+            try:
+                count = await self.poll()
+            except Exception as e:
+                print(f"Shared memory ring poll failed: {e!r}")
+                count = 0
+            await asyncio.sleep(0 if count else self.poll_interval)
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from common.shm_ring import READER_LOCK_PREFIX, SHM_DIRECTORY, RingPoller, RingReader, RingWriter, ring_names
+
+
+def observation(step, players=11):
+    observation = {
+        "ball": np.array([0.01 * step, 0.0, 0.1]),
+        "ball_direction": np.zeros(3),
+        "ball_rotation": np.zeros(3),
+        "ball_owned_team": -1,
+        "ball_owned_player": -1,
+        "game_mode": 0,
+        "score": [0, step % 3],
+        "steps_left": 3000 - step,
+    }
+    for side in ("left", "right"):
+        observation[f"{side}_team"] = np.full((players, 2), 0.5)
+        observation[f"{side}_team_direction"] = np.zeros((players, 2))
+        observation[f"{side}_team_tired_factor"] = np.zeros(players)
+        observation[f"{side}_team_active"] = np.ones(players, dtype=bool)
+        observation[f"{side}_team_yellow_card"] = np.zeros(players, dtype=bool)
+        observation[f"{side}_team_roles"] = np.arange(players)
+        observation[f"{side}_team_designated_player"] = 0
+        observation[f"{side}_agent_controlled_player"] = [step % players]
+        observation[f"{side}_agent_sticky_actions"] = [np.zeros(10, dtype=np.uint8)]
+    return observation
+
+
+@pytest.fixture
+def match_id():
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def reader():
+    """A reader name of its own, so the test's pollers do not compete with a running module B."""
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    yield name
+    lock = os.path.join(SHM_DIRECTORY, f"{READER_LOCK_PREFIX}{name}.lock")
+    if os.path.exists(lock):
+        os.unlink(lock)
+
+
+def test_reader_gets_every_step_in_order(match_id):
+    with RingWriter(match_id, slots=8) as writer:
+        reader = RingReader(writer.name)
+        assert reader.match_id == match_id
+        for step in range(5):
+            writer.write(observation(step), timestamp=float(step))
+        records = reader.read()
+        assert [(number, timestamp) for number, timestamp, _ in records] == [(n, float(n)) for n in range(5)]
+        rebuilt = records[3][2]
+        assert rebuilt["score"] == [0, 0]
+        assert rebuilt["steps_left"] == 2997
+        assert rebuilt["left_agent_controlled_player"] == [3]
+        np.testing.assert_allclose(rebuilt["ball"], [0.03, 0.0, 0.1], rtol=1e-6)
+        assert rebuilt["right_team"].shape == (11, 2)
+        assert reader.read() == []
+        reader.close()
+
+
+def test_reader_lapped_by_the_writer_counts_overruns(match_id):
+    with RingWriter(match_id, slots=4) as writer:
+        reader = RingReader(writer.name)
+        for step in range(10):
+            writer.write(observation(step), timestamp=float(step))
+        assert [number for number, _, _ in reader.read()] == [6, 7, 8, 9]
+        assert reader.overruns == 6
+        reader.close()
+
+
+def test_reader_rejects_other_shared_memory(match_id):
+    with RingWriter(match_id, slots=4) as writer:
+        writer._header["magic"] = 0
+        with pytest.raises(ValueError):
+            RingReader(writer.name)
+
+
+def test_only_one_poller_per_reader_name_reads(match_id, reader):
+    async def main():
+        received = {"first": [], "second": []}
+
+        def collector(name):
+            async def on_steps(ring_match_id, records):
+                if ring_match_id == match_id:
+                    received[name].extend(number for number, _, _ in records)
+            return on_steps
+
+        first = RingPoller(collector("first"), poll_interval=0.001, discover_interval=0.01, reader=reader)
+        second = RingPoller(collector("second"), poll_interval=0.001, discover_interval=0.01, reader=reader)
+        writer = RingWriter(match_id, slots=64)
+        await first.start()
+        await asyncio.sleep(0.05)
+        await second.start()
+        for step in range(20):
+            writer.write(observation(step))
+        await asyncio.sleep(0.1)
+        assert received == {"first": list(range(20)), "second": []}
+        assert first.stats()["reading"] and not second.stats()["reading"]
+
+        # When the reading poller goes away, the other takes over.
+        await first.stop()
+        writer.write(observation(20))
+        await asyncio.sleep(0.1)
+        assert second.stats()["reading"]
+        assert received["second"][-1] == 20
+        writer.close()
+        await asyncio.sleep(0.05)
+        await second.stop()
+        return second
+
+    second = asyncio.run(main())
+    assert second.stats()["rings"] == {}
+
+
+def test_poller_skips_rings_it_does_not_accept(match_id, reader):
+    async def main():
+        matches = []
+
+        async def on_steps(ring_match_id, records):
+            matches.append(ring_match_id)
+
+        poller = RingPoller(on_steps, poll_interval=0.001, discover_interval=0.01,
+                            accept=lambda ring_match_id: ring_match_id != match_id, reader=reader)
+        with RingWriter(match_id, slots=4) as writer:
+            writer.write(observation(0))
+            assert writer.name in ring_names()
+            await poller.start()
+            await asyncio.sleep(0.05)
+            assert match_id not in poller.stats()["rings"]
+            await poller.stop()
+        return matches
+
+    assert match_id not in asyncio.run(main())
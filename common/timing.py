@@ -0,0 +1,202 @@
+"""Per-hop request timing shared by modules A, B and C.
+
+`TimingMiddleware` gives every HTTP request a request ID (reusing the caller's
+X-Request-Id) and the chain start time (X-Request-Start, wall-clock seconds,
+set by the first hop). While the request is handled it collects:
+
+- downstream: time spent waiting on outbound calls made through a client from
+  `common.http_client`, whose event hooks forward both headers downstream
+- serialization: time spent in the body codec (`measure_serialization`) and
+  rendering JSON responses (`TimedJSONResponse`, the apps' default response
+  class); FastAPI's conversion of return values to JSON-compatible data
+  before rendering counts as handler time
+- handler: everything else
+
+The response gets a Server-Timing header with this hop's entries followed by
+the entries every downstream hop returned, so the first caller sees the whole
+chain, e.g. `a-total;dur=9.1, a-handler;dur=0.4, a-downstream;dur=8.6,
+a-network;dur=1.2, a-serialization;dur=0.1, b-total;dur=7.4, ...`. The
+network entry is the part of downstream wait the downstream hops did not
+account for themselves. Requests slower than SLOW_REQUEST_MS are logged with
+the full breakdown.
+
+Tasks inherit the context they are created in, request timing included. Work
+that may outlive the request that starts it goes through
+`create_background_task`, so it cannot add to a finished request's timing or
+send its request ID downstream. Concurrent copies of one call (hedging) run
+under `create_timed_task`, each with its own timing, and only the copy whose
+result is used is added to the request with `account`.
+"""
+import asyncio
+import contextvars
+import time
+import uuid
+from contextlib import contextmanager
+
+from fastapi.responses import JSONResponse
+
+from common.settings import env_number
+
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_START_HEADER = "x-request-start"
+SLOW_REQUEST_MS = env_number("SLOW_REQUEST_MS", 500.0, float)
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+
+    def __init__(self, request_id, chain_start):
+        self.request_id = request_id
+        self.chain_start = chain_start
+        self.downstream = 0.0
+        self.network = 0.0
+        self.serialization = 0.0
+        self.downstream_entries = []
+
+    def merge(self, other):
+        self.downstream += other.downstream
+        self.network += other.network
+        self.serialization += other.serialization
+        self.downstream_entries.extend(other.downstream_entries)
+
+    def server_timing(self, service, total):
+        handler = max(0.0, total - self.downstream - self.serialization)
+        entries = [
+            f"{service}-total;dur={total * 1e3:.3f}",
+            f"{service}-handler;dur={handler * 1e3:.3f}",
+            f"{service}-downstream;dur={self.downstream * 1e3:.3f}",
+            f"{service}-network;dur={self.network * 1e3:.3f}",
+            f"{service}-serialization;dur={self.serialization * 1e3:.3f}",
+        ]
+        return ", ".join(entries + self.downstream_entries)
+
+
+@contextmanager
+def measure_serialization():
+    """Count the enclosed block as serialization time of the current request, if any."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.serialization += time.perf_counter() - start
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose rendering counts as serialization time of the current request."""
+
+    def render(self, content):
+        with measure_serialization():
+            return super().render(content)
+
+
+def create_background_task(coro):
+    """Run `coro` as a task in a fresh context, outside any request's timing."""
+    return contextvars.Context().run(asyncio.create_task, coro)
+
+
+def create_timed_task(coro):
+    """Run `coro` as a task of the current request that accounts to its own timing.
+
+    Returns the task and that timing (None outside a request); pass the timing
+    to `account` if the task's result is used.
+    """
+    context = contextvars.copy_context()
+    timing = _current.get()
+    if timing is not None:
+        timing = RequestTiming(timing.request_id, timing.chain_start)
+        context.run(_current.set, timing)
+    return context.run(asyncio.create_task, coro), timing
+
+
+def account(timing):
+    """Add the timing of a `create_timed_task` task to the current request."""
+    current = _current.get()
+    if current is not None and timing is not None:
+        current.merge(timing)
+
+
+def _parse_total(server_timing):
+    # The first entry a hop returns is its own total.
+    first = server_timing.split(",", 1)[0]
+    for param in first.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name == "dur":
+            try:
+                return float(value) / 1e3
+            except ValueError:
+                return None
+    return None
+
+
+async def on_request(request):
+    """httpx request hook: forward the request ID and start time downstream."""
+    timing = _current.get()
+    if timing is None:
+        return
+    request.headers[REQUEST_ID_HEADER] = timing.request_id
+    request.headers[REQUEST_START_HEADER] = repr(timing.chain_start)
+    request.extensions["timing_start"] = time.perf_counter()
+
+
+async def on_response(response):
+    """httpx response hook: account the wait and collect the downstream Server-Timing."""
+    start = response.request.extensions.get("timing_start")
+    timing = _current.get()
+    if start is None or timing is None:
+        return
+    waited = time.perf_counter() - start
+    timing.downstream += waited
+    server_timing = response.headers.get("server-timing")
+    if server_timing:
+        timing.downstream_entries.append(server_timing)
+        downstream_total = _parse_total(server_timing)
+        if downstream_total is not None:
+            timing.network += max(0.0, waited - downstream_total)
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware, so timing adds no BaseHTTPMiddleware overhead."""
+
+    def __init__(self, app, service):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode() or uuid.uuid4().hex
+        try:
+            chain_start = float(headers[REQUEST_START_HEADER.encode()])
+        except (KeyError, ValueError):
+            chain_start = time.time()
+        timing = RequestTiming(request_id, chain_start)
+        token = _current.set(timing)
+        started = time.perf_counter()
+        total = None
+
+        async def send_with_timing(message):
+            nonlocal total
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - started
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.server_timing(self.service, total).encode()),
+                    (REQUEST_ID_HEADER.encode(), request_id.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if total is not None and total * 1e3 >= SLOW_REQUEST_MS:
+                print(f"Slow request {request_id} {scope['method']} {scope['path']} on module {self.service}: "
+                      f"{total * 1e3:.1f} ms (chain age {(time.time() - chain_start) * 1e3:.1f} ms); "
+                      f"Server-Timing: {timing.server_timing(self.service, total)}")
@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common import timing
+from common.timing import TimedJSONResponse, TimingMiddleware
+
+
+def server_timing(response):
+    entries = {}
+    for entry in response.headers["server-timing"].split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+def test_json_responses_count_as_serialization():
+    app = FastAPI(default_response_class=TimedJSONResponse)
+    app.add_middleware(TimingMiddleware, service="t")
+
+    @app.get("/big")
+    async def big():
+        return {"values": list(range(200000))}
+
+    response = TestClient(app).get("/big")
+    assert response.status_code == 200
+    assert len(response.json()["values"]) == 200000
+    assert server_timing(response)["t-serialization"] > 0
+
+
+def test_background_tasks_do_not_see_the_request():
+    async def current():
+        return timing._current.get()
+
+    async def main():
+        request = timing.RequestTiming("req", 0.0)
+        token = timing._current.set(request)
+        try:
+            assert await asyncio.create_task(current()) is request
+            return await timing.create_background_task(current())
+        finally:
+            timing._current.reset(token)
+
+    assert asyncio.run(main()) is None
+
+
+def test_only_accounted_timed_tasks_add_to_the_request():
+    async def call(downstream):
+        timing._current.get().downstream += downstream
+        timing._current.get().downstream_entries.append(f"c-total;dur={downstream * 1e3:.3f}")
+
+    async def main():
+        request = timing.RequestTiming("req", 0.0)
+        token = timing._current.set(request)
+        try:
+            winner, winner_timing = timing.create_timed_task(call(0.01))
+            loser, loser_timing = timing.create_timed_task(call(0.5))
+            await asyncio.gather(winner, loser)
+            assert winner_timing.request_id == loser_timing.request_id == "req"
+            timing.account(winner_timing)
+        finally:
+            timing._current.reset(token)
+        return request
+
+    request = asyncio.run(main())
+    assert request.downstream == 0.01
+    assert request.downstream_entries == ["c-total;dur=10.000"]
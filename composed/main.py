@@ -0,0 +1,52 @@
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+from dotenv import load_dotenv
+load_dotenv()
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from common.local import register_local_app, unregister_local_app
+
+try:
+    MODULE_A_PORT = int(os.environ["MODULE_A_PORT"])
+except KeyError as e:
+    raise RuntimeError(f"Missing required environment variable: {e.args[0]}")
+
+# Modules A and B reach their downstreams through this app's own /b and /c
+# mounts, which the shared HTTP client and event streams call in-process.
+# Set before the modules are imported, since they read their URLs at import.
+COMPOSED_URL = f"http://127.0.0.1:{MODULE_A_PORT}"
+os.environ["MODULE_B_URL"] = f"{COMPOSED_URL}/b"
+os.environ["MODULE_C_URL"] = f"{COMPOSED_URL}/c"
+
+from module_a.main import app as module_a_app
+from module_b.main import app as module_b_app
+from module_c.main import app as module_c_app
+
+@asynccontextmanager
+async def lifespan(app):
+    register_local_app(COMPOSED_URL, app)
+    try:
+        async with AsyncExitStack() as stack:
+            # Mounted apps do not get lifespan events; run theirs, downstream first.
+            for module_app in (module_c_app, module_b_app, module_a_app):
+                await stack.enter_async_context(module_app.router.lifespan_context(module_app))
+            yield
+    finally:
+        unregister_local_app(COMPOSED_URL)
+
+# Module A keeps the root so the chain's entry point is unchanged; all three
+# modules share one /metrics registry, served by module A.
+app = Starlette(
+    routes=[
+        Mount("/b", app=module_b_app),
+        Mount("/c", app=module_c_app),
+        Mount("/", app=module_a_app),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    # Module C's comment feeds never end on their own; don't let them hold up shutdown.
+    uvicorn.run("composed.main:app", host="0.0.0.0", port=MODULE_A_PORT, timeout_graceful_shutdown=5)
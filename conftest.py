@@ -0,0 +1,11 @@
+import os
+
+# Modules A, B and C read these at import and fail without them.
+for var, value in {
+    "MODULE_A_PORT": "8000",
+    "MODULE_B_PORT": "8001",
+    "MODULE_C_PORT": "8002",
+    "MODULE_B_URL": "http://localhost:8001",
+    "MODULE_C_URL": "http://localhost:8002",
+}.items():
+    os.environ.setdefault(var, value)
@@ -0,0 +1,280 @@
+# coding=utf-8
+# Copyright 2019 Google LLC
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Runs many headless matches in a process pool (play_game.py --matches)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import multiprocessing
+import os
+import time
+import timeit
+import urllib.request
+
+from absl import logging
+
+from gfootball.env import config
+from gfootball.env import football_env
+
+# Summaries buffered before a sink writes or posts them.
+SINK_BATCH = 100
+# Longest a buffered summary waits for its batch to fill, in seconds.
+SINK_FLUSH_INTERVAL = 1.0
+# Summaries ModuleBSink sends between two complete ones.
+DELTA_KEYFRAME_INTERVAL = 50
+
+MatchSpec = collections.namedtuple('MatchSpec', [
+    'index', 'match_id', 'level', 'players', 'action_set', 'max_steps',
+    'summary_rate', 'sink'
+])
+
+
+def _codec():
+  # The project's wire format; needs the project root on PYTHONPATH.
+  from common import codec  # pylint: disable=g-import-not-at-top
+  return codec
+
+
+class _BufferedSink(object):
+  """Collects summaries and hands them on in batches."""
+
+  def __init__(self):
+    self._pending = []
+    self._last_flush = timeit.default_timer()
+    # Summaries delivered.
+    self.sent = 0
+
+  def add(self, match_id, step, observation, summary):
+    self._pending.append(self._record(match_id, step, observation, summary))
+    if (len(self._pending) >= SINK_BATCH or
+        timeit.default_timer() - self._last_flush >= SINK_FLUSH_INTERVAL):
+      self.flush()
+
+  def flush(self):
+    if self._pending:
+      self.sent += self._send(self._pending)
+      self._pending = []
+    self._last_flush = timeit.default_timer()
+
+  def close(self):
+    self.flush()
+
+
+class JsonlSink(_BufferedSink):
+  """Appends one JSON line per summary to a file shared by all matches.
+
+  Every batch goes out in a single write to a file opened with O_APPEND, so
+  lines from different processes never interleave.
+  """
+
+  def __init__(self, path):
+    _BufferedSink.__init__(self)
+    self._codec = _codec()
+    self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+  def _record(self, match_id, step, observation, summary):
+    return self._codec.encode(
+        {'match_id': match_id, 'step': step, 'time': time.time(),
+         'summary': summary}, self._codec.JSON_CONTENT_TYPE)
+
+  def _send(self, records):
+    os.write(self._fd, b'\n'.join(records) + b'\n')
+    return len(records)
+
+  def close(self):
+    _BufferedSink.close(self)
+    os.close(self._fd)
+
+
+class ModuleBSink(_BufferedSink):
+  """Posts one match's summaries to module B's /events as msgpack batches.
+
+  Summaries are delta encoded (common.delta): every `keyframe_interval`-th
+  one is sent whole, the others only with the fields that changed. Module B
+  rebuilds them per match. After a batch is lost, or when module B reports
+  that it needs a keyframe for the match, the next summary is sent whole.
+  Without a summary the raw observation is sent instead.
+  """
+
+  def __init__(self, url, keyframe_interval=DELTA_KEYFRAME_INTERVAL):
+    _BufferedSink.__init__(self)
+    from common.delta import DeltaEncoder  # pylint: disable=g-import-not-at-top
+    self._codec = _codec()
+    self._encoder = DeltaEncoder(keyframe_interval)
+    self._url = url.rstrip('/') + '/events'
+
+  def _record(self, match_id, step, observation, summary):
+    return {'match_id': match_id,
+            'delta': self._encoder.encode(
+                summary if summary is not None else observation),
+            'timestamp': time.time()}
+
+  def _send(self, records):
+    request = urllib.request.Request(
+        self._url, data=self._codec.encode(records),
+        headers={'content-type': self._codec.MSGPACK_CONTENT_TYPE})
+    try:
+      with urllib.request.urlopen(request, timeout=10) as response:
+        body = self._codec.decode(response.read(),
+                                  response.headers.get('content-type'))
+    except (OSError, ValueError) as e:
+      logging.warning('Posting %d summaries to %s failed: %s', len(records),
+                      self._url, e)
+      self._encoder.force_keyframe()
+      return 0
+    if records[0]['match_id'] in body.get('keyframe_required', ()):
+      logging.info('Module B needs a keyframe for match %s',
+                   records[0]['match_id'])
+      self._encoder.force_keyframe()
+    return len(records)
+
+
+class ShmRingSink(object):
+  """Writes raw observations into a shared memory ring for module B."""
+
+  def __init__(self, match_id):
+    from common.shm_ring import RingWriter  # pylint: disable=g-import-not-at-top
+    self._ring = RingWriter(match_id)
+    self.sent = 0
+
+  def add(self, match_id, step, observation, summary):
+    self._ring.write(observation)
+    self.sent += 1
+
+  def close(self):
+    self._ring.close()
+
+
+def make_sink(spec, match_id):
+  """Sink for `spec`: a module B URL, 'shm', a .jsonl path or '' for none."""
+  if not spec:
+    return None
+  if spec.startswith('http://') or spec.startswith('https://'):
+    return ModuleBSink(spec)
+  if spec == 'shm':
+    return ShmRingSink(match_id)
+  return JsonlSink(spec)
+
+
+# This process's environment and the settings it was made with.
+_env = None
+_env_values = None
+
+
+def _environment(cfg_values):
+  """Returns this process's environment for `cfg_values`.
+
+  A pool worker keeps its environment for its next match with the same
+  settings, which then only costs the reset() starting it. Other settings
+  close it, handing its engine back to FootballEnvCore's per-process pool.
+  """
+  global _env, _env_values
+  if _env is not None and _env_values != cfg_values:
+    _close_environment()
+  if _env is None:
+    _env = football_env.FootballEnv(config.Config(dict(cfg_values)))
+    _env_values = cfg_values
+  return _env
+
+
+def _close_environment():
+  global _env, _env_values
+  if _env is not None:
+    _env.close()
+    _env = _env_values = None
+
+
+def run_match(spec, summarize):
+  """Plays one headless match and returns its result as a dict."""
+  cfg_values = {
+      'action_set': spec.action_set,
+      'players': spec.players,
+      'real_time': False,
+  }
+  if spec.level:
+    cfg_values['level'] = spec.level
+  env = _environment(cfg_values)
+  sink = make_sink(spec.sink, spec.match_id)
+  # Summaries are only built when the sink is due one.
+  interval = 1.0 / spec.summary_rate if spec.summary_rate > 0 else 0.0
+  next_summary = 0.0
+  step = 0
+  start = timeit.default_timer()
+  completed = False
+  try:
+    observation = env.reset()
+    done = False
+    while not done and (not spec.max_steps or step < spec.max_steps):
+      observation, _, done, _ = env.step([])
+      step += 1
+      if sink is None:
+        continue
+      now = timeit.default_timer()
+      if now >= next_summary or done:
+        summary = summarize(observation) if summarize else None
+        sink.add(spec.match_id, step, observation, summary)
+        next_summary = now + interval
+    completed = True
+  finally:
+    if sink is not None:
+      sink.close()
+    if not completed:
+      # A match that failed may leave the environment in any state.
+      _close_environment()
+  seconds = timeit.default_timer() - start
+  return {
+      'match': spec.index,
+      'match_id': spec.match_id,
+      'level': spec.level,
+      'steps': step,
+      'seconds': seconds,
+      'steps_per_second': step / seconds if seconds else 0.0,
+      'score': [int(goals) for goals in observation['score']],
+      'summaries': sink.sent if sink is not None else 0,
+  }
+
+
+def _run_match(args):
+  return run_match(*args)
+
+
+def run_batch(specs, processes, summarize=None):
+  """Plays `specs` on `processes` worker processes.
+
+  Returns the per-match results, in match order, and the aggregate.
+  """
+  start = timeit.default_timer()
+  # Each worker process keeps its environment, and engine, for its next match.
+  with multiprocessing.Pool(processes) as pool:
+    results = []
+    for result in pool.imap_unordered(_run_match,
+                                      [(spec, summarize) for spec in specs]):
+      logging.info('Match %s finished: %d steps, score %s, %.1f steps/s',
+                   result['match_id'], result['steps'], result['score'],
+                   result['steps_per_second'])
+      results.append(result)
+  seconds = timeit.default_timer() - start
+  steps = sum(result['steps'] for result in results)
+  aggregate = {
+      'matches': len(results),
+      'processes': processes,
+      'steps': steps,
+      'seconds': seconds,
+      'steps_per_second': steps / seconds if seconds else 0.0,
+  }
+  return sorted(results, key=lambda result: result['match']), aggregate
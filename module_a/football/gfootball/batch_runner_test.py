@@ -0,0 +1,148 @@
+# coding=utf-8
+# Copyright 2019 Google LLC
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Test for batch_runner.py sinks. Needs the project root on PYTHONPATH."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+from six.moves import BaseHTTPServer
+
+from common import codec
+from gfootball import batch_runner
+
+
+class _ModuleB(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Records posted batches and asks for a keyframe after the first one."""
+
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers['content-length']))
+    batches = self.server.batches
+    batches.append(codec.decode(body, self.headers['content-type']))
+    answer = json.dumps({
+        'keyframe_required': ['m'] if len(batches) == 1 else []
+    }).encode()
+    self.send_response(200)
+    self.send_header('content-type', 'application/json')
+    self.send_header('content-length', str(len(answer)))
+    self.end_headers()
+    self.wfile.write(answer)
+
+  def log_message(self, *args):
+    pass
+
+
+class ModuleBSinkTest(absltest.TestCase):
+
+  def setUp(self):
+    super(ModuleBSinkTest, self).setUp()
+    self._server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _ModuleB)
+    self._server.batches = []
+    thread = threading.Thread(target=self._server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    self.addCleanup(self._server.server_close)
+    self.addCleanup(self._server.shutdown)
+
+  def testDeltasAndKeyframeOnRequest(self):
+    sink = batch_runner.ModuleBSink(
+        'http://127.0.0.1:{}'.format(self._server.server_port))
+    summaries = [{'score': '0 - 0', 'steps_left': left} for left in range(6)]
+    for step, summary in enumerate(summaries[:3]):
+      sink.add('m', step, None, summary)
+    sink.flush()
+    for step, summary in enumerate(summaries[3:]):
+      sink.add('m', step, None, summary)
+    sink.close()
+    first, second = self._server.batches
+    self.assertEqual([event['delta']['type'] for event in first],
+                     ['key', 'delta', 'delta'])
+    self.assertEqual(first[1]['delta']['fields'], {'steps_left': 1})
+    # Module B asked for a keyframe in its answer to the first batch.
+    self.assertEqual([event['delta']['type'] for event in second],
+                     ['key', 'delta', 'delta'])
+    self.assertEqual(second[0]['delta']['fields'], summaries[3])
+    self.assertEqual(sink.sent, 6)
+
+  def testKeyframeAfterLostBatch(self):
+    sink = batch_runner.ModuleBSink('http://127.0.0.1:9')
+    sink.add('m', 0, None, {'steps_left': 2})
+    sink.flush()
+    self.assertEqual(sink.sent, 0)
+    record = sink._record('m', 1, None, {'steps_left': 1})
+    self.assertEqual(record['delta']['type'], 'key')
+
+
+class _Env(object):
+  """Stands in for FootballEnv: every match ends after two steps."""
+
+  def __init__(self, cfg):
+    self.config = cfg
+    self.resets = 0
+    self.closed = False
+    self._steps = 0
+
+  def reset(self):
+    self.resets += 1
+    self._steps = 0
+    return {'score': [0, 0]}
+
+  def step(self, action):
+    self._steps += 1
+    return {'score': [1, 0]}, 0.0, self._steps == 2, {}
+
+  def close(self):
+    self.closed = True
+
+
+class RunMatchTest(absltest.TestCase):
+
+  def setUp(self):
+    super(RunMatchTest, self).setUp()
+    patcher = mock.patch.object(batch_runner.football_env, 'FootballEnv',
+                                side_effect=_Env)
+    self._make_env = patcher.start()
+    self.addCleanup(patcher.stop)
+    self.addCleanup(batch_runner._close_environment)
+
+  def _spec(self, index, level=''):
+    return batch_runner.MatchSpec(
+        index=index, match_id='m{}'.format(index), level=level, players=[],
+        action_set='default', max_steps=0, summary_rate=0, sink='')
+
+  def testEnvironmentReusedForTheNextMatch(self):
+    first = batch_runner.run_match(self._spec(0), None)
+    second = batch_runner.run_match(self._spec(1), None)
+    self.assertEqual(self._make_env.call_count, 1)
+    self.assertEqual(batch_runner._env.resets, 2)
+    self.assertEqual([first['steps'], second['steps']], [2, 2])
+    self.assertEqual(second['score'], [1, 0])
+
+  def testOtherSettingsMakeANewEnvironment(self):
+    batch_runner.run_match(self._spec(0), None)
+    previous = batch_runner._env
+    batch_runner.run_match(self._spec(1, level='academy_empty_goal'), None)
+    self.assertTrue(previous.closed)
+    self.assertEqual(self._make_env.call_count, 2)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -86,6 +86,7 @@ class Config(object):
     self._values = {
         'action_set': 'default',
         'custom_display_stats': None,
+        'detect_events': False,
         'display_game_stats': True,
         'dump_full_episodes': False,
         'dump_scores': False,
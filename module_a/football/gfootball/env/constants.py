@@ -29,3 +29,7 @@ EXPOSED_OBSERVATIONS = frozenset({
     'right_team_tired_factor', 'right_team_yellow_card', 'right_team_active',
     'right_team_roles', 'score', 'steps_left', 'game_mode'
 })
+
+# Distance between the ball and the player who last had it after which the
+# ball counts as lost by that player.
+BALL_LOST_EPSILON = 0.05
@@ -0,0 +1,244 @@
+# coding=utf-8
+# Copyright 2019 Google LLC
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Incremental detection of football events from consecutive observations.
+
+EventDetector consumes raw observations one step at a time and keeps only the
+little state needed to compare a step with the previous ones, so each update
+is O(1) in the length of the episode. It works inline in the environment
+(config 'detect_events' adds the events of every step to info['events']) and
+on dumps (detect_events_in_dump).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+
+from gfootball.env import constants
+import numpy as np
+
+# Event kinds.
+PASS = 'pass'
+PASS_COMPLETED = 'pass_completed'
+SHOT = 'shot'
+INTERCEPTION = 'interception'
+POSSESSION_CHANGE = 'possession_change'
+GOAL = 'goal'
+SET_PIECE = 'set_piece'
+OUT_OF_PLAY = 'out_of_play'
+
+# An event at `step` of the episode. `team` is 0 for the left team, 1 for the
+# right team and None when no team applies; `player` indexes that team's
+# players. `details` holds kind-specific values. Passes and shots are reported
+# once the ball is clear of the player, with the step it was released.
+Event = collections.namedtuple('Event',
+                               ['kind', 'step', 'team', 'player', 'details'])
+
+GAME_MODE_NORMAL = 0
+GAME_MODES = ('normal', 'kick_off', 'goal_kick', 'free_kick', 'corner',
+              'throw_in', 'penalty')
+
+# Pitch and goal extents in observation coordinates.
+PITCH_HALF_LENGTH = 1.0
+PITCH_HALF_WIDTH = 0.42
+GOAL_HALF_WIDTH = 0.044
+
+# Distance between the ball and the player who released it after which the
+# ball counts as played away rather than still being dribbled.
+BALL_LOST_EPSILON = constants.BALL_LOST_EPSILON
+# A released ball heading for the goal mouth, widened by this margin, from
+# within SHOT_RANGE of the goal line is a shot.
+SHOT_GOAL_MARGIN = 0.05
+SHOT_RANGE = 0.6
+
+_TEAM_KEYS = ('left_team', 'right_team')
+
+
+class _Release(object):
+  """The ball leaving its owner, until somebody owns it again."""
+
+  def __init__(self, step, team, player):
+    self.step = step
+    self.team = team
+    self.player = player
+    self.kind = None
+
+
+class EventDetector(object):
+  """Turns a stream of raw observations into typed football events."""
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self._step = 0
+    self._game_mode = None
+    self._score = None
+    self._in_pitch = True
+    # Current owner (team, player), or None while the ball is loose.
+    self._owner = None
+    # Last player to own the ball and the team in possession, kept while the
+    # ball is loose.
+    self._last_touch = None
+    self._possession = None
+    self._release = None
+
+  def update(self, observation):
+    """Returns the list of events the step `observation` completes."""
+    step = self._step
+    self._step += 1
+    events = []
+    ball = observation['ball']
+    game_mode = int(observation['game_mode'])
+    score = (int(observation['score'][0]), int(observation['score'][1]))
+    in_pitch = (abs(ball[0]) <= PITCH_HALF_LENGTH and
+                abs(ball[1]) <= PITCH_HALF_WIDTH)
+    first = self._game_mode is None
+
+    if not first and score != self._score:
+      for team in (0, 1):
+        if score[team] > self._score[team]:
+          scorer = self._last_touch
+          events.append(Event(GOAL, step, team,
+                              scorer[1] if scorer and scorer[0] == team else None,
+                              {'score': list(score),
+                               'own_goal': bool(scorer and scorer[0] != team)}))
+      self._release = None
+    if not first and game_mode != self._game_mode and (
+        game_mode != GAME_MODE_NORMAL):
+      team = int(observation['ball_owned_team'])
+      events.append(Event(SET_PIECE, step, team if team != -1 else None, None,
+                          {'mode': _game_mode_name(game_mode)}))
+      self._release = None
+    if (self._in_pitch and not in_pitch and game_mode == GAME_MODE_NORMAL and
+        abs(ball[1]) > GOAL_HALF_WIDTH):
+      touch = self._last_touch
+      events.append(Event(OUT_OF_PLAY, step, touch[0] if touch else None,
+                          touch[1] if touch else None,
+                          {'ball': [float(ball[0]), float(ball[1])]}))
+      self._release = None
+
+    owned_team = int(observation['ball_owned_team'])
+    if owned_team != -1:
+      self._take(observation, step, (owned_team,
+                                     int(observation['ball_owned_player'])),
+                 events)
+    else:
+      self._loose(observation, step, game_mode == GAME_MODE_NORMAL and in_pitch,
+                  events)
+
+    self._game_mode = game_mode
+    self._score = score
+    self._in_pitch = in_pitch
+    return events
+
+  def _take(self, observation, step, owner, events):
+    team, player = owner
+    release = self._release
+    if release is not None and release.kind == PASS:
+      if team == release.team and player != release.player:
+        events.append(Event(PASS_COMPLETED, step, team, player,
+                            {'from': release.player,
+                             'steps': step - release.step}))
+      elif team != release.team:
+        events.append(Event(INTERCEPTION, step, team, player,
+                            {'from_team': release.team,
+                             'from_player': release.player}))
+    elif release is None or release.kind is None:
+      # Handed on to a teammate before the ball was seen clear of the passer.
+      previous = self._owner if release is None else (release.team,
+                                                      release.player)
+      if previous is not None and previous != owner and previous[0] == team:
+        started = step if release is None else release.step
+        events.append(Event(PASS, started, team, previous[1],
+                            {'target': player}))
+        events.append(Event(PASS_COMPLETED, step, team, player,
+                            {'from': previous[1], 'steps': step - started}))
+    if self._possession is not None and team != self._possession:
+      events.append(Event(POSSESSION_CHANGE, step, team, player,
+                          {'from_team': self._possession}))
+    self._release = None
+    self._owner = owner
+    self._last_touch = owner
+    self._possession = team
+
+  def _loose(self, observation, step, in_play, events):
+    if self._owner is not None and self._release is None and in_play:
+      self._release = _Release(step, *self._owner)
+    self._owner = None
+    release = self._release
+    if release is None or release.kind is not None:
+      return
+    ball = np.asarray(observation['ball'][:2], dtype=np.float64)
+    team = np.asarray(observation[_TEAM_KEYS[release.team]])
+    if np.hypot(*(ball - team[release.player])) <= BALL_LOST_EPSILON:
+      return
+    direction = np.asarray(observation['ball_direction'][:2], dtype=np.float64)
+    if _heading_for_goal(release.team, ball, direction):
+      release.kind = SHOT
+      goal_x = PITCH_HALF_LENGTH if release.team == 0 else -PITCH_HALF_LENGTH
+      events.append(Event(SHOT, release.step, release.team, release.player,
+                          {'distance': float(abs(goal_x - ball[0]))}))
+    else:
+      release.kind = PASS
+      events.append(Event(PASS, release.step, release.team, release.player,
+                          {'target': _pass_target(team, release.player, ball,
+                                                  direction)}))
+
+
+def _game_mode_name(game_mode):
+  if 0 <= game_mode < len(GAME_MODES):
+    return GAME_MODES[game_mode]
+  return 'mode_%d' % game_mode
+
+
+def _heading_for_goal(team, ball, direction):
+  """Whether a ball moving by `direction` per step enters `team`'s target goal."""
+  goal_x = PITCH_HALF_LENGTH if team == 0 else -PITCH_HALF_LENGTH
+  to_goal = goal_x - ball[0]
+  if abs(to_goal) > SHOT_RANGE or direction[0] * to_goal <= 0:
+    return False
+  y_at_goal = ball[1] + direction[1] * to_goal / direction[0]
+  return abs(y_at_goal) <= GOAL_HALF_WIDTH + SHOT_GOAL_MARGIN
+
+
+def _pass_target(team, passer, ball, direction):
+  """Teammate closest to the ball's line of travel ahead of it, or None."""
+  speed = np.hypot(*direction)
+  if speed == 0:
+    return None
+  unit = direction / speed
+  offsets = team - ball
+  along = offsets.dot(unit)
+  across = np.abs(offsets[:, 0] * unit[1] - offsets[:, 1] * unit[0])
+  across[along <= 0] = np.inf
+  across[passer] = np.inf
+  target = int(np.argmin(across))
+  return target if np.isfinite(across[target]) else None
+
+
+def detect_events(observations):
+  """Yields the events of a sequence of raw observations."""
+  detector = EventDetector()
+  for observation in observations:
+    for event in detector.update(observation):
+      yield event
+
+
+def detect_events_in_dump(dump):
+  """Yields the events of a dump, as loaded by ScriptHelpers.load_dump."""
+  return detect_events(step['observation'] for step in dump)
@@ -0,0 +1,123 @@
+# coding=utf-8
+# Copyright 2019 Google LLC
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Test for event_detector.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import absltest
+
+from gfootball.env import event_detector
+import numpy as np
+
+
+def make_observation(ball, owner=(-1, -1), direction=(0, 0), game_mode=0,
+                     score=(0, 0)):
+  left_team = np.array([[-1.0, 0.0], [-0.5, 0.0], [0.0, 0.1], [0.5, -0.1]])
+  right_team = -left_team
+  return {
+      'ball': np.array([ball[0], ball[1], 0.1]),
+      'ball_direction': np.array([direction[0], direction[1], 0.0]),
+      'ball_owned_team': owner[0],
+      'ball_owned_player': owner[1],
+      'game_mode': game_mode,
+      'score': list(score),
+      'left_team': left_team,
+      'right_team': right_team,
+  }
+
+
+def kinds(events):
+  return [event.kind for event in events]
+
+
+class EventDetectorTest(absltest.TestCase):
+
+  def testPassCompleted(self):
+    observations = [
+        make_observation((-0.5, 0.0), owner=(0, 1)),
+        make_observation((-0.48, 0.01), direction=(0.05, 0.01)),
+        make_observation((-0.4, 0.03), direction=(0.05, 0.01)),
+        make_observation((-0.1, 0.1), direction=(0.05, 0.01)),
+        make_observation((0.0, 0.1), owner=(0, 2)),
+    ]
+    events = list(event_detector.detect_events(observations))
+    self.assertEqual(kinds(events), [event_detector.PASS,
+                                     event_detector.PASS_COMPLETED])
+    self.assertEqual(events[0].step, 1)
+    self.assertEqual(events[0].player, 1)
+    self.assertEqual(events[0].details['target'], 2)
+    self.assertEqual(events[1].player, 2)
+    self.assertEqual(events[1].details, {'from': 1, 'steps': 3})
+
+  def testDribbleIsNotAPass(self):
+    observations = [
+        make_observation((-0.5, 0.0), owner=(0, 1)),
+        make_observation((-0.49, 0.0), direction=(0.01, 0.0)),
+        make_observation((-0.5, 0.0), owner=(0, 1)),
+    ]
+    self.assertEqual(list(event_detector.detect_events(observations)), [])
+
+  def testInterception(self):
+    observations = [
+        make_observation((-0.5, 0.0), owner=(0, 1)),
+        make_observation((-0.4, 0.02), direction=(0.05, 0.01)),
+        make_observation((-0.3, 0.05), owner=(1, 3)),
+    ]
+    self.assertEqual(kinds(event_detector.detect_events(observations)),
+                     [event_detector.PASS, event_detector.INTERCEPTION,
+                      event_detector.POSSESSION_CHANGE])
+
+  def testShotGoalAndKickOff(self):
+    observations = [
+        make_observation((0.5, -0.1), owner=(0, 3)),
+        make_observation((0.6, -0.08), direction=(0.05, 0.01)),
+        make_observation((1.01, 0.0), direction=(0.05, 0.01)),
+        make_observation((1.02, 0.0), score=(1, 0)),
+        make_observation((0.0, 0.0), owner=(1, 2), game_mode=1, score=(1, 0)),
+    ]
+    events = list(event_detector.detect_events(observations))
+    self.assertEqual(kinds(events), [event_detector.SHOT, event_detector.GOAL,
+                                     event_detector.SET_PIECE,
+                                     event_detector.POSSESSION_CHANGE])
+    self.assertEqual(events[1].team, 0)
+    self.assertEqual(events[1].player, 3)
+    self.assertEqual(events[1].details, {'score': [1, 0], 'own_goal': False})
+    self.assertEqual(events[2].details, {'mode': 'kick_off'})
+
+  def testOutOfPlay(self):
+    observations = [
+        make_observation((0.0, 0.4), owner=(1, 2)),
+        make_observation((0.0, 0.43), direction=(0.0, 0.02)),
+        make_observation((0.0, 0.42), owner=(0, 2), game_mode=5),
+    ]
+    events = list(event_detector.detect_events(observations))
+    self.assertEqual(kinds(events), [event_detector.OUT_OF_PLAY,
+                                     event_detector.SET_PIECE,
+                                     event_detector.POSSESSION_CHANGE])
+    self.assertEqual((events[0].team, events[0].player), (1, 2))
+    self.assertEqual(events[1].details, {'mode': 'throw_in'})
+
+  def testDump(self):
+    dump = [{'observation': make_observation((-0.5, 0.0), owner=(0, 1))},
+            {'observation': make_observation((-0.5, 0.0), owner=(1, 0))}]
+    self.assertEqual(kinds(event_detector.detect_events_in_dump(dump)),
+                     [event_detector.POSSESSION_CHANGE])
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -30,6 +30,7 @@ except ImportError:
   print('Cannot import gfootball_engine. Package was not installed properly.')
 from gfootball.env import config as cfg
 from gfootball.env import constants
+from gfootball.env import event_detector
 from gfootball.env import football_action_set
 from gfootball.env import observation_processor
 import numpy as np
@@ -41,11 +42,16 @@ _unused_engines = []
 _unused_rendering_engine = None
 _active_rendering = False
 
-try:
-  import cv2
-except ImportError:
-  import cv2
 
+def frame_view(screen, width, height):
+  """RGB frame of shape (height, width, 3) viewing the engine's screenshot.
+
+  The engine returns the screen as read by glReadPixels: rows of interleaved
+  RGB pixels, bottom row first. The frame is a read-only view of `screen`
+  with its rows reversed, so no pixel is copied.
+  """
+  frame = np.frombuffer(screen, dtype=np.uint8).reshape(height, width, 3)
+  return frame[::-1]
 
 
 class EnvState(object):
@@ -114,6 +120,8 @@ class FootballEnvCore(object):
     self._cumulative_reward = 0
     self._step_count = 0
     self._trace = trace
+    self._event_detector = (event_detector.EventDetector()
+                            if self._config['detect_events'] else None)
     self._reset(self._env.game_config.render, inc=inc)
     while not self._retrieve_observation():
       self._env.step()
@@ -243,7 +251,7 @@ class FootballEnvCore(object):
     debug['time'] = timeit.default_timer()
     debug.update(extra_data)
     self._cumulative_reward += reward
-    single_observation = copy.deepcopy(self._observation)
+    single_observation = self._copy_observation()
     trace = {
         'debug': debug,
         'observation': single_observation,
@@ -251,6 +259,8 @@ class FootballEnvCore(object):
         'cumulative_reward': self._cumulative_reward
     }
     info = {}
+    if self._event_detector:
+      info['events'] = self._event_detector.update(self._observation)
     self._trace.update(trace)
     dumps = self._trace.process_pending_dumps(episode_done)
     if dumps:
@@ -279,20 +289,9 @@ class FootballEnvCore(object):
     info = self._env.get_info()
     result = {}
     if self._env.game_config.render:
-      frame = self._env.get_frame()
-      frame = np.frombuffer(frame, dtype=np.uint8)
-      frame = np.reshape(frame, [
-          self._config['render_resolution_x'],
-          self._config['render_resolution_y'], 3
-      ])
-      frame = np.reshape(
-          np.concatenate([frame[:, :, 0], frame[:, :, 1], frame[:, :, 2]]), [
-              3, self._config['render_resolution_y'],
-              self._config['render_resolution_x']
-          ])
-      frame = np.transpose(frame, [1, 2, 0])
-      frame = np.flip(frame, 0)
-      result['frame'] = frame
+      result['frame'] = frame_view(self._env.get_frame(),
+                                   self._config['render_resolution_x'],
+                                   self._config['render_resolution_y'])
     result['ball'] = np.array(
         [info.ball_position[0], info.ball_position[1], info.ball_position[2]])
     # Ball's movement direction represented as [x, y] distance per step.
@@ -373,7 +372,14 @@ class FootballEnvCore(object):
     assert (self._env.state == GameState.game_running or
             self._env.state == GameState.game_done), (
                 'reset() must be called before observation()')
-    return copy.deepcopy(self._observation)
+    return self._copy_observation()
+
+  def _copy_observation(self):
+    """Deep copy of the observation that shares its read-only frame."""
+    memo = {}
+    if 'frame' in self._observation:
+      memo[id(self._observation['frame'])] = self._observation['frame']
+    return copy.deepcopy(self._observation, memo)
 
   def sticky_actions_state(self, left_team, player_id):
     result = []
@@ -399,6 +405,9 @@ class FootballEnvCore(object):
     assert self._retrieve_observation()
     from_picle = six.moves.cPickle.loads(res)
     self._state = from_picle['FootballEnvCore']
+    if self._event_detector:
+      # Events are detected relative to the restored state from now on.
+      self._event_detector.reset()
     if self._trace is None:
       self._trace = observation_processor.ObservationProcessor(self._config)
     return from_picle
@@ -434,9 +443,9 @@ class FootballEnvCore(object):
       self._env.render(True)
       self._retrieve_observation()
     if mode == 'rgb_array':
-      frame = self._observation['frame']
-      b, g, r = cv2.split(frame)
-      return cv2.merge((r, g, b))
+      # A writable, C-contiguous copy, as callers such as video writers expect;
+      # the frame in the observation stays a read-only view.
+      return np.ascontiguousarray(self._observation['frame'][..., ::-1])
     elif mode == 'human':
       return True
     return False
@@ -405,7 +405,7 @@ class ObservationProcessor(object):
   def __init__(self, config):
     # Const. configuration
     self._ball_takeover_epsilon = 0.03
-    self._ball_lost_epsilon = 0.05
+    self._ball_lost_epsilon = const.BALL_LOST_EPSILON
     self._frame = 0
     self._dump_config = {}
     self._dump_config['score'] = DumpConfig(
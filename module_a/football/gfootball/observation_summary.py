@@ -0,0 +1,233 @@
+# coding=utf-8
+# Copyright 2019 Google LLC
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Table-driven text summaries of raw observations, as printed by play_game.
+
+Every string a summary can contain is built once: the pitch zones form a
+grid of precomputed descriptions indexed by the quantized ball position, and
+role, game mode and sticky action names are interned tables. Strings built
+from several values (ball owner, score, active actions) are cached by those
+values, so a step whose values did not change reuses the previous strings.
+SummaryFormatter.summarize handles one observation; summarize_batch handles a
+whole sequence, such as a dump, with numpy.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import bisect
+
+import numpy as np
+
+ROLE_NAMES = (
+    'Goalkeeper', 'Centre Back', 'Left Back', 'Right Back',
+    'Defensive Midfielder', 'Central Midfielder', 'Left Midfielder',
+    'Right Midfielder', 'Attacking Midfielder', 'Centre Forward')
+STICKY_ACTION_NAMES = (
+    'move left', 'move top-left', 'move top', 'move top-right', 'move right',
+    'move bottom-right', 'move bottom', 'move bottom-left', 'sprint',
+    'dribble')
+GAME_MODE_NAMES = ('Normal', 'Kick Off', 'Goal Kick', 'Free Kick', 'Corner',
+                   'Throw In', 'Penalty')
+
+# Zone edges along the pitch: x below the first edge is zone 0, and so on.
+X_EDGES = (-0.66, -0.33, 0.33, 0.66)
+X_ZONES = ('left defensive third', 'left midfield', 'center midfield',
+           'right midfield', 'right attacking third')
+# Across the pitch: y < -Y_EDGE is the top, y > Y_EDGE the bottom.
+Y_EDGE = 0.28
+Y_ZONES = ('top', 'central', 'bottom')
+ZONE_GRID = tuple(
+    tuple('{}, {} area'.format(horizontal, vertical) for vertical in Y_ZONES)
+    for horizontal in X_ZONES)
+_ZONE_TABLE = np.array(ZONE_GRID, dtype=object)
+
+UNKNOWN = 'Unknown'
+NO_OWNER = 'No one owns the ball'
+NO_ACTIONS = 'None'
+UNKNOWN_CONTROLLED = 'Unknown controlled player'
+MOVEMENTS = ('Moving right', 'Moving left')
+_MOVEMENT_TABLE = np.array(MOVEMENTS, dtype=object)
+_TEAMS = ('Left', 'Right')
+_TEAM_ROLES = ('left_team_roles', 'right_team_roles')
+
+
+def role_name(role_id):
+  if 0 <= role_id < len(ROLE_NAMES):
+    return ROLE_NAMES[role_id]
+  return 'Unknown Role {}'.format(role_id)
+
+
+def sticky_action_name(index):
+  if 0 <= index < len(STICKY_ACTION_NAMES):
+    return STICKY_ACTION_NAMES[index]
+  return 'Unknown Action {}'.format(index)
+
+
+def game_mode_name(mode_id):
+  if 0 <= mode_id < len(GAME_MODE_NAMES):
+    return GAME_MODE_NAMES[mode_id]
+  return 'Unknown Mode {}'.format(mode_id)
+
+
+def zone(x, y):
+  """(along, across) indices of the ZONE_GRID cell holding (x, y)."""
+  return bisect.bisect_right(X_EDGES, x), int(y >= -Y_EDGE) + int(y > Y_EDGE)
+
+
+def describe_ball_position(x, y):
+  horizontal, vertical = zone(x, y)
+  return ZONE_GRID[horizontal][vertical]
+
+
+class SummaryFormatter(object):
+  """Builds play_game's observation summaries from lookup tables and caches.
+
+  The caches are keyed by the values a string is built from, so they stay
+  valid across steps, episodes and matches, and stay small: there are only
+  so many owners, scores and sticky action combinations.
+  """
+
+  def __init__(self):
+    self._owners = {}
+    self._controlled = {}
+    self._actions = {}
+    self._scores = {}
+
+  def summarize(self, obs):
+    ball = obs.get('ball')
+    if ball is not None and len(ball) >= 2:
+      x, y = float(ball[0]), float(ball[1])
+      ball_position = ZONE_GRID[bisect.bisect_right(X_EDGES, x)][
+          (y >= -Y_EDGE) + (y > Y_EDGE)]
+    else:
+      ball_position = UNKNOWN
+    direction = obs.get('ball_direction')
+    if direction is not None and len(direction) > 0:
+      ball_movement = MOVEMENTS[float(direction[0]) < 0]
+    else:
+      ball_movement = UNKNOWN
+    if 'game_mode' in obs:
+      game_mode = game_mode_name(obs['game_mode'])
+    else:
+      game_mode = UNKNOWN
+    score = obs.get('score')
+    return {
+        'ball_position': ball_position,
+        'ball_movement': ball_movement,
+        'ball_owner': self._owner(obs, obs.get('ball_owned_team', -1),
+                                  obs.get('ball_owned_player', -1)),
+        'controlled_player': self._controlled_player(obs),
+        'current_actions': self._current_actions(obs),
+        'game_mode': game_mode,
+        'score': (self._score(score[0], score[1])
+                  if score is not None and len(score) == 2 else UNKNOWN),
+        'steps_left': obs.get('steps_left', UNKNOWN),
+    }
+
+  def _owner(self, obs, team, player):
+    if team == -1:
+      return NO_OWNER
+    roles = obs.get(_TEAM_ROLES[team != 0])
+    role = (roles[player]
+            if roles is not None and 0 <= player < len(roles) else None)
+    key = (team, player, role)
+    text = self._owners.get(key)
+    if text is None:
+      text = self._owners[key] = '{} team\'s {} (Player {})'.format(
+          _TEAMS[team != 0], role_name(role) if role is not None else
+          'Player {}'.format(player), player)
+    return text
+
+  def _controlled_player(self, obs):
+    controlled = obs.get('left_agent_controlled_player')
+    roles = obs.get('left_team_roles')
+    if controlled is None or not len(controlled) or roles is None:
+      return UNKNOWN_CONTROLLED
+    player = controlled[0]
+    if player >= len(roles):
+      return UNKNOWN_CONTROLLED
+    key = (player, roles[player])
+    text = self._controlled.get(key)
+    if text is None:
+      text = self._controlled[key] = (
+          'Controlling player {} of Left team as {}'.format(
+              player, role_name(key[1])))
+    return text
+
+  def _current_actions(self, obs):
+    sticky = obs.get('left_agent_sticky_actions')
+    if sticky is None or not len(sticky):
+      return NO_ACTIONS
+    sticky = sticky[0]
+    # The engine's sticky actions are uint8 arrays; their bytes identify them.
+    key = sticky.tobytes() if hasattr(sticky, 'tobytes') else tuple(sticky)
+    text = self._actions.get(key)
+    if text is None:
+      text = self._actions[key] = ', '.join(
+          sticky_action_name(i) for i, value in enumerate(sticky)
+          if value == 1) or NO_ACTIONS
+    return text
+
+  def _score(self, left, right):
+    key = (left, right)
+    text = self._scores.get(key)
+    if text is None:
+      text = self._scores[key] = '{} - {}'.format(left, right)
+    return text
+
+  def summarize_batch(self, observations):
+    """Summaries of a sequence of raw observations, e.g. a whole dump.
+
+    Zones and ball movements are looked up for every step at once with numpy.
+    Every observation must carry the raw observation keys.
+    """
+    observations = list(observations)
+    if not observations:
+      return []
+    balls = np.array([obs['ball'] for obs in observations])
+    horizontal = np.searchsorted(X_EDGES, balls[:, 0], side='right')
+    vertical = (balls[:, 1] >= -Y_EDGE).astype(int) + (balls[:, 1] > Y_EDGE)
+    positions = _ZONE_TABLE[horizontal, vertical].tolist()
+    directions = np.array([obs['ball_direction'] for obs in observations])
+    movements = _MOVEMENT_TABLE[(directions[:, 0] < 0).astype(int)].tolist()
+    owner, controlled_player, current_actions, score = (
+        self._owner, self._controlled_player, self._current_actions,
+        self._score)
+    summaries = []
+    for obs, ball_position, ball_movement in zip(observations, positions,
+                                                 movements):
+      game_mode = obs['game_mode']
+      summaries.append({
+          'ball_position': ball_position,
+          'ball_movement': ball_movement,
+          'ball_owner': owner(obs, obs['ball_owned_team'],
+                              obs['ball_owned_player']),
+          'controlled_player': controlled_player(obs),
+          'current_actions': current_actions(obs),
+          'game_mode': (GAME_MODE_NAMES[game_mode]
+                        if 0 <= game_mode < len(GAME_MODE_NAMES) else
+                        game_mode_name(game_mode)),
+          'score': score(obs['score'][0], obs['score'][1]),
+          'steps_left': obs['steps_left'],
+      })
+    return summaries
+
+
+def summarize_dump(dump, formatter=None):
+  """Summaries of every step of a dump, as loaded by ScriptHelpers.load_dump."""
+  formatter = formatter or SummaryFormatter()
+  return formatter.summarize_batch(step['observation'] for step in dump)
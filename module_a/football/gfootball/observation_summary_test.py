@@ -0,0 +1,99 @@
+# coding=utf-8
+# Copyright 2019 Google LLC
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Test for observation_summary.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import absltest
+
+from gfootball import observation_summary
+import numpy as np
+
+
+def make_observation(ball=(0.1, 0.0), owner=(0, 3), sticky=(0,) * 10,
+                     game_mode=0, score=(1, 2)):
+  return {
+      'ball': np.array([ball[0], ball[1], 0.1]),
+      'ball_direction': np.array([-0.01, 0.0, 0.0]),
+      'ball_owned_team': owner[0],
+      'ball_owned_player': owner[1],
+      'left_team_roles': np.array([0, 1, 2, 9]),
+      'right_team_roles': np.array([0, 5, 6, 7]),
+      'left_agent_controlled_player': [2],
+      'left_agent_sticky_actions': [np.array(sticky, dtype=np.uint8)],
+      'game_mode': game_mode,
+      'score': list(score),
+      'steps_left': 100,
+  }
+
+
+class ObservationSummaryTest(absltest.TestCase):
+
+  def testSummary(self):
+    summary = observation_summary.SummaryFormatter().summarize(
+        make_observation(sticky=(0, 0, 0, 0, 1, 0, 0, 0, 1, 0)))
+    self.assertEqual(summary, {
+        'ball_position': 'center midfield, central area',
+        'ball_movement': 'Moving left',
+        'ball_owner': 'Left team\'s Centre Forward (Player 3)',
+        'controlled_player': 'Controlling player 2 of Left team as Left Back',
+        'current_actions': 'move right, sprint',
+        'game_mode': 'Normal',
+        'score': '1 - 2',
+        'steps_left': 100,
+    })
+
+  def testZoneEdges(self):
+    describe = observation_summary.describe_ball_position
+    self.assertEqual(describe(-0.67, -0.29), 'left defensive third, top area')
+    self.assertEqual(describe(-0.66, -0.28), 'left midfield, central area')
+    self.assertEqual(describe(0.66, 0.28), 'right attacking third, central area')
+    self.assertEqual(describe(0.5, 0.3), 'right midfield, bottom area')
+
+  def testUnknownValues(self):
+    summary = observation_summary.SummaryFormatter().summarize(
+        make_observation(owner=(1, 7), game_mode=9))
+    self.assertEqual(summary['ball_owner'], 'Right team\'s Player 7 (Player 7)')
+    self.assertEqual(summary['game_mode'], 'Unknown Mode 9')
+    self.assertEqual(summary['current_actions'], 'None')
+    self.assertEqual(observation_summary.SummaryFormatter().summarize({}), {
+        'ball_position': 'Unknown',
+        'ball_movement': 'Unknown',
+        'ball_owner': 'No one owns the ball',
+        'controlled_player': 'Unknown controlled player',
+        'current_actions': 'None',
+        'game_mode': 'Unknown',
+        'score': 'Unknown',
+        'steps_left': 'Unknown',
+    })
+
+  def testBatchMatchesSingleSteps(self):
+    observations = [
+        make_observation(ball=(x, y), owner=owner, game_mode=mode)
+        for x, y, owner, mode in [(-0.9, 0.0, (-1, -1), 1), (0.0, 0.4, (0, 1), 0),
+                                  (0.7, -0.3, (1, 2), 4)]
+    ]
+    formatter = observation_summary.SummaryFormatter()
+    self.assertEqual(
+        observation_summary.summarize_dump(
+            [{'observation': observation} for observation in observations]),
+        [formatter.summarize(observation) for observation in observations])
+
+
+if __name__ == '__main__':
+  absltest.main()
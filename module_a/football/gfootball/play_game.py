@@ -22,8 +22,12 @@ from __future__ import print_function
 from absl import app
 from absl import flags
 from absl import logging
+import json
+import multiprocessing
 import time
 
+from gfootball import batch_runner
+from gfootball import observation_summary
 from gfootball.env import config
 from gfootball.env import football_env
 
@@ -37,149 +41,97 @@ flags.DEFINE_enum('action_set', 'default', ['default', 'full'], 'Action set')
 flags.DEFINE_bool('real_time', True,
                   'If true, environment will slow down so humans can play.')
 flags.DEFINE_bool('render', True, 'Whether to do game rendering.')
+flags.DEFINE_bool('print_events', False,
+                  'Print the football events detected each step (passes, '
+                  'shots, goals, ...) instead of the observation summary.')
+flags.DEFINE_string('shm_ring_match_id', '',
+                    'If set, write every observation into a shared memory '
+                    'ring for a module B on this host (SHM_RING_ENABLED=1) to '
+                    'read as this match. Needs the project root on PYTHONPATH.')
+flags.DEFINE_integer('shm_ring_slots', 1024,
+                     'Observations the shared memory ring holds.')
+flags.DEFINE_integer('matches', 0,
+                     'If positive, play this many headless matches in a '
+                     'process pool instead of one interactive game. --level '
+                     'may then be a comma separated list of scenarios, used in '
+                     'turn, and --players may only name bot or lazy players '
+                     '(bot needs --action_set=full); without --players the '
+                     'built-in AI plays both teams.')
+flags.DEFINE_integer('processes', 0,
+                     'Worker processes for --matches; 0 means one per CPU.')
+flags.DEFINE_integer('match_steps', 0,
+                     'Steps after which a --matches match stops; 0 plays the '
+                     'whole episode.')
+flags.DEFINE_string('summary_sink', '',
+                    'Where observation summaries are sent: a .jsonl file '
+                    'shared by all matches, a module B URL to post them to '
+                    '/events as delta-encoded msgpack, or "shm" for a shared '
+                    'memory ring of raw observations per match. Empty sends '
+                    'none. Needs the project root on PYTHONPATH.')
+flags.DEFINE_string('match_id', 'interactive',
+                    'Match ID of the interactive game in --summary_sink.')
+flags.DEFINE_float('summary_rate', 10.0,
+                   'Summaries per second each --matches match sends at most; '
+                   '0 sends every step. The interactive game sends every '
+                   'step.')
+
+
+# Summaries are built from lookup tables, reusing the strings of values that
+# did not change since an earlier step.
+_SUMMARY_FORMATTER = observation_summary.SummaryFormatter()
 
 
 def parse_observation(obs):
-    summary = {}
-    summary["ball_position"], summary["ball_movement"] = parse_ball_info(obs)
-    summary["ball_owner"] = parse_ball_owner(obs)
-    summary["controlled_player"] = parse_controlled_player(obs)
-    summary["current_actions"] = parse_sticky_actions(obs)
-    summary["game_mode"] = parse_game_mode(obs)
-    summary["score"] = parse_score(obs)
-    summary["steps_left"] = parse_steps_left(obs)
-    return summary
-
-
-def parse_ball_info(obs):
-    x, y = obs.get('ball', [None, None])[0:2]
-    ball_position = describe_ball_position(x, y) if x is not None and y is not None else "Unknown"
-    ball_direction = obs.get('ball_direction', None)
-    if ball_direction is not None and len(ball_direction) > 0:
-        ball_movement = f"Moving {'left' if ball_direction[0] < 0 else 'right'}"
-    else:
-        ball_movement = "Unknown"
-    return ball_position, ball_movement
-
-
-def parse_ball_owner(obs):
-    ball_owned_team = obs.get("ball_owned_team", -1)
-    ball_owned_player = obs.get("ball_owned_player", -1)
-    if ball_owned_team == -1:
-        return "No one owns the ball"
-    else:
-        team = "Left" if ball_owned_team == 0 else "Right"
-        player_id = ball_owned_player
-        roles_key = f"{team.lower()}_team_roles"
-        if roles_key in obs and player_id >= 0 and player_id < len(obs[roles_key]):
-            role = role_to_string(obs[roles_key][player_id])
-        else:
-            role = f"Player {player_id}"
-        return f"{team} team's {role} (Player {player_id})"
-
-
-def parse_controlled_player(obs):
-    controlled_id = obs.get("left_agent_controlled_player", [None])[0]
-    if controlled_id is not None and 'left_team_roles' in obs and controlled_id < len(obs['left_team_roles']):
-        return f"Controlling player {controlled_id} of Left team as {role_to_string(obs['left_team_roles'][controlled_id])}"
-    else:
-        return "Unknown controlled player"
-
-
-def parse_sticky_actions(obs):
-    sticky = []
-    if 'left_agent_sticky_actions' in obs and len(obs['left_agent_sticky_actions']) > 0:
-        sticky_actions = obs['left_agent_sticky_actions'][0]
-        if hasattr(sticky_actions, 'tolist'):
-            sticky_actions = sticky_actions.tolist()
-        sticky = [i for i, val in enumerate(sticky_actions) if val == 1]
-    return ", ".join([sticky_action_name(i) for i in sticky]) if sticky else "None"
-
-
-def parse_game_mode(obs):
-    if 'game_mode' in obs:
-        return game_mode_name(obs["game_mode"])
-    else:
-        return "Unknown"
-
-
-def parse_score(obs):
-    if 'score' in obs and len(obs['score']) == 2:
-        return f"{obs['score'][0]} - {obs['score'][1]}"
-    else:
-        return "Unknown"
-
-
-def parse_steps_left(obs):
-    return obs.get('steps_left', 'Unknown')
-
-
-def describe_ball_position(x, y):
-    # X-axis zones
-    if x < -0.66:
-        horizontal = "left defensive third"
-    elif x < -0.33:
-        horizontal = "left midfield"
-    elif x < 0.33:
-        horizontal = "center midfield"
-    elif x < 0.66:
-        horizontal = "right midfield"
-    else:
-        horizontal = "right attacking third"
-
-    # Y-axis zones
-    if y < -0.28:
-        vertical = "top"
-    elif y > 0.28:
-        vertical = "bottom"
-    else:
-        vertical = "central"
-
-    return f"{horizontal}, {vertical} area"
-
-
-def role_to_string(role_id):
-    roles = [
-        "Goalkeeper", 
-        "Centre Back", 
-        "Left Back", 
-        "Right Back", 
-        "Defensive Midfielder", 
-        "Central Midfielder", 
-        "Left Midfielder", 
-        "Right Midfielder", 
-        "Attacking Midfielder", 
-        "Centre Forward"
-    ]
-    return roles[role_id] if 0 <= role_id < len(roles) else f"Unknown Role {role_id}"
-
-
-def sticky_action_name(index):
-    actions = [
-        "move left", "move top-left", "move top", "move top-right",
-        "move right", "move bottom-right", "move bottom", "move bottom-left",
-        "sprint", "dribble"
-    ]
-    return actions[index] if 0 <= index < len(actions) else f"Unknown Action {index}"
-
-
-def game_mode_name(mode_id):
-    modes = [
-        "Normal", "Kick Off", "Goal Kick", "Free Kick",
-        "Corner", "Throw In", "Penalty"
-    ]
-    return modes[mode_id] if 0 <= mode_id < len(modes) else f"Unknown Mode {mode_id}"
+    return _SUMMARY_FORMATTER.summarize(obs)
+
+
+describe_ball_position = observation_summary.describe_ball_position
+role_to_string = observation_summary.role_name
+sticky_action_name = observation_summary.sticky_action_name
+game_mode_name = observation_summary.game_mode_name
+
+
+def play_batch(players):
+  levels = FLAGS.level.split(',') if FLAGS.level else ['']
+  specs = [
+      batch_runner.MatchSpec(
+          index=index,
+          match_id='batch-{}'.format(index),
+          level=levels[index % len(levels)],
+          players=players,
+          action_set=FLAGS.action_set,
+          max_steps=FLAGS.match_steps,
+          summary_rate=FLAGS.summary_rate,
+          sink=FLAGS.summary_sink) for index in range(FLAGS.matches)
+  ]
+  processes = min(FLAGS.processes or multiprocessing.cpu_count(),
+                  FLAGS.matches)
+  results, aggregate = batch_runner.run_batch(
+      specs, processes, summarize=parse_observation)
+  for result in results:
+    print(json.dumps(result))
+  print(json.dumps(aggregate))
 
 
 def main(_):
   players = FLAGS.players.split(';') if FLAGS.players else ''
   assert not (any(['agent' in player for player in players])
              ), ('Player type \'agent\' can not be used with play_game.')
+  if FLAGS.matches > 0:
+    if not FLAGS['players'].present:
+      # The built-in AI plays both teams.
+      players = []
+    assert not any('keyboard' in player or 'gamepad' in player
+                   for player in players), (
+                       'Headless matches need built-in, bot or lazy players.')
+    play_batch(players)
+    return
   cfg_values = {
       'action_set': FLAGS.action_set,
       'dump_full_episodes': True,
       'players': players,
       'real_time': FLAGS.real_time,
+      'detect_events': FLAGS.print_events,
   }
   if FLAGS.level:
     cfg_values['level'] = FLAGS.level
@@ -191,7 +143,13 @@ def main(_):
 
   obs = env.reset()
   step = 0
-  
+  ring = None
+  if FLAGS.shm_ring_match_id:
+    from common.shm_ring import RingWriter  # pylint: disable=g-import-not-at-top
+    ring = RingWriter(FLAGS.shm_ring_match_id, slots=FLAGS.shm_ring_slots)
+    logging.info('Writing observations to shared memory ring %s', ring.name)
+  sink = batch_runner.make_sink(FLAGS.summary_sink, FLAGS.match_id)
+
   try:
     while True:
 
@@ -199,6 +157,10 @@ def main(_):
 
       # Step environment
       next_obs, reward, done, info = env.step(action)
+      if ring is not None:
+        ring.write(next_obs)
+      if sink is not None:
+        sink.add(FLAGS.match_id, step, next_obs, parse_observation(next_obs))
 
       # Log to console
       # print(f"Step {step}")
@@ -209,16 +171,21 @@ def main(_):
       # print(f"  Obs    : {next_obs!r}")
       # print('-' * 80)
 
-      # Print parsed observation summary
-      try:
-          summary = parse_observation(next_obs)
-          print("Observation Summary:")
-          for k, v in summary.items():
-              print(f"  {k}: {v}")
-          print('-' * 80)
-      except Exception as e:
-          print(f"Could not parse observation: {e}")
-          print('-' * 80)
+      if FLAGS.print_events:
+        for event in info['events']:
+          print('Step {}: {} team={} player={} {}'.format(
+              event.step, event.kind, event.team, event.player, event.details))
+      else:
+        # Print parsed observation summary
+        try:
+            summary = parse_observation(next_obs)
+            print("Observation Summary:")
+            for k, v in summary.items():
+                print(f"  {k}: {v}")
+            print('-' * 80)
+        except Exception as e:
+            print(f"Could not parse observation: {e}")
+            print('-' * 80)
 
       # Delay to make it readable
       # time.sleep(1.0)
@@ -235,6 +202,11 @@ def main(_):
     logging.warning('Game stopped, writing dump...')
     env.write_dump('shutdown')
     exit(1)
+  finally:
+    if ring is not None:
+      ring.close()
+    if sink is not None:
+      sink.close()
 
 
 if __name__ == '__main__':
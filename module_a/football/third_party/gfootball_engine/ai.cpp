@@ -33,7 +33,7 @@ class GameEnv_Python : public GameEnv {
  public:
   PyObject* get_frame_python() {
     ContextHolder c(this);
-    screenshoot screen = get_frame();
+    const screenshoot& screen = get_frame();
     PyObject* str = PyBytes_FromStringAndSize(screen.data(), screen.size());
     return str;
   }
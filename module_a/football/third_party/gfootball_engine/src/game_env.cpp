@@ -127,7 +127,7 @@ SharedInfo GameEnv::get_info() {
   return info;
 }
 
-screenshoot GameEnv::get_frame() {
+const screenshoot& GameEnv::get_frame() {
   SetGame(this);
   return GetGraphicsSystem()->GetScreen();
 }
@@ -50,7 +50,7 @@ struct GameEnv {
   SharedInfo get_info();
 
   // Get the current rendered frame.
-  screenshoot get_frame();
+  const screenshoot& get_frame();
 
   // Executes the action inside the game.
   bool sticky_action_state(int action, bool left_team, int player);
@@ -1,10 +1,15 @@
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI
-import requests
+import httpx
+from fastapi import FastAPI, Request
 
-app = FastAPI()
+from common.http_client import create_http_client
+from common.metrics import MetricsMiddleware, metrics_response
+from common.resilience import DeadlineMiddleware, downstream_error_handler
+from common.response_cache import parse_ttls
+from common.timing import TimedJSONResponse, TimingMiddleware
 
 try:
     MODULE_B_URL = os.environ["MODULE_B_URL"]
@@ -12,13 +17,38 @@ try:
 except KeyError as e:
     raise RuntimeError(f"Missing required environment variable: {e.args[0]}")
 
+# Module B routes whose GET responses are cached, e.g. "/test_b_module=5".
+RESPONSE_CACHE_TTLS = parse_ttls(os.environ.get("RESPONSE_CACHE_TTLS"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with create_http_client(MODULE_B_URL, downstream="module_b",
+                                  cache_ttls=RESPONSE_CACHE_TTLS) as module_b_client:
+        app.state.module_b_client = module_b_client
+        yield
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TimingMiddleware, service="a")
+app.add_exception_handler(httpx.TransportError, downstream_error_handler)
+app.add_exception_handler(httpx.HTTPStatusError, downstream_error_handler)
+app.add_middleware(MetricsMiddleware, module="a")
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
 @app.get("/test_a_module")
-def test_a_module():
+async def test_a_module(request: Request):
     print("Starting module A")
-    response = requests.get(f"{MODULE_B_URL}/test_b_module")
+    response = await request.app.state.module_b_client.get("/test_b_module")
+    response.raise_for_status()
     return {"from_b": response.json()}
 
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("module_a.main:app", host="0.0.0.0", port=MODULE_A_PORT, reload=True) 
-    
\ No newline at end of file
@@ -0,0 +1,93 @@
+import math
+from collections import OrderedDict
+
+def _plain(value):
+    # Steps decoded from msgpack carry numpy arrays, which do not compare with ==.
+    return value.tolist() if hasattr(value, "tolist") else value
+
+
+def _ball_xy(step):
+    ball = _plain(step.get("ball"))
+    if isinstance(ball, (list, tuple)) and len(ball) >= 2:
+        return ball[0], ball[1]
+    return None
+
+
+def step_transitions(previous, step, ball_distance):
+    """Return the meaningful changes between two steps of the same match.
+
+    `previous` is the last step that was forwarded. Raw observations are
+    compared on ball_owned_team/ball_owned_player, score, game_mode and ball
+    position; summaries from play_game.parse_observation are compared on their
+    ball_owner, score, game_mode and ball_position strings.
+    """
+    if previous is None:
+        return ["start"]
+    transitions = []
+    owner = [_plain(step.get(key)) for key in ("ball_owned_team", "ball_owned_player", "ball_owner")]
+    previous_owner = [_plain(previous.get(key)) for key in ("ball_owned_team", "ball_owned_player", "ball_owner")]
+    if owner != previous_owner:
+        transitions.append("possession")
+    if _plain(step.get("score")) != _plain(previous.get("score")):
+        transitions.append("goal")
+    if _plain(step.get("game_mode")) != _plain(previous.get("game_mode")):
+        transitions.append("game_mode")
+    ball, previous_ball = _ball_xy(step), _ball_xy(previous)
+    if ball is not None and previous_ball is not None:
+        if math.hypot(ball[0] - previous_ball[0], ball[1] - previous_ball[1]) >= ball_distance:
+            transitions.append("ball_movement")
+    elif step.get("ball_position") != previous.get("ball_position"):
+        transitions.append("ball_movement")
+    return transitions
+
+
+class EventCoalescer:
+    """Per-match filter that only lets meaningful step transitions through.
+
+    Each step is diffed against the last step forwarded for its match. Steps
+    with no transition are swallowed, except that one is forwarded as a
+    "heartbeat" after `max_silence` swallowed steps (0 disables heartbeats).
+    State is kept for at most `max_matches` matches, least recently seen first
+    out.
+    """
+
+    def __init__(self, ball_distance=0.1, max_silence=100, max_matches=10000):
+        self.ball_distance = ball_distance
+        self.max_silence = max_silence
+        self.max_matches = max_matches
+        self.seen = 0
+        self.forwarded = 0
+        self.transitions = {}
+        self._matches = OrderedDict()
+
+    def stats(self):
+        return {
+            "matches": len(self._matches),
+            "seen": self.seen,
+            "forwarded": self.forwarded,
+            "coalesced": self.seen - self.forwarded,
+            "transitions": dict(self.transitions),
+        }
+
+    def reset(self, match_id):
+        self._matches.pop(match_id, None)
+
+    def offer(self, match_id, step):
+        """Return the list of transitions if `step` should be forwarded, else None."""
+        self.seen += 1
+        previous, silent = self._matches.pop(match_id, (None, 0))
+        transitions = step_transitions(previous, step, self.ball_distance)
+        if not transitions and self.max_silence and silent + 1 >= self.max_silence:
+            transitions = ["heartbeat"]
+        if transitions:
+            self._matches[match_id] = (step, 0)
+        else:
+            self._matches[match_id] = (previous, silent + 1)
+        while len(self._matches) > self.max_matches:
+            self._matches.popitem(last=False)
+        if not transitions:
+            return None
+        self.forwarded += 1
+        for reason in transitions:
+            self.transitions[reason] = self.transitions.get(reason, 0) + 1
+        return transitions
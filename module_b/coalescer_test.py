@@ -0,0 +1,48 @@
+import numpy as np
+
+from module_b.coalescer import EventCoalescer, step_transitions
+
+
+def step(ball=(0.0, 0.0), owner=(0, 1), score=(0, 0), game_mode=0):
+    return {"ball": np.array([ball[0], ball[1], 0.1]), "ball_owned_team": owner[0],
+            "ball_owned_player": owner[1], "score": list(score), "game_mode": game_mode}
+
+
+def test_transitions_of_raw_observations():
+    assert step_transitions(None, step(), 0.1) == ["start"]
+    assert step_transitions(step(), step(), 0.1) == []
+    assert step_transitions(step(), step(owner=(1, 3)), 0.1) == ["possession"]
+    assert step_transitions(step(), step(score=(1, 0), game_mode=1), 0.1) == ["goal", "game_mode"]
+    assert step_transitions(step(), step(ball=(0.05, 0.0)), 0.1) == []
+    assert step_transitions(step(), step(ball=(0.1, 0.0)), 0.1) == ["ball_movement"]
+
+
+def test_transitions_of_summaries():
+    summary = {"ball_owner": "Left team's Goalkeeper (Player 0)", "score": "0 - 0", "game_mode": "Normal",
+               "ball_position": "left defensive third, central area"}
+    assert step_transitions(summary, dict(summary), 0.1) == []
+    assert step_transitions(summary, {**summary, "ball_position": "left midfield, central area"},
+                            0.1) == ["ball_movement"]
+
+
+def test_small_moves_add_up_against_the_last_forwarded_step():
+    coalescer = EventCoalescer(ball_distance=0.1, max_silence=0)
+    results = [coalescer.offer("m", step(ball=(x, 0.0))) for x in (0.0, 0.04, 0.08, 0.12)]
+    assert results == [["start"], None, None, ["ball_movement"]]
+    assert coalescer.stats()["coalesced"] == 2
+
+
+def test_heartbeat_after_max_silence():
+    coalescer = EventCoalescer(max_silence=3)
+    results = [coalescer.offer("m", step()) for _ in range(5)]
+    assert results == [["start"], None, None, ["heartbeat"], None]
+
+
+def test_matches_are_independent_and_bounded():
+    coalescer = EventCoalescer(max_matches=2)
+    for match in "abc":
+        assert coalescer.offer(match, step()) == ["start"]
+    assert coalescer.stats()["matches"] == 2
+    # "a" was evicted, so it starts over.
+    assert coalescer.offer("a", step()) == ["start"]
+    assert coalescer.offer("c", step()) is None
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from common import codec
+from common.delta import DeltaEncoder
+from module_b import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "MODULE_C_URLS", ["http://127.0.0.1:9"])
+    with TestClient(main.app) as client:
+        yield client
+
+
+def post_events(client, events):
+    response = client.post("/events", content=codec.encode(events),
+                           headers={"content-type": codec.MSGPACK_CONTENT_TYPE})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_deltas_are_rebuilt_per_match_and_gaps_ask_for_a_keyframe(client):
+    encoder = DeltaEncoder()
+    steps = [{"score": [0, 0], "ball_position": "center", "steps_left": left} for left in (10, 9, 8, 7)]
+    messages = [encoder.encode(step) for step in steps]
+    body = post_events(client, [{"match_id": "m1", "delta": message} for message in messages[:2]])
+    assert body["keyframe_required"] == [] and body["dropped"] == 0
+    # messages[2] is lost on the way: the next delta cannot be applied.
+    body = post_events(client, [{"match_id": "m1", "delta": messages[3]}])
+    assert body["keyframe_required"] == ["m1"]
+    encoder.force_keyframe()
+    body = post_events(client, [{"match_id": "m1", "delta": encoder.encode(steps[3])}])
+    assert body["keyframe_required"] == []
+
+
+def test_single_event_gap_is_a_409(client):
+    encoder = DeltaEncoder()
+    encoder.encode({"steps_left": 2})
+    response = client.post("/event", json={"match_id": "m2", "delta": encoder.encode({"steps_left": 1})})
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("event", [
+    {"match_id": "m3", "delta": {"type": "patch", "seq": 0, "fields": {}}},
+    {"match_id": "m3", "delta": {"type": "key", "fields": {"steps_left": 1}}},
+    {"match_id": "m3", "delta": "key"},
+    {"match_id": "m3"},
+])
+def test_malformed_event_is_a_422(client, event):
+    response = client.post("/event", json=event)
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("Malformed event")
+
+
+def test_malformed_events_in_a_batch_are_dropped(client):
+    body = post_events(client, [{"match_id": "m4", "delta": {"type": "patch", "seq": 0, "fields": {}}},
+                                {"match_id": "m4", "step": {"steps_left": 1}}])
+    assert body["dropped"] == 1 and body["queued"] + body["coalesced"] == 1
@@ -0,0 +1,352 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import time
+from urllib.parse import quote, unquote
+
+from common import codec
+
+# Every record is a header followed by the msgpack-encoded step.
+RECORD_HEADER = struct.Struct("<IQd")  # payload length, step number, receive timestamp
+# Every segment has an index with one entry per record, in step order.
+INDEX_ENTRY = struct.Struct("<QQ")  # step number, position of the record in the segment
+SEGMENT_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+
+def match_directory(match_id):
+    # Percent-encode everything, dots included, so a match id cannot name another path.
+    return quote(str(match_id), safe="").replace(".", "%2E")
+
+
+class MatchLog:
+    """Append-only log of one match's steps, split into numbered segments.
+
+    A segment is named after the number of its first step and holds records
+    back to back; its index file maps each step number to the record's
+    position. Opening a log recovers from a crash mid-append by cutting the
+    last segment and its index back to the last record both fully hold.
+
+    With `writable` False the log is only read: nothing is created or cut,
+    and a torn record at the end is left out of `next_step` instead, so a log
+    another process is writing can be read safely.
+    """
+
+    def __init__(self, directory, segment_bytes, writable=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                               if name.endswith(SEGMENT_SUFFIX))
+        self.next_step = 0
+        self.pending = 0
+        self._log = self._index = None
+        self._size = 0
+        # Descriptors of rolled-over segments, fsynced and closed by the next sync.
+        self._retired = []
+        if self.segments:
+            first_step = self.segments[-1]
+            entries, end = self._complete_records(first_step)
+            self.next_step = first_step + entries
+            if writable:
+                log_path, index_path = self._paths(first_step)
+                os.truncate(index_path, entries * INDEX_ENTRY.size)
+                os.truncate(log_path, end)
+                self._open_segment(first_step)
+        elif writable:
+            self._open_segment(0)
+
+    def _paths(self, first_step):
+        base = os.path.join(self.directory, f"{first_step:020d}")
+        return base + SEGMENT_SUFFIX, base + INDEX_SUFFIX
+
+    def _complete_records(self, first_step):
+        """Records the segment and its index both fully hold, and where the last one ends."""
+        log_path, index_path = self._paths(first_step)
+        entries = os.path.getsize(index_path) // INDEX_ENTRY.size if os.path.exists(index_path) else 0
+        size = os.path.getsize(log_path)
+        if not entries:
+            return 0, 0
+        with open(log_path, "rb") as log, open(index_path, "rb") as index:
+            while entries:
+                index.seek((entries - 1) * INDEX_ENTRY.size)
+                _, position = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+                log.seek(position)
+                header = log.read(RECORD_HEADER.size)
+                if len(header) == RECORD_HEADER.size:
+                    end = position + RECORD_HEADER.size + RECORD_HEADER.unpack(header)[0]
+                    if end <= size:
+                        return entries, end
+                entries -= 1
+        return 0, 0
+
+    def _open_segment(self, first_step):
+        log_path, index_path = self._paths(first_step)
+        self._log = open(log_path, "ab")
+        self._index = open(index_path, "ab")
+        self._size = self._log.tell()
+        if first_step not in self.segments:
+            self.segments.append(first_step)
+
+    def append(self, timestamp, step):
+        """Append `step`, received at `timestamp`; return its step number."""
+        if self._size >= self.segment_bytes:
+            # The full segment is fsynced by the next sync, off the event loop.
+            self.flush()
+            self._retired += [os.dup(self._log.fileno()), os.dup(self._index.fileno())]
+            self._log.close()
+            self._index.close()
+            self._open_segment(self.next_step)
+        payload = codec.encode(step)
+        number = self.next_step
+        self._index.write(INDEX_ENTRY.pack(number, self._size))
+        self._log.write(RECORD_HEADER.pack(len(payload), number, timestamp))
+        self._log.write(payload)
+        self._size += RECORD_HEADER.size + len(payload)
+        self.next_step += 1
+        self.pending += 1
+        return number
+
+    def flush(self):
+        """Hand buffered records to the OS, so readers and fsync see them."""
+        # The index follows the log, so an indexed record is always complete.
+        self._log.flush()
+        self._index.flush()
+
+    def sync_descriptors(self):
+        """Duplicated descriptors of the open and rolled-over segments for fsync off the event loop.
+
+        The caller closes them; a segment rolled over in the meantime stays valid.
+        """
+        self.flush()
+        self.pending = 0
+        descriptors, self._retired = self._retired, []
+        return descriptors + [os.dup(self._log.fileno()), os.dup(self._index.fileno())]
+
+    def close(self):
+        """Fsync and close the log; this blocks, so call it off the event loop."""
+        if self._log is not None:
+            _fsync_and_close(self.sync_descriptors())
+            self._log.close()
+            self._index.close()
+            self._log = self._index = None
+
+    def read(self, from_step=0, to_step=None):
+        """Yield (step number, timestamp, step) from `from_step` up to, not including, `to_step`."""
+        if self._log is not None:
+            self.flush()
+        end_step = self.next_step if to_step is None else min(to_step, self.next_step)
+        for position, first_step in enumerate(self.segments):
+            last_step = self.segments[position + 1] if position + 1 < len(self.segments) else end_step
+            start = max(from_step, first_step)
+            if start >= min(last_step, end_step):
+                continue
+            yield from self._read_segment(first_step, start, min(last_step, end_step))
+
+    def _read_segment(self, first_step, start, stop):
+        log_path, index_path = self._paths(first_step)
+        with open(log_path, "rb") as log, open(index_path, "rb") as index:
+            with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as records, \
+                    mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ) as entries:
+                _, offset = INDEX_ENTRY.unpack_from(entries, (start - first_step) * INDEX_ENTRY.size)
+                for _ in range(start, stop):
+                    length, number, timestamp = RECORD_HEADER.unpack_from(records, offset)
+                    offset += RECORD_HEADER.size
+                    with memoryview(records)[offset:offset + length] as payload:
+                        step = codec.decode(payload)
+                    offset += length
+                    yield number, timestamp, step
+
+
+class EventLog:
+    """Per-match segmented logs of received steps under `root`, fsynced in batches.
+
+    `append` only writes to the current segment's buffered file. A background
+    task flushes and fsyncs the logs written to, off the event loop, every
+    `fsync_interval` seconds, or sooner once `fsync_batch` records are pending,
+    so a crash loses at most that window of steps.
+
+    Only one process may write a match's log. `start` takes an exclusive lock
+    named after `writer` in `root` and raises RuntimeError if another process
+    holds it, so module B refuses to log from several uvicorn workers; shards
+    each own their matches and lock their own name. `read` never opens a log
+    for writing unless this process is already writing it.
+    """
+
+    def __init__(self, root, segment_bytes=64 * 1024 * 1024, fsync_interval=0.2, fsync_batch=1000,
+                 writer="writer"):
+        self.root = root
+        self.writer = writer
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.appended = 0
+        self.syncs = 0
+        self._matches = {}
+        self._dirty = set()
+        self._pending = 0
+        self._wake = None
+        self._task = None
+        self._lock = None
+        os.makedirs(root, exist_ok=True)
+
+    def stats(self):
+        return {
+            "root": self.root,
+            "segment_bytes": self.segment_bytes,
+            "fsync_interval": self.fsync_interval,
+            "fsync_batch": self.fsync_batch,
+            "appended": self.appended,
+            "pending": self._pending,
+            "syncs": self.syncs,
+        }
+
+    def matches(self):
+        """Step counts of every match with a log, including those from earlier runs.
+
+        Logs not opened by this process are only inspected, never opened for
+        writing: another process may own them.
+        """
+        counts = {}
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            log = self._matches.get(unquote(name))
+            counts[unquote(name)] = log.next_step if log is not None else _logged_steps(directory)
+        return counts
+
+    def match(self, match_id):
+        log = self._matches.get(match_id)
+        if log is None:
+            log = self._matches[match_id] = MatchLog(
+                os.path.join(self.root, match_directory(match_id)), self.segment_bytes)
+        return log
+
+    def exists(self, match_id):
+        return match_id in self._matches or os.path.isdir(os.path.join(self.root, match_directory(match_id)))
+
+    def append(self, match_id, timestamp, step):
+        log = self.match(match_id)
+        number = log.append(timestamp, step)
+        self.appended += 1
+        self._pending += 1
+        self._dirty.add(log)
+        if self._pending >= self.fsync_batch and self._wake is not None:
+            self._wake.set()
+        return number
+
+    def read(self, match_id, from_step=0, to_step=None):
+        log = self._matches.get(match_id)
+        if log is None:
+            log = MatchLog(os.path.join(self.root, match_directory(match_id)), self.segment_bytes, writable=False)
+        return log.read(from_step, to_step)
+
+    async def start(self):
+        lock = open(os.path.join(self.root, f".{self.writer}.lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise RuntimeError(f"Event log {self.root} is already written by another process as {self.writer!r}; "
+                               f"run module B with one worker, or as shards (MODULE_B_SHARDS), to log events")
+        self._lock = lock
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._syncer())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        logs = list(self._matches.values())
+        self._matches.clear()
+        self._dirty.clear()
+        await asyncio.to_thread(_close_all, logs)
+        self._lock.close()
+        self._lock = None
+
+    async def sync(self):
+        dirty, self._dirty, self._pending = self._dirty, set(), 0
+        descriptors = [fd for log in dirty for fd in log.sync_descriptors()]
+        if descriptors:
+            await asyncio.to_thread(_fsync_and_close, descriptors)
+            self.syncs += 1
+
+    async def _syncer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.fsync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.sync()
+            except OSError as e:
+                print(f"Event log fsync failed: {e}")
+
+
+def _logged_steps(directory):
+    segments = sorted(name for name in os.listdir(directory) if name.endswith(INDEX_SUFFIX))
+    if not segments:
+        return 0
+    last = segments[-1]
+    return int(last[:-len(INDEX_SUFFIX)]) + os.path.getsize(os.path.join(directory, last)) // INDEX_ENTRY.size
+
+
+def _close_all(logs):
+    for log in logs:
+        log.close()
+
+
+def _fsync_and_close(descriptors):
+    try:
+        for fd in descriptors:
+            os.fsync(fd)
+    finally:
+        for fd in descriptors:
+            os.close(fd)
+
+
+async def replay(records, send, speed=None, batch=100):
+    """Send logged steps on with their original spacing, divided by `speed`.
+
+    `records` yields (step number, timestamp, comment) with comment None for
+    steps to skip, and `send(comments)` forwards a list of comments. With
+    `speed` None steps are sent as fast as `send` takes them, in batches of up
+    to `batch`; otherwise each step waits for its time, and steps that are
+    already due go out together. Each comment's "timestamp" is set as it is
+    sent, so module C does not drop it as stale however long the recorded
+    gap before it. Returns the number of comments sent.
+    """
+    loop = asyncio.get_running_loop()
+    started = first_timestamp = None
+    comments = []
+    sent = 0
+
+    async def flush():
+        nonlocal comments, sent
+        now = time.time()
+        for comment in comments:
+            comment["timestamp"] = now
+        await send(comments)
+        sent += len(comments)
+        comments = []
+
+    for _, timestamp, comment in records:
+        if speed is not None:
+            if started is None:
+                started, first_timestamp = loop.time(), timestamp
+            delay = started + (timestamp - first_timestamp) / speed - loop.time()
+            if delay > 0:
+                if comments:
+                    await flush()
+                await asyncio.sleep(delay)
+        if comment is not None:
+            comments.append(comment)
+        if len(comments) >= batch:
+            await flush()
+    if comments:
+        await flush()
+    return sent
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from module_b.event_log import INDEX_SUFFIX, SEGMENT_SUFFIX, EventLog, MatchLog, match_directory, replay
+
+
+def steps(log, from_step=0, to_step=None):
+    return [(number, step) for number, _, step in log.read(from_step, to_step)]
+
+
+def segment_files(directory, suffix):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(suffix))
+
+
+def test_reads_ranges_across_segments(tmp_path):
+    log = MatchLog(str(tmp_path), segment_bytes=64)
+    for number in range(10):
+        assert log.append(float(number), {"step": number}) == number
+    assert len(log.segments) > 1
+    assert steps(log) == [(number, {"step": number}) for number in range(10)]
+    assert steps(log, 3, 7) == [(number, {"step": number}) for number in range(3, 7)]
+    log.close()
+
+    reopened = MatchLog(str(tmp_path), segment_bytes=64)
+    assert reopened.next_step == 10
+    assert reopened.append(10.0, {"step": 10}) == 10
+    assert steps(reopened, 9) == [(9, {"step": 9}), (10, {"step": 10})]
+    reopened.close()
+
+
+def test_rollover_leaves_the_full_segment_to_the_next_sync(tmp_path):
+    log = MatchLog(str(tmp_path), segment_bytes=64)
+    for number in range(10):
+        log.append(float(number), {"step": number})
+    descriptors = log.sync_descriptors()
+    # Both files of every rolled-over segment, and of the open one.
+    assert len(descriptors) == 2 * len(log.segments)
+    for fd in descriptors:
+        os.close(fd)
+    assert len(log.sync_descriptors()) == 2
+    log.close()
+
+
+def test_recovery_cuts_a_torn_record(tmp_path):
+    log = MatchLog(str(tmp_path), segment_bytes=1 << 20)
+    for number in range(3):
+        log.append(float(number), {"step": number})
+    log.close()
+    # A crash mid-append: the last record is indexed but only partly written.
+    log_path = segment_files(str(tmp_path), SEGMENT_SUFFIX)[-1]
+    os.truncate(log_path, os.path.getsize(log_path) - 1)
+
+    recovered = MatchLog(str(tmp_path), segment_bytes=1 << 20)
+    assert recovered.next_step == 2
+    assert steps(recovered) == [(0, {"step": 0}), (1, {"step": 1})]
+    assert recovered.append(2.0, {"step": "again"}) == 2
+    assert steps(recovered, 2) == [(2, {"step": "again"})]
+    recovered.close()
+
+
+def test_read_only_log_skips_a_torn_record_without_cutting_it(tmp_path):
+    log = MatchLog(str(tmp_path), segment_bytes=1 << 20)
+    for number in range(3):
+        log.append(float(number), {"step": number})
+    log.close()
+    log_path = segment_files(str(tmp_path), SEGMENT_SUFFIX)[-1]
+    index_path = segment_files(str(tmp_path), INDEX_SUFFIX)[-1]
+    os.truncate(log_path, os.path.getsize(log_path) - 1)
+    sizes = os.path.getsize(log_path), os.path.getsize(index_path)
+
+    reader = MatchLog(str(tmp_path), segment_bytes=1 << 20, writable=False)
+    assert steps(reader) == [(0, {"step": 0}), (1, {"step": 1})]
+    assert (os.path.getsize(log_path), os.path.getsize(index_path)) == sizes
+
+
+def test_event_log_reads_other_logs_read_only(tmp_path):
+    async def main():
+        writer = EventLog(str(tmp_path), fsync_interval=60)
+        await writer.start()
+        writer.append("match/1", 1.0, {"step": 0})
+        await writer.sync()
+        reader = EventLog(str(tmp_path), writer="shard-1")
+        assert reader.exists("match/1")
+        assert [step for _, _, step in reader.read("match/1")] == [{"step": 0}]
+        # Reading did not make the reader a writer of the match.
+        assert reader.matches() == {"match/1": 1} and not reader._matches
+        await writer.stop()
+
+    asyncio.run(main())
+    assert os.path.isdir(tmp_path / match_directory("match/1"))
+
+
+def test_a_second_writer_is_refused(tmp_path):
+    async def main():
+        first = EventLog(str(tmp_path))
+        await first.start()
+        second = EventLog(str(tmp_path))
+        with pytest.raises(RuntimeError, match="already written by another process"):
+            await second.start()
+        # Shards lock their own names.
+        shard = EventLog(str(tmp_path), writer="shard-1")
+        await shard.start()
+        await shard.stop()
+        await first.stop()
+        await second.start()
+        await second.stop()
+
+    asyncio.run(main())
+
+
+def test_replay_batches_steps_at_max_speed():
+    async def main():
+        sent = []
+
+        async def send(comments):
+            sent.append(comments)
+
+        records = [(number, float(number), None if number % 2 else {"step": number}) for number in range(7)]
+        assert await replay(iter(records), send, batch=2) == 4
+        assert [[comment["step"] for comment in comments] for comments in sent] == [[0, 2], [4, 6]]
+
+    asyncio.run(main())
+
+
+def test_replayed_comments_are_stamped_when_sent():
+    max_age = 0.05
+
+    async def main():
+        ages = []
+
+        async def send(comments):
+            ages.extend(time.time() - comment["timestamp"] for comment in comments)
+
+        # The recorded gap is longer than module C's max_age; replayed at speed 1 it is kept.
+        records = [(0, 100.0, {"step": 0, "timestamp": 1.0}), (1, 100.0 + 3 * max_age, {"step": 1, "timestamp": 1.0})]
+        assert await replay(iter(records), send, speed=1) == 2
+        return ages
+
+    ages = asyncio.run(main())
+    assert len(ages) == 2 and max(ages) < max_age
+
+
+def test_numeric_match_ids_get_a_directory(tmp_path):
+    async def main():
+        log = EventLog(str(tmp_path))
+        await log.start()
+        log.append(7, 1.0, {"step": 0})
+        await log.stop()
+
+    asyncio.run(main())
+    assert os.path.isdir(tmp_path / match_directory("7"))
@@ -0,0 +1,141 @@
+import asyncio
+
+from common.hash_ring import HashRing
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class EventQueue:
+    """Bounded in-process queue drained to a sink by a pool of worker tasks.
+
+    Workers hand the sink micro-batches: a batch is flushed as soon as it holds
+    `max_batch` items or `max_latency` seconds have passed since its first item
+    was taken off the queue, whichever comes first.
+
+    `put` never waits on the sink; when the queue is full the overflow policy
+    decides what happens:
+
+    - "block": wait until a worker frees a slot (back-pressure on the caller)
+    - "drop_oldest": evict the oldest queued event to make room
+    - "drop_newest": discard the incoming event
+
+    With a `partition` function, each worker drains its own queue of
+    `maxsize // workers` items and items are assigned to queues by consistent
+    hashing of `partition(item)`, so items with the same key reach the sink in
+    the order they were put. Otherwise all workers share one queue.
+    """
+
+    def __init__(self, sink, maxsize=1000, workers=4, policy="drop_oldest", max_batch=100, max_latency=0.05,
+                 partition=None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        if maxsize < 1 or workers < 1 or max_batch < 1:
+            raise ValueError("maxsize, workers and max_batch must be at least 1")
+        self.sink = sink
+        self.maxsize = maxsize
+        self.workers = workers
+        self.policy = policy
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.partition = partition
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self._queues = []
+        self._ring = None
+        self._tasks = []
+
+    @property
+    def depth(self):
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "partitioned": self.partition is not None,
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "max_latency": self.max_latency,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    async def start(self):
+        if self.partition is None:
+            # One queue shared by all workers.
+            self._queues = [asyncio.Queue(maxsize=self.maxsize)]
+            queues = self._queues * self.workers
+        else:
+            queues = self._queues = [asyncio.Queue(maxsize=max(1, self.maxsize // self.workers))
+                                     for _ in range(self.workers)]
+            self._ring = HashRing(list(range(self.workers)))
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in queues]
+
+    async def stop(self, drain_timeout=5.0):
+        """Give workers `drain_timeout` seconds to flush what is queued, then cancel them."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Event queue stopped with {self.depth} events still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item):
+        """Queue `item` for the sink. Returns False if the item itself was dropped."""
+        queue = self._queues[0] if self._ring is None else self._queues[self._ring.shard(str(self.partition(item)))]
+        if self.policy == "block":
+            await queue.put(item)
+        elif queue.full():
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return False
+            queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+            queue.put_nowait(item)
+        else:
+            queue.put_nowait(item)
+        self.enqueued += 1
+        return True
+
+    async def _next_batch(self, queue):
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self, queue):
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self.sink(batch)
+                self.processed += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Failed to forward {len(batch)} events: {e!r}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from module_b.event_queue import EventQueue
+
+
+class Sink:
+    """Collects batches; while `gate` is clear each call blocks, holding its batch."""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self, batch):
+        await self.gate.wait()
+        self.batches.append(batch)
+
+    @property
+    def items(self):
+        return [item for batch in self.batches for item in batch]
+
+
+async def started(queue, sink, first):
+    """Start `queue` with one item held by its blocked worker, so later puts fill the queue."""
+    sink.gate.clear()
+    await queue.start()
+    await queue.put(first)
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_drop_oldest_evicts_the_oldest_queued_item():
+    async def main():
+        sink = Sink()
+        queue = EventQueue(sink, maxsize=2, workers=1, policy="drop_oldest", max_batch=1, max_latency=0)
+        await started(queue, sink, 0)
+        for item in (1, 2, 3):
+            assert await queue.put(item)
+        assert queue.depth == 2
+        sink.gate.set()
+        await queue.stop()
+        return sink, queue
+
+    sink, queue = asyncio.run(main())
+    assert sink.items == [0, 2, 3]
+    assert queue.dropped == 1 and queue.processed == 3
+
+
+def test_drop_newest_rejects_the_incoming_item():
+    async def main():
+        sink = Sink()
+        queue = EventQueue(sink, maxsize=2, workers=1, policy="drop_newest", max_batch=1, max_latency=0)
+        await started(queue, sink, 0)
+        results = [await queue.put(item) for item in (1, 2, 3)]
+        sink.gate.set()
+        await queue.stop()
+        return sink, queue, results
+
+    sink, queue, results = asyncio.run(main())
+    assert results == [True, True, False]
+    assert sink.items == [0, 1, 2]
+    assert queue.dropped == 1
+
+
+def test_block_waits_for_a_free_slot():
+    async def main():
+        sink = Sink()
+        queue = EventQueue(sink, maxsize=1, workers=1, policy="block", max_batch=1, max_latency=0)
+        await started(queue, sink, 0)
+        await queue.put(1)
+        blocked = asyncio.create_task(queue.put(2))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        sink.gate.set()
+        await asyncio.wait_for(blocked, 1)
+        await queue.stop()
+        return sink, queue
+
+    sink, queue = asyncio.run(main())
+    assert sink.items == [0, 1, 2]
+    assert queue.dropped == 0
+
+
+def test_batches_flush_at_max_batch_or_max_latency():
+    async def main():
+        sink = Sink()
+        queue = EventQueue(sink, maxsize=100, workers=1, max_batch=3, max_latency=0.02)
+        await queue.start()
+        for item in range(4):
+            await queue.put(item)
+        await asyncio.sleep(0.1)
+        await queue.stop()
+        return sink
+
+    assert asyncio.run(main()).batches == [[0, 1, 2], [3]]
+
+
+def test_partitioned_queue_keeps_each_keys_order():
+    async def main():
+        sink = Sink()
+        queue = EventQueue(sink, maxsize=1000, workers=4, policy="block", max_batch=5, max_latency=0.001,
+                           partition=lambda item: item[0])
+        await queue.start()
+        for step in range(50):
+            for match in "abcdef":
+                await queue.put((match, step))
+        await queue.stop()
+        return sink
+
+    items = asyncio.run(main()).items
+    for match in "abcdef":
+        assert [step for key, step in items if key == match] == list(range(50))
+
+
+def test_depth_counts_a_shared_queue_once():
+    async def main():
+        sink = Sink()
+        sink.gate.clear()
+        queue = EventQueue(sink, maxsize=12, workers=3, policy="block", max_batch=1, max_latency=0)
+        await queue.start()
+        for item in range(12):
+            await queue.put(item)
+        for _ in range(3):
+            await asyncio.sleep(0)
+        depth = queue.depth
+        sink.gate.set()
+        await queue.stop()
+        return depth, queue.depth, sink
+
+    depth, after, sink = asyncio.run(main())
+    # Each of the three blocked workers holds one item; the rest wait in the one shared queue.
+    assert depth == 9
+    assert after == 0
+    assert sorted(sink.items) == list(range(12))
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        EventQueue(lambda batch: None, policy="drop_random")
@@ -0,0 +1,14 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from module_b import main
+
+
+def test_stream_is_closed_with_an_error_when_module_c_is_unreachable(monkeypatch):
+    monkeypatch.setattr(main, "MODULE_C_URLS", ["http://127.0.0.1:9"])
+    with TestClient(main.app) as client:
+        with client.websocket_connect("/events/stream/m1") as websocket:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                websocket.receive_json()
+    assert closed.value.code == 1011
@@ -1,10 +1,32 @@
+import asyncio
 import os
+import time
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Optional
+from urllib.parse import quote
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI
-import requests
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
 
-app = FastAPI()
+from common import codec
+from common.codec_http import decoded_body
+from common.delta import DeltaStreams, KeyframeRequired
+from common.event_stream import EventStream, to_ws_url
+from common.hedging import Replicas
+from common.http_client import create_http_client
+from common.metrics import Counter, Gauge, MetricsMiddleware, metrics_response
+from common.resilience import IDEMPOTENCY_HEADER, DeadlineMiddleware, downstream_error_handler
+from common.response_cache import parse_ttls
+from common.settings import env_number
+from common.shm_ring import RingPoller
+from common.timing import TimedJSONResponse, TimingMiddleware, create_background_task
+from module_b.coalescer import EventCoalescer
+from module_b.event_log import EventLog, replay
+from module_b.event_queue import EventQueue
+from module_b.shards import SHARD_HEADER, Shards
 
 try:
     MODULE_C_URL = os.environ["MODULE_C_URL"]
@@ -12,18 +34,457 @@ try:
 except KeyError as e:
     raise RuntimeError(f"Missing required environment variable: {e.args[0]}")
 
+# MODULE_C_URL may list several comma-separated replicas; the first one serves
+# the test route and WebSocket streams. Comment batches are split by match and
+# each match's comments always go to the same replica, keeping them in order.
+MODULE_C_URLS = [url.strip() for url in MODULE_C_URL.split(",") if url.strip()]
+
+EVENT_QUEUE_SIZE = env_number("EVENT_QUEUE_SIZE", 1000)
+EVENT_QUEUE_WORKERS = env_number("EVENT_QUEUE_WORKERS", 4)
+EVENT_QUEUE_POLICY = os.environ.get("EVENT_QUEUE_POLICY", "drop_oldest")
+EVENT_BATCH_SIZE = env_number("EVENT_BATCH_SIZE", 100)
+EVENT_BATCH_LATENCY_MS = env_number("EVENT_BATCH_LATENCY_MS", 50.0, float)
+EVENT_STREAM_WINDOW = env_number("EVENT_STREAM_WINDOW", 64)
+COALESCE_ENABLED = env_number("COALESCE_ENABLED", 1)
+COALESCE_BALL_DISTANCE = env_number("COALESCE_BALL_DISTANCE", 0.1, float)
+COALESCE_MAX_SILENCE_STEPS = env_number("COALESCE_MAX_SILENCE_STEPS", 100)
+DEFAULT_MATCH_ID = "default"
+COMMENT_CONTENT_TYPE = os.environ.get("COMMENT_CONTENT_TYPE", codec.MSGPACK_CONTENT_TYPE)
+# Module C routes whose GET responses are cached, e.g. "/test_c_module=5".
+RESPONSE_CACHE_TTLS = parse_ttls(os.environ.get("RESPONSE_CACHE_TTLS"))
+HEDGE_ENABLED = env_number("HEDGE_ENABLED", 0)
+HEDGE_PERCENTILE = env_number("HEDGE_PERCENTILE", 0.95, float)
+HEDGE_BUDGET_RATIO = env_number("HEDGE_BUDGET_RATIO", 0.1, float)
+# Directory of the per-match event log; unset disables logging and replay.
+EVENT_LOG_DIR = os.environ.get("EVENT_LOG_DIR")
+EVENT_LOG_SEGMENT_BYTES = env_number("EVENT_LOG_SEGMENT_BYTES", 64 * 1024 * 1024)
+EVENT_LOG_FSYNC_INTERVAL_MS = env_number("EVENT_LOG_FSYNC_INTERVAL_MS", 200.0, float)
+EVENT_LOG_FSYNC_BATCH = env_number("EVENT_LOG_FSYNC_BATCH", 1000)
+# Keep each match's comments in order by giving every match one queue worker.
+EVENT_QUEUE_PARTITIONED = env_number("EVENT_QUEUE_PARTITIONED", 1)
+# Set by module_b.shards when module B runs as several match-partitioned processes.
+MODULE_B_SHARDS = env_number("MODULE_B_SHARDS", 1)
+MODULE_B_SHARD = env_number("MODULE_B_SHARD", 0)
+# Read observations that local game loops write into shared memory rings.
+SHM_RING_ENABLED = env_number("SHM_RING_ENABLED", 0)
+SHM_RING_POLL_INTERVAL_MS = env_number("SHM_RING_POLL_INTERVAL_MS", 5.0, float)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with AsyncExitStack() as stack:
+        clients = []
+        for index, url in enumerate(MODULE_C_URLS):
+            downstream = "module_c" if len(MODULE_C_URLS) == 1 else f"module_c-{index}"
+            clients.append(await stack.enter_async_context(
+                create_http_client(url, downstream=downstream, cache_ttls=RESPONSE_CACHE_TTLS)))
+        app.state.module_c_replicas = Replicas(clients, "module_c", hedge=bool(HEDGE_ENABLED),
+                                               percentile=HEDGE_PERCENTILE, budget_ratio=HEDGE_BUDGET_RATIO)
+        app.state.module_c_client = app.state.module_c_replicas.primary
+
+        async def send_to_replica(replica, comments):
+            body = codec.encode(comments, COMMENT_CONTENT_TYPE)
+            # The same key on retries and hedges lets module C process the batch once.
+            headers = {"content-type": COMMENT_CONTENT_TYPE, IDEMPOTENCY_HEADER: uuid.uuid4().hex}
+
+            async def send(client):
+                response = await client.post("/comments", content=body, headers=headers)
+                response.raise_for_status()
+
+            await app.state.module_c_replicas.call(send, replica=replica)
+
+        async def forward_to_c(comments):
+            replicas = app.state.module_c_replicas
+            batches = {}
+            for comment in comments:
+                batches.setdefault(replicas.replica(comment['match_id']), []).append(comment)
+            await asyncio.gather(*(send_to_replica(replica, batch) for replica, batch in batches.items()))
+
+        app.state.forward_to_c = forward_to_c
+        app.state.shards = None
+        if MODULE_B_SHARDS > 1:
+            shards = Shards(MODULE_B_SHARD, MODULE_B_SHARDS, {})
+            for shard in range(MODULE_B_SHARDS):
+                if shard != MODULE_B_SHARD:
+                    shards.clients[shard] = await stack.enter_async_context(
+                        create_http_client(shards.url(shard), downstream=f"module_b-shard-{shard}"))
+            app.state.shards = shards
+        app.state.delta_streams = DeltaStreams()
+        app.state.coalescer = EventCoalescer(
+            ball_distance=COALESCE_BALL_DISTANCE,
+            max_silence=COALESCE_MAX_SILENCE_STEPS,
+        ) if COALESCE_ENABLED else None
+        app.state.event_queue = EventQueue(
+            forward_to_c,
+            maxsize=EVENT_QUEUE_SIZE,
+            workers=EVENT_QUEUE_WORKERS,
+            policy=EVENT_QUEUE_POLICY,
+            max_batch=EVENT_BATCH_SIZE,
+            max_latency=EVENT_BATCH_LATENCY_MS / 1000,
+            partition=(lambda comment: comment['match_id']) if EVENT_QUEUE_PARTITIONED else None,
+        )
+        app.state.event_log = EventLog(
+            EVENT_LOG_DIR,
+            segment_bytes=EVENT_LOG_SEGMENT_BYTES,
+            fsync_interval=EVENT_LOG_FSYNC_INTERVAL_MS / 1000,
+            fsync_batch=EVENT_LOG_FSYNC_BATCH,
+            writer=f"shard-{MODULE_B_SHARD}" if MODULE_B_SHARDS > 1 else "writer",
+        ) if EVENT_LOG_DIR else None
+        app.state.replays = {}
+
+        async def ingest(match_id, records):
+            await ingest_ring_steps(app.state, match_id, records)
+
+        # Each shard reads the rings of the matches it owns; of several workers only one reads.
+        app.state.ring_poller = RingPoller(
+            ingest,
+            poll_interval=SHM_RING_POLL_INTERVAL_MS / 1000,
+            batch=EVENT_BATCH_SIZE,
+            accept=lambda match_id: app.state.shards is None or app.state.shards.owner(match_id) is None,
+            reader=f"shard-{MODULE_B_SHARD}" if MODULE_B_SHARDS > 1 else "reader",
+        ) if SHM_RING_ENABLED else None
+        await app.state.event_queue.start()
+        if app.state.event_log is not None:
+            await app.state.event_log.start()
+        if app.state.ring_poller is not None:
+            await app.state.ring_poller.start()
+        try:
+            yield
+        finally:
+            if app.state.ring_poller is not None:
+                await app.state.ring_poller.stop()
+            for task in app.state.replays.values():
+                task.cancel()
+            await asyncio.gather(*app.state.replays.values(), return_exceptions=True)
+            await app.state.event_queue.stop()
+            if app.state.event_log is not None:
+                await app.state.event_log.stop()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TimingMiddleware, service="b")
+app.add_exception_handler(httpx.TransportError, downstream_error_handler)
+app.add_exception_handler(httpx.HTTPStatusError, downstream_error_handler)
+app.add_middleware(MetricsMiddleware, module="b")
+
+# Read from the components' own counters at scrape time.
+Gauge("event_queue_depth", "Events waiting to be forwarded to module C.",
+      callback=lambda: app.state.event_queue.depth)
+Counter("event_queue_dropped_total", "Events dropped by the queue overflow policy.",
+        callback=lambda: app.state.event_queue.dropped)
+Counter("event_queue_forwarded_total", "Events forwarded to module C.",
+        callback=lambda: app.state.event_queue.processed)
+Counter("event_queue_failed_total", "Events whose forwarding to module C failed.",
+        callback=lambda: app.state.event_queue.failed)
+Counter("events_coalesced_total", "Steps swallowed by the coalescer.",
+        callback=lambda: app.state.coalescer.seen - app.state.coalescer.forwarded if app.state.coalescer else 0)
+Counter("delta_keyframes_required_total", "Delta messages rejected for lack of a usable base.",
+        callback=lambda: app.state.delta_streams.keyframes_required)
+Counter("shm_ring_steps_total", "Steps read from shared memory rings.",
+        callback=lambda: app.state.ring_poller.steps if app.state.ring_poller else 0)
+Counter("shm_ring_overruns_total", "Ring steps overwritten by their writer before they were read.",
+        callback=lambda: app.state.ring_poller.overruns if app.state.ring_poller else 0)
+
+def event_match_id(event):
+    """The event's match ID as a string, so every later stage can hash and quote it.
+
+    Numeric IDs are converted; anything else raises ValueError.
+    """
+    if not isinstance(event, dict):
+        raise ValueError("Events must be objects")
+    match_id = event.get("match_id", DEFAULT_MATCH_ID)
+    if isinstance(match_id, bool) or not isinstance(match_id, (str, int, float)):
+        raise ValueError(f"match_id must be a string or a number, not {type(match_id).__name__}")
+    return str(match_id)
+
+def event_step(state, match_id, event):
+    """Return the full step of an event carrying either a "step" or a "delta" message.
+
+    The step is appended to the match's event log first, when logging is on.
+    Raises ValueError for an event with neither, or with a malformed delta.
+    """
+    if "delta" in event:
+        step = state.delta_streams.decode(match_id, event["delta"])
+    elif "step" in event:
+        step = event["step"]
+    else:
+        raise ValueError("Events need a step or a delta")
+    if state.event_log is not None:
+        state.event_log.append(match_id, event.get('timestamp', time.time()), step)
+    return step
+
+def make_comment(coalescer, match_id, step, event):
+    """Build the module C payload for `step`, or None if the coalescer swallows it.
+
+    The payload carries the event's wall-clock "timestamp", or the time it was
+    received, which module C's scheduler uses to drop comments gone stale.
+    """
+    comment = {'keys': step, 'match_id': match_id, 'timestamp': event.get('timestamp', time.time())}
+    if coalescer is None:
+        return comment
+    transitions = coalescer.offer(match_id, step)
+    if transitions is None:
+        return None
+    comment['transitions'] = transitions
+    return comment
+
+async def ingest_ring_steps(state, match_id, records):
+    """Handle (step number, timestamp, observation) records read from a match's ring like posted events."""
+    for _, timestamp, observation in records:
+        event = {"step": observation, "timestamp": timestamp}
+        step = event_step(state, match_id, event)
+        comment = make_comment(state.coalescer, match_id, step, event)
+        if comment is not None:
+            await state.event_queue.put(comment)
+
+def shard_owner(connection, match_id):
+    """The module B shard that owns `match_id`, or None if this process handles it."""
+    shards = connection.app.state.shards
+    # A request another shard forwarded is handled here even if the rings disagree.
+    if shards is None or SHARD_HEADER in connection.headers:
+        return None
+    return shards.owner(match_id)
+
+async def forward_to_shard(request, shard, path, content=None, params=None):
+    """POST a request on to the shard owning its match and return the shard's response."""
+    shards = request.app.state.shards
+    shards.forwarded += 1
+    headers = {SHARD_HEADER: str(shards.index)}
+    if content is not None:
+        headers["content-type"] = request.headers.get("content-type", codec.JSON_CONTENT_TYPE)
+    return await shards.clients[shard].post(path, content=content, params=params, headers=headers)
+
+def relayed(response):
+    return Response(response.content, status_code=response.status_code,
+                    media_type=response.headers.get("content-type"))
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
 @app.get("/test_b_module")
-def test_b_module():
-    response = requests.get(f"{MODULE_C_URL}/finalize")
+async def test_b_module(request: Request):
+    response = await request.app.state.module_c_client.get("/test_c_module")
+    response.raise_for_status()
     return {"from_c": response.json()}
 
 @app.post("/event")
-def event(event: dict):
-    print(f"Received event: {event["step"]}")
+async def event(request: Request, event: dict = Depends(decoded_body(dict))):
+    try:
+        match_id = event_match_id(event)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Malformed event: {e}")
+    owner = shard_owner(request, match_id)
+    if owner is not None:
+        return relayed(await forward_to_shard(request, owner, "/event", content=await request.body()))
+    try:
+        step = event_step(request.app.state, match_id, event)
+    except KeyframeRequired as e:
+        raise HTTPException(status_code=409, detail=f"Keyframe required: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Malformed event: {e}")
+    print(f"Received event: {step}")
 
-    response_tts = requests.post(f"{MODULE_C_URL}/comment", json={'keys': event["step"]})
+    comment = make_comment(request.app.state.coalescer, match_id, step, event)
+    if comment is not None and not await request.app.state.event_queue.put(comment):
+        return {"status": "Event dropped"}
     return {"status": "Event received"}
 
+@app.post("/events")
+async def events(request: Request, events: list = Depends(decoded_body(list))):
+    print(f"Received {len(events)} events")
+
+    queued = coalesced = dropped = 0
+    keyframe_required = set()
+    elsewhere = {}
+    for event in events:
+        try:
+            match_id = event_match_id(event)
+        except ValueError as e:
+            print(f"Dropped malformed event: {e}")
+            dropped += 1
+            continue
+        owner = shard_owner(request, match_id)
+        if owner is not None:
+            elsewhere.setdefault(owner, []).append(event)
+            continue
+        try:
+            step = event_step(request.app.state, match_id, event)
+        except KeyframeRequired:
+            keyframe_required.add(match_id)
+            dropped += 1
+            continue
+        except ValueError as e:
+            print(f"Dropped malformed event for match {match_id}: {e}")
+            dropped += 1
+            continue
+        comment = make_comment(request.app.state.coalescer, match_id, step, event)
+        if comment is None:
+            coalesced += 1
+        elif await request.app.state.event_queue.put(comment):
+            queued += 1
+        else:
+            dropped += 1
+    content_type = request.headers.get("content-type", codec.JSON_CONTENT_TYPE)
+    # Other shards' events go to them as sub-batches, each keeping its matches' order.
+    responses = await asyncio.gather(*(
+        forward_to_shard(request, shard, "/events", content=codec.encode(batch, content_type))
+        for shard, batch in elsewhere.items()))
+    for response in responses:
+        response.raise_for_status()
+        body = response.json()
+        queued += body["queued"]
+        coalesced += body["coalesced"]
+        dropped += body["dropped"]
+        keyframe_required.update(body["keyframe_required"])
+    return {"status": "Events received", "queued": queued, "coalesced": coalesced, "dropped": dropped,
+            "keyframe_required": sorted(keyframe_required)}
+
+@app.websocket("/events/stream/{match_id}")
+async def event_stream(websocket: WebSocket, match_id: str):
+    """Stream a match's steps to module C over one WebSocket per hop.
+
+    The producer sends {"seq": n, "data": {"step": ...}} or
+    {"seq": n, "data": {"delta": ...}} messages. Each is acked once module C has
+    granted it a slot in the downstream window, so a slow module C throttles the
+    producer. Steps the coalescer swallows are acked straight away. Comments
+    module C pushes back are relayed to the producer on the same connection.
+
+    When module B runs as shards and the match belongs to another shard, the
+    stream is relayed unchanged to that shard's stream instead.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    # This hop's sequence numbers towards the owning shard, by the producer's.
+    producer_seqs = {}
+
+    async def send(message):
+        if message.get("type") == "keyframe_required" and owner is not None:
+            message = {**message, "seq": producer_seqs.get(message["seq"], message["seq"])}
+        async with send_lock:
+            await websocket.send_json(message)
+
+    owner = shard_owner(websocket, match_id)
+    if owner is None:
+        stream_url = f"{to_ws_url(MODULE_C_URLS[0])}/comments/stream/{match_id}"
+    else:
+        websocket.app.state.shards.forwarded += 1
+        stream_url = f"{to_ws_url(websocket.app.state.shards.url(owner))}/events/stream/{match_id}"
+    try:
+        async with EventStream(stream_url, window=EVENT_STREAM_WINDOW, on_message=send) as downstream:
+            while True:
+                message = await websocket.receive_json()
+                if owner is not None:
+                    seq = await downstream.send(message["data"])
+                    producer_seqs[seq] = message["seq"]
+                    producer_seqs.pop(seq - 2 * EVENT_STREAM_WINDOW, None)
+                    await send({"type": "ack", "seq": message["seq"]})
+                    continue
+                try:
+                    step = event_step(websocket.app.state, match_id, message["data"])
+                except KeyframeRequired:
+                    await send({"type": "keyframe_required", "seq": message["seq"]})
+                except ValueError as e:
+                    print(f"Dropped malformed event for match {match_id}: {e}")
+                else:
+                    comment = make_comment(websocket.app.state.coalescer, match_id, step, message["data"])
+                    if comment is not None:
+                        await downstream.send(comment)
+                await send({"type": "ack", "seq": message["seq"]})
+    except WebSocketDisconnect:
+        pass
+    except ConnectionError as e:
+        # The downstream could not be reached, or its stream broke: tell the producer.
+        print(f"Event stream for match {match_id} to {stream_url} failed: {e}")
+        await websocket.close(code=1011)
+
+@app.get("/event_queue")
+async def event_queue_stats(request: Request):
+    return request.app.state.event_queue.stats()
+
+@app.get("/shards")
+async def shard_stats(request: Request):
+    if request.app.state.shards is None:
+        return {"enabled": False}
+    return {"enabled": True, **request.app.state.shards.stats()}
+
+@app.get("/coalescer")
+async def coalescer_stats(request: Request):
+    if request.app.state.coalescer is None:
+        return {"enabled": False}
+    return {"enabled": True, **request.app.state.coalescer.stats()}
+
+@app.get("/shm_rings")
+async def shm_ring_stats(request: Request):
+    if request.app.state.ring_poller is None:
+        return {"enabled": False}
+    return {"enabled": True, **request.app.state.ring_poller.stats()}
+
+def require_event_log(request):
+    if request.app.state.event_log is None:
+        raise HTTPException(status_code=404, detail="Event log is disabled; set EVENT_LOG_DIR")
+    return request.app.state.event_log
+
+@app.get("/event_log")
+async def event_log_stats(request: Request):
+    if request.app.state.event_log is None:
+        return {"enabled": False}
+    event_log = request.app.state.event_log
+    replays = {replay_id: replay_status(task) for replay_id, task in request.app.state.replays.items()}
+    return {"enabled": True, **event_log.stats(), "matches": event_log.matches(), "replays": replays}
+
+def replay_status(task):
+    if not task.done():
+        return "running"
+    if task.cancelled():
+        return "cancelled"
+    if task.exception() is not None:
+        return f"failed: {task.exception()!r}"
+    return f"done: {task.result()} comments sent"
+
+@app.post("/event_log/{match_id:path}/replay", status_code=202)
+async def replay_match(request: Request, match_id: str, speed: str = "1", from_step: int = 0,
+                       to_step: Optional[int] = None, as_match_id: Optional[str] = None):
+    """Stream a logged match back into module C at `speed` times real time, or "max".
+
+    Comments are rebuilt from the logged steps, run through a fresh coalescer
+    when coalescing is on, and sent to module C as `as_match_id` (default: the
+    same match) in batches of up to EVENT_BATCH_SIZE.
+    """
+    owner = shard_owner(request, match_id)
+    if owner is not None:
+        return relayed(await forward_to_shard(request, owner, f"/event_log/{quote(match_id, safe='')}/replay",
+                                              params=request.query_params))
+    event_log = require_event_log(request)
+    if not event_log.exists(match_id):
+        raise HTTPException(status_code=404, detail=f"No event log for match {match_id!r}")
+    try:
+        factor = None if speed == "max" else float(speed)
+    except ValueError:
+        factor = 0
+    if factor is not None and factor <= 0:
+        raise HTTPException(status_code=422, detail="speed must be a positive number or 'max'")
+    target = as_match_id or match_id
+    coalescer = EventCoalescer(ball_distance=COALESCE_BALL_DISTANCE,
+                               max_silence=COALESCE_MAX_SILENCE_STEPS) if COALESCE_ENABLED else None
+    records = ((number, timestamp, make_comment(coalescer, target, step, {}))
+               for number, timestamp, step in event_log.read(match_id, from_step, to_step))
+    replay_id = uuid.uuid4().hex
+    task = create_background_task(replay(records, request.app.state.forward_to_c, speed=factor, batch=EVENT_BATCH_SIZE))
+    replays = request.app.state.replays
+    replays[replay_id] = task
+
+    def finished(task):
+        print(f"Replay {replay_id} of {match_id} {replay_status(task)}")
+        replays.pop(replay_id, None)
+
+    task.add_done_callback(finished)
+    return {"status": "Replay started", "replay_id": replay_id, "match_id": match_id, "as_match_id": target,
+            "speed": speed, "from_step": from_step, "to_step": to_step}
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("module_b.main:app", host="0.0.0.0", port=MODULE_B_PORT, reload=True) 
\ No newline at end of file
+    uvicorn.run("module_b.main:app", host="0.0.0.0", port=MODULE_B_PORT, reload=True) 
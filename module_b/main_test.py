@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from common import codec
+from module_b import main
+from module_b.shards import Shards
+
+
+class Client:
+    """Stands in for a module C client, recording the comments posted to it."""
+
+    def __init__(self, posted):
+        self.posted = posted
+
+    async def post(self, path, content, headers):
+        self.posted.extend(codec.decode(content, headers["content-type"]))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "MODULE_C_URLS", ["http://127.0.0.1:9"])
+    monkeypatch.setattr(main, "COALESCE_ENABLED", 0)
+    with TestClient(main.app) as client:
+        posted = client.posted = []
+
+        async def call(send, replica=None):
+            await send(Client(posted))
+
+        monkeypatch.setattr(client.app.state.module_c_replicas, "call", call)
+        yield client
+
+
+def forwarded(client, count):
+    for _ in range(100):
+        if len(client.posted) >= count:
+            break
+        client.portal.call(asyncio.sleep, 0.01)
+    return client.posted
+
+
+def test_numeric_match_id_is_forwarded_as_a_string(client):
+    response = client.post("/event", json={"match_id": 7, "step": {"steps_left": 1}})
+    assert response.json() == {"status": "Event received"}
+    body = codec.encode([{"match_id": 8, "step": {"steps_left": 1}}, {"match_id": "m", "step": {"steps_left": 1}}])
+    response = client.post("/events", content=body, headers={"content-type": codec.MSGPACK_CONTENT_TYPE})
+    assert response.json()["queued"] == 2
+    assert sorted(comment["match_id"] for comment in forwarded(client, 3)) == ["7", "8", "m"]
+
+
+@pytest.mark.parametrize("match_id", [None, True, ["m"], {"id": "m"}])
+def test_other_match_ids_are_a_422(client, match_id):
+    response = client.post("/event", json={"match_id": match_id, "step": {}})
+    assert response.status_code == 422
+
+
+def test_numeric_match_id_is_routed_to_its_shard(monkeypatch, tmp_path):
+    monkeypatch.setenv("MODULE_B_SHARD_SOCKET_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "MODULE_C_URLS", ["http://127.0.0.1:9"])
+    monkeypatch.setattr(main, "MODULE_B_SHARDS", 2)
+    monkeypatch.setattr(main, "MODULE_B_SHARD", 0)
+    ring = Shards(0, 2, {})
+    mine = next(n for n in range(100) if ring.owner(str(n)) is None)
+    with TestClient(main.app) as client:
+        response = client.post("/event", json={"match_id": mine, "step": {"steps_left": 1}})
+        assert response.json() == {"status": "Event received"}
+        assert client.get("/shards").json()["forwarded"] == 0
@@ -0,0 +1,112 @@
+"""Match-partitioned module B: N shard processes behind one port.
+
+Every shard process binds MODULE_B_PORT with SO_REUSEPORT, so the kernel
+spreads incoming connections over them, plus a private Unix socket of its own.
+Matches are assigned to shards by consistent hashing of the match ID. A shard
+that receives an event for a match it does not own forwards it to the owner
+over the owner's private socket, so each match's delta, coalescer and event
+log state lives in exactly one process and its steps are handled in order.
+
+Run it from the project root with MODULE_B_SHARDS > 1 (scripts/run_modules.py
+does this for module B when MODULE_B_SHARDS is set):
+
+    MODULE_B_SHARDS=4 python -m module_b.shards
+"""
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sys
+from dotenv import load_dotenv
+load_dotenv()
+
+from common.hash_ring import HashRing
+from common.settings import env_number
+
+# Header set on requests one shard forwards to another, so they are never forwarded again.
+SHARD_HEADER = "x-module-b-shard"
+
+
+def shard_socket_path(index, port=None):
+    directory = os.environ.get("MODULE_B_SHARD_SOCKET_DIR", "/tmp")
+    port = port or os.environ["MODULE_B_PORT"]
+    return os.path.join(directory, f"module_b-{port}-shard-{index}.sock")
+
+
+class Shards:
+    """This process's place among module B's shards and clients to the others."""
+
+    def __init__(self, index, count, clients):
+        self.index = index
+        self.count = count
+        self.clients = clients
+        self.ring = HashRing(list(range(count)))
+        self.forwarded = 0
+
+    def stats(self):
+        return {"index": self.index, "count": self.count, "forwarded": self.forwarded}
+
+    def owner(self, match_id):
+        """The shard owning `match_id`, a string as module B's ingest makes it, or None if it is this one."""
+        shard = self.ring.shard(match_id)
+        return None if shard == self.index else shard
+
+    def url(self, shard):
+        return f"unix://{shard_socket_path(shard)}"
+
+
+def _listen_sockets(index, port):
+    public = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    public.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    public.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    public.bind(("0.0.0.0", port))
+    path = shard_socket_path(index, port)
+    if os.path.exists(path):
+        os.unlink(path)
+    private = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    private.bind(path)
+    return [public, private]
+
+
+def serve_shard(index, count):
+    # module_b.main reads its shard from the environment at import.
+    os.environ["MODULE_B_SHARD"] = str(index)
+    os.environ["MODULE_B_SHARDS"] = str(count)
+    import uvicorn
+    sockets = _listen_sockets(index, int(os.environ["MODULE_B_PORT"]))
+    try:
+        uvicorn.Server(uvicorn.Config("module_b.main:app", timeout_graceful_shutdown=5)).run(sockets=sockets)
+    finally:
+        os.unlink(shard_socket_path(index))
+
+
+def main():
+    count = env_number("MODULE_B_SHARDS", 1)
+    if "MODULE_B_PORT" not in os.environ:
+        raise RuntimeError("Missing required environment variable: MODULE_B_PORT")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=serve_shard, args=(index, count), name=f"module_b-shard-{index}")
+                 for index in range(count)]
+    for process in processes:
+        process.start()
+    print(f"Module B running as {count} shard(s) on port {os.environ['MODULE_B_PORT']}")
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    # Shards are not independent: if one exits the others cannot serve its
+    # matches, so stop them all and let the supervisor restart the group.
+    multiprocessing.connection.wait([process.sentinel for process in processes])
+    stop(signal.SIGTERM, None)
+    for process in processes:
+        process.join()
+    return max(abs(process.exitcode or 0) for process in processes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
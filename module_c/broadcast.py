@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import itertools
+
+from common import codec
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+SLOW_CONSUMER_FRAME = b"event: disconnect\ndata: slow consumer\n\n"
+SHUTDOWN_FRAME = b"event: disconnect\ndata: shutting down\n\n"
+
+
+class Subscriber:
+    """One listener's bounded buffer of encoded Server-Sent Events frames.
+
+    Iterating yields frames as they arrive, joining those that queued up
+    meanwhile into one write, and ends once the subscriber is closed, after a
+    final frame saying why. A subscriber whose buffer is full when a frame is
+    published is closed as a slow consumer and its buffer discarded, so it
+    never holds the publisher up.
+    """
+
+    def __init__(self, match_id, buffer, keepalive):
+        self.match_id = match_id
+        self.buffer = buffer
+        self.keepalive = keepalive
+        self.closed = False
+        self._frames = collections.deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, frame):
+        """Buffer `frame`; return False if the buffer was full and the subscriber got closed."""
+        if len(self._frames) >= self.buffer:
+            self.close(SLOW_CONSUMER_FRAME)
+            return False
+        self._frames.append(frame)
+        self._ready.set()
+        return True
+
+    def close(self, frame):
+        if not self.closed:
+            self.closed = True
+            self._frames.clear()
+            self._frames.append(frame)
+            self._ready.set()
+
+    def __aiter__(self):
+        return self._frames_until_closed()
+
+    async def _frames_until_closed(self):
+        while True:
+            if self._frames:
+                frames = b"".join(self._frames)
+                self._frames.clear()
+                yield frames
+                continue
+            if self.closed:
+                return
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.keepalive)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE_FRAME
+
+
+class Broadcaster:
+    """Fans processed comments out to Server-Sent Events subscribers.
+
+    Each comment is encoded into an SSE frame once and the same bytes are
+    buffered for every subscriber to its match and to every subscriber to all
+    matches. Publishing never waits on a subscriber: up to `buffer` frames are
+    held per subscriber, and one that falls further behind is disconnected.
+    """
+
+    def __init__(self, buffer=100, keepalive=15.0):
+        if buffer < 1:
+            raise ValueError("buffer must be at least 1")
+        self.buffer = buffer
+        self.keepalive = keepalive
+        self.published = 0
+        self.delivered = 0
+        self.disconnected = 0
+        self._ids = itertools.count(1)
+        # Keyed by match_id; None holds the subscribers to every match.
+        self._subscribers = collections.defaultdict(set)
+
+    @property
+    def subscribers(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def stats(self):
+        return {
+            "subscribers": self.subscribers,
+            "buffer": self.buffer,
+            "published": self.published,
+            "delivered": self.delivered,
+            "disconnected": self.disconnected,
+        }
+
+    def subscribe(self, match_id=None):
+        subscriber = Subscriber(match_id, self.buffer, self.keepalive)
+        self._subscribers[match_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.match_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.match_id]
+
+    def publish(self, comment):
+        match_id = comment.get("match_id")
+        targets = list(self._subscribers.get(None, ()))
+        if match_id is not None:
+            targets.extend(self._subscribers.get(match_id, ()))
+        self.published += 1
+        if not targets:
+            return
+        frame = b"id: %d\nevent: comment\ndata: %s\n\n" % (
+            next(self._ids), codec.encode(comment, codec.JSON_CONTENT_TYPE))
+        for subscriber in targets:
+            if subscriber.offer(frame):
+                self.delivered += 1
+            else:
+                self.disconnected += 1
+                self.unsubscribe(subscriber)
+
+    def close(self):
+        """Disconnect every subscriber, so open streams end on shutdown."""
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in subscribers:
+                subscriber.close(SHUTDOWN_FRAME)
+        self._subscribers.clear()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+from module_c.broadcast import KEEPALIVE_FRAME, SHUTDOWN_FRAME, SLOW_CONSUMER_FRAME, Broadcaster
+
+
+async def read(subscriber):
+    frames = []
+    async for frame in subscriber:
+        frames.append(frame)
+    return b"".join(frames)
+
+
+def comments(frames):
+    return [json.loads(line[len(b"data: "):]) for line in frames.split(b"\n") if line.startswith(b"data: {")]
+
+
+def test_comments_reach_their_match_and_all_match_subscribers():
+    async def main():
+        broadcaster = Broadcaster()
+        readers = [asyncio.create_task(read(broadcaster.subscribe(match_id))) for match_id in (None, "1", "2")]
+        await asyncio.sleep(0)
+        broadcaster.publish({"match_id": "1", "text": "a"})
+        broadcaster.publish({"match_id": "2", "text": "b"})
+        await asyncio.sleep(0.01)
+        broadcaster.close()
+        return await asyncio.gather(*readers), broadcaster.stats()
+
+    (everything, match_1, match_2), stats = asyncio.run(main())
+    assert [comment["text"] for comment in comments(everything)] == ["a", "b"]
+    assert [comment["text"] for comment in comments(match_1)] == ["a"]
+    assert [comment["text"] for comment in comments(match_2)] == ["b"]
+    assert match_1.endswith(SHUTDOWN_FRAME)
+    assert stats == {"subscribers": 0, "buffer": 100, "published": 2, "delivered": 4, "disconnected": 0}
+
+
+def test_each_comment_is_encoded_once_for_all_subscribers():
+    async def main():
+        broadcaster = Broadcaster()
+        subscribers = [broadcaster.subscribe() for _ in range(3)]
+        broadcaster.publish({"match_id": "1"})
+        return {id(subscriber._frames[0]) for subscriber in subscribers}
+
+    assert len(asyncio.run(main())) == 1
+
+
+def test_slow_subscribers_are_disconnected_without_holding_up_others():
+    async def main():
+        broadcaster = Broadcaster(buffer=2)
+        slow, fast = broadcaster.subscribe(), broadcaster.subscribe()
+        fast_frames = []
+        for index in range(3):
+            broadcaster.publish({"match_id": "1", "index": index})
+            async for frame in fast:
+                fast_frames.append(frame)
+                break
+        broadcaster.close()
+        return await read(slow), b"".join(fast_frames), broadcaster.disconnected
+
+    slow, fast, disconnected = asyncio.run(main())
+    assert slow == SLOW_CONSUMER_FRAME
+    assert [comment["index"] for comment in comments(fast)] == [0, 1, 2]
+    assert disconnected == 1
+
+
+def test_idle_subscribers_get_keepalives():
+    async def main():
+        broadcaster = Broadcaster(keepalive=0.01)
+        subscriber = broadcaster.subscribe()
+        async for frame in subscriber:
+            return frame
+
+    assert asyncio.run(main()) == KEEPALIVE_FRAME
+
+
+def test_buffer_must_hold_a_frame():
+    with pytest.raises(ValueError):
+        Broadcaster(buffer=0)
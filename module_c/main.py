@@ -1,25 +1,189 @@
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 
-app = FastAPI()
+from common.codec_http import decoded_body, encoded_response
+from common.idempotency import IdempotentResults
+from common.metrics import Counter, Gauge, Histogram, MetricsMiddleware, metrics_response
+from common.resilience import IDEMPOTENCY_HEADER, DeadlineMiddleware
+from common.settings import env_number
+from common.timing import TimedJSONResponse, TimingMiddleware
+from module_c.broadcast import Broadcaster
+from module_c.scheduler import CommentScheduler
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    broadcaster = app.state.broadcaster = Broadcaster(buffer=BROADCAST_BUFFER, keepalive=BROADCAST_KEEPALIVE_SECONDS)
+
+    def process_and_publish(comment):
+        processed = process_comment(comment)
+        broadcaster.publish(processed)
+        return processed
+
+    scheduler = app.state.scheduler = CommentScheduler(
+        process_and_publish,
+        maxsize=COMMENT_QUEUE_SIZE,
+        workers=COMMENT_WORKERS,
+        max_age=COMMENT_MAX_AGE_MS / 1000,
+        on_served=lambda priority, waited: COMMENT_QUEUE_WAIT.observe(waited, priority),
+        on_dropped=lambda priority, reason: COMMENTS_DROPPED.inc(priority, reason),
+    )
+    await scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        broadcaster.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TimingMiddleware, service="c")
+app.add_middleware(MetricsMiddleware, module="c")
 
 try:
     MODULE_C_PORT = int(os.environ["MODULE_C_PORT"])
 except KeyError as e:
     raise RuntimeError(f"Missing required environment variable: {e.args[0]}")
 
+IDEMPOTENCY_TTL_SECONDS = env_number("IDEMPOTENCY_TTL_SECONDS", 300.0, float)
+IDEMPOTENCY_MAX_KEYS = env_number("IDEMPOTENCY_MAX_KEYS", 10000)
+# Directory shared by all module C workers and replicas on this host, so a
+# hedged copy reaching another replica is deduplicated too; unset keeps
+# results per worker process.
+IDEMPOTENCY_DIR = os.environ.get("IDEMPOTENCY_DIR")
+COMMENT_QUEUE_SIZE = env_number("COMMENT_QUEUE_SIZE", 1000)
+COMMENT_WORKERS = env_number("COMMENT_WORKERS", 1)
+COMMENT_MAX_AGE_MS = env_number("COMMENT_MAX_AGE_MS", 5000.0, float)
+BROADCAST_BUFFER = env_number("BROADCAST_BUFFER", 100)
+BROADCAST_KEEPALIVE_SECONDS = env_number("BROADCAST_KEEPALIVE_SECONDS", 15.0, float)
+
+COMMENT_PROCESSING = Histogram("comment_processing_seconds", "Time spent processing one comment.")
+COMMENT_QUEUE_WAIT = Histogram("comment_queue_wait_seconds", "Time comments waited in the scheduler, by priority.",
+                               ("priority",))
+COMMENTS_DROPPED = Counter("comments_dropped_total", "Comments dropped by the scheduler, by priority and reason.",
+                           ("priority", "reason"))
+Gauge("comment_queue_depth", "Comments waiting in the scheduler.", callback=lambda: app.state.scheduler.depth)
+Gauge("comment_subscribers", "Open Server-Sent Events comment feeds.", callback=lambda: app.state.broadcaster.subscribers)
+Counter("comment_broadcast_delivered_total", "Comment frames buffered for feed subscribers.",
+        callback=lambda: app.state.broadcaster.delivered)
+Counter("comment_broadcast_disconnected_total", "Feed subscribers disconnected for falling behind.",
+        callback=lambda: app.state.broadcaster.disconnected)
+
+# Results by Idempotency-Key, so retried and hedged requests are processed once.
+idempotent_results = IdempotentResults(ttl=IDEMPOTENCY_TTL_SECONDS, max_keys=IDEMPOTENCY_MAX_KEYS,
+                                       directory=IDEMPOTENCY_DIR)
+Counter("idempotent_duplicates_total", "Requests answered from an earlier one with the same Idempotency-Key.",
+        callback=lambda: idempotent_results.duplicates)
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
 @app.get("/test_c_module")
-def test_c_module():
+async def test_c_module():
     return {"result": "Finalized by Module C"}
 
-@app.post("/comment")
-def comment(comment: dict):
+def process_comment(comment):
+    start = time.perf_counter()
     print(f"Received comment: {comment}")
     # Here you can process the comment as needed
-    return {"status": "Comment received", "comment": comment}
+    COMMENT_PROCESSING.observe(time.perf_counter() - start)
+    return comment
+
+async def schedule_comments(scheduler, comments):
+    queued = 0
+    for comment in comments:
+        queued += await scheduler.put(comment)
+    return {"status": "Comments received", "queued": queued, "dropped": len(comments) - queued}
+
+async def schedule_once(request, schedule):
+    """Await `schedule()` unless a request with the same Idempotency-Key already did; return its result."""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return await schedule()
+    return await idempotent_results.run(key, schedule)
+
+@app.post("/comment")
+async def comment(request: Request, comment: dict = Depends(decoded_body(dict))):
+    result = await schedule_once(request, lambda: schedule_comments(request.app.state.scheduler, [comment]))
+    status = "Comment received" if result["queued"] else "Comment dropped"
+    return encoded_response(request, {"status": status, "comment": comment})
+
+@app.post("/comments")
+async def comments(request: Request, comments: list = Depends(decoded_body(list))):
+    return await schedule_once(request, lambda: schedule_comments(request.app.state.scheduler, comments))
+
+@app.get("/comment_queue")
+async def comment_queue(request: Request):
+    return request.app.state.scheduler.stats()
+
+@app.get("/comments/events")
+async def comment_events(request: Request, match_id: Optional[str] = None):
+    """Server-Sent Events feed of processed comments, for one match or all of them.
+
+    Each comment is an `event: comment` frame whose data is the comment as
+    JSON. A subscriber more than BROADCAST_BUFFER frames behind is sent an
+    `event: disconnect` frame and the stream ends; it may reconnect.
+    """
+    broadcaster = request.app.state.broadcaster
+    subscriber = broadcaster.subscribe(match_id)
+
+    async def frames():
+        try:
+            async for frame in subscriber:
+                yield frame
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"cache-control": "no-cache", "x-accel-buffering": "no"})
+
+@app.get("/comment_broadcast")
+async def comment_broadcast(request: Request):
+    return request.app.state.broadcaster.stats()
+
+@app.websocket("/comments/stream/{match_id}")
+async def comment_stream(websocket: WebSocket, match_id: str):
+    """Schedule a match's comments as they stream in, pushing each result back.
+
+    Every incoming {"seq": n, "data": comment} message gets a comment message,
+    or {"type": "dropped"} if the scheduler dropped it as stale, followed by
+    {"type": "ack", "seq": n}, which returns one unit of flow-control credit to
+    the sender.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    def reply(seq):
+        async def on_done(processed):
+            message = {"type": "comment", "match_id": match_id, "seq": seq, "comment": processed}
+            if processed is None:
+                message = {"type": "dropped", "match_id": match_id, "seq": seq}
+            try:
+                async with send_lock:
+                    await websocket.send_json(message)
+                    await websocket.send_json({"type": "ack", "seq": seq})
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # The stream closed while the comment was queued.
+        return on_done
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            await websocket.app.state.scheduler.put(message["data"], on_done=reply(message["seq"]))
+    except WebSocketDisconnect:
+        pass
 
 if __name__ == "__main__":
     import uvicorn
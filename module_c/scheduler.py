@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# Lower values are served first.
+PRIORITY_GOAL = 0
+PRIORITY_PLAY = 1
+PRIORITY_ROUTINE = 2
+PRIORITY_NAMES = {PRIORITY_GOAL: "goal", PRIORITY_PLAY: "play", PRIORITY_ROUTINE: "routine"}
+PLAY_TRANSITIONS = frozenset({"start", "possession", "game_mode"})
+
+
+def comment_priority(comment):
+    """Goals first, then possession and game-mode changes, then routine updates."""
+    transitions = comment.get("transitions") or ()
+    if "goal" in transitions:
+        return PRIORITY_GOAL
+    if PLAY_TRANSITIONS.intersection(transitions):
+        return PRIORITY_PLAY
+    return PRIORITY_ROUTINE
+
+
+class CommentScheduler:
+    """Bounded priority queue of comments served by worker tasks, dropping stale ones.
+
+    Each comment gets a deadline `max_age` seconds after its step's "timestamp"
+    (wall-clock seconds, set by module B), or after it was queued if it has
+    none. Workers always take the highest-priority comment, oldest first within
+    a priority, and drop it instead of processing it once its deadline has
+    passed: a late comment about an old step is worse than none. When the queue
+    is full, expired comments are purged first; if it is still full the
+    lowest-priority, newest comment is dropped, which may be the incoming one.
+
+    `process(comment)` is called for every comment served. The optional
+    `on_done(result)` callback passed to `put` is awaited with its result, or
+    with None if the comment was dropped.
+    """
+
+    def __init__(self, process, maxsize=1000, workers=1, max_age=5.0, on_served=None, on_dropped=None):
+        if maxsize < 1 or workers < 1:
+            raise ValueError("maxsize and workers must be at least 1")
+        self.process = process
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_age = max_age
+        self.on_served = on_served
+        self.on_dropped = on_dropped
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = {"expired": 0, "overflow": 0}
+        self._heap = []
+        self._order = itertools.count()
+        self._ready = None
+        self._tasks = []
+
+    @property
+    def depth(self):
+        return len(self._heap)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "max_age": self.max_age,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": dict(self.dropped),
+        }
+
+    async def start(self):
+        self._ready = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._heap:
+            await self._drop(heapq.heappop(self._heap), "overflow")
+
+    async def put(self, comment, on_done=None):
+        """Queue `comment`; return False if it was dropped instead."""
+        now = time.time()
+        timestamp = comment.get("timestamp")
+        deadline = (timestamp if isinstance(timestamp, (int, float)) else now) + self.max_age
+        item = [comment_priority(comment), next(self._order), deadline, now, comment, on_done]
+        if deadline <= now:
+            await self._drop(item, "expired")
+            return False
+        if len(self._heap) >= self.maxsize:
+            await self._purge_expired(now)
+        if len(self._heap) >= self.maxsize:
+            worst = max(self._heap)
+            if worst[:2] < item[:2]:
+                await self._drop(item, "overflow")
+                return False
+            self._heap.remove(worst)
+            heapq.heapify(self._heap)
+            await self._drop(worst, "overflow")
+        heapq.heappush(self._heap, item)
+        self.enqueued += 1
+        async with self._ready:
+            self._ready.notify()
+        return True
+
+    async def _purge_expired(self, now):
+        expired = [item for item in self._heap if item[2] <= now]
+        if expired:
+            self._heap = [item for item in self._heap if item[2] > now]
+            heapq.heapify(self._heap)
+            for item in expired:
+                await self._drop(item, "expired")
+
+    async def _drop(self, item, reason):
+        self.dropped[reason] += 1
+        if self.on_dropped is not None:
+            self.on_dropped(PRIORITY_NAMES[item[0]], reason)
+        if item[5] is not None:
+            await item[5](None)
+
+    async def _worker(self):
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(lambda: self._heap)
+                item = heapq.heappop(self._heap)
+            priority, _, deadline, queued_at, comment, on_done = item
+            now = time.time()
+            if deadline <= now:
+                await self._drop(item, "expired")
+                continue
+            try:
+                result = self.process(comment)
+            except Exception as e:
+                self.failed += 1
+                print(f"Failed to process comment: {e}")
+                result = None
+            else:
+                self.processed += 1
+                if self.on_served is not None:
+                    self.on_served(PRIORITY_NAMES[priority], now - queued_at)
+            if on_done is not None:
+                await on_done(result)
+            # Processing is synchronous; let request handlers run between comments.
+            await asyncio.sleep(0)
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from module_c.scheduler import (PRIORITY_GOAL, PRIORITY_PLAY, PRIORITY_ROUTINE, CommentScheduler,
+                                comment_priority)
+
+
+def comment(name, transitions=(), age=0.0):
+    return {"name": name, "transitions": list(transitions), "timestamp": time.time() - age}
+
+
+def test_comment_priority():
+    assert comment_priority(comment("g", ["possession", "goal"])) == PRIORITY_GOAL
+    assert comment_priority(comment("p", ["game_mode"])) == PRIORITY_PLAY
+    assert comment_priority({"keys": {}}) == PRIORITY_ROUTINE
+
+
+def test_goals_are_served_first_and_each_priority_in_order():
+    async def main():
+        served = []
+        scheduler = CommentScheduler(lambda c: served.append(c["name"]) or c)
+        # Queue everything before the worker starts so the order is decided by priority alone.
+        scheduler._ready = asyncio.Condition()
+        for item in (comment("r1"), comment("p1", ["start"]), comment("r2"), comment("g1", ["goal"]),
+                     comment("p2", ["possession"])):
+            await scheduler.put(item)
+        await scheduler.start()
+        while scheduler.depth:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return served
+
+    assert asyncio.run(main()) == ["g1", "p1", "p2", "r1", "r2"]
+
+
+def test_stale_comments_are_dropped():
+    async def main():
+        dropped = []
+        results = []
+
+        async def on_done(result):
+            results.append(result)
+
+        scheduler = CommentScheduler(lambda c: c, max_age=1.0, on_dropped=lambda *args: dropped.append(args))
+        await scheduler.start()
+        accepted = await scheduler.put(comment("old", age=2.0), on_done=on_done)
+        await scheduler.stop()
+        return accepted, dropped, results, scheduler.stats()["dropped"]
+
+    accepted, dropped, results, counts = asyncio.run(main())
+    assert not accepted
+    assert dropped == [("routine", "expired")]
+    assert results == [None]
+    assert counts == {"expired": 1, "overflow": 0}
+
+
+def test_full_queue_drops_the_lowest_priority_newest_comment():
+    async def main():
+        scheduler = CommentScheduler(lambda c: c, maxsize=2)
+        scheduler._ready = asyncio.Condition()
+        await scheduler.put(comment("r1"))
+        await scheduler.put(comment("r2"))
+        rejected = await scheduler.put(comment("r3"))
+        accepted = await scheduler.put(comment("g1", ["goal"]))
+        names = sorted(item[4]["name"] for item in scheduler._heap)
+        return rejected, accepted, names, scheduler.dropped["overflow"]
+
+    assert asyncio.run(main()) == (False, True, ["g1", "r1"], 2)
+
+
+def test_on_done_gets_the_processed_comment_and_failures_are_counted():
+    async def main():
+        results = []
+
+        async def on_done(result):
+            results.append(result)
+
+        def process(c):
+            if c["name"] == "bad":
+                raise ValueError("bad comment")
+            return {"processed": c["name"]}
+
+        scheduler = CommentScheduler(process)
+        await scheduler.start()
+        await scheduler.put(comment("ok"), on_done=on_done)
+        await scheduler.put(comment("bad"), on_done=on_done)
+        while len(results) < 2:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return results, scheduler.processed, scheduler.failed
+
+    assert asyncio.run(main()) == ([{"processed": "ok"}, None], 1, 1)
@@ -0,0 +1,140 @@
+"""Fan-out latency of module C's Server-Sent Events comment feed.
+
+Starts module C in this process and opens --listeners feeds on
+/comments/events, of which --slow never read after the response headers and
+stand in for stalled clients. Comments are then posted at --rate per second,
+and each is delivered to every listener:
+
+    python -m scripts.bench_broadcast --listeners 2000 --slow 20 --rate 20 --duration 10
+
+Reports deliveries per second, the latency from posting a comment to a
+listener reading it over every delivery to the reading listeners, and how
+many listeners module C disconnected. Slow listeners should be disconnected once their buffer of
+BROADCAST_BUFFER frames fills, without holding the others up.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+
+import httpx
+
+from scripts.bench_chain import print_result, summarize
+
+
+async def start_server(port):
+    import uvicorn
+    from module_c.main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           backlog=4096))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return app, server, task
+
+
+async def open_feed(port, slow=False):
+    sock = socket.socket()
+    if slow:
+        # A small receive window makes a stalled reader push back on the server quickly.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    writer.write(b"GET /comments/events?match_id=bench HTTP/1.1\r\nhost: localhost\r\n"
+                 b"accept: text/event-stream\r\n\r\n")
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    return reader, writer
+
+
+async def listen(reader, latencies, measure_from, counts):
+    """Read chunked SSE frames until the stream ends, recording comment latencies."""
+    try:
+        while True:
+            size = int(await reader.readuntil(b"\r\n"), 16)
+            if size == 0:
+                return
+            chunk = await reader.readexactly(size + 2)
+            for line in chunk.split(b"\n"):
+                if line.startswith(b"data: {"):
+                    sent_at = json.loads(line[len(b"data: "):])["keys"]["sent_at"]
+                    counts["frames"] += 1
+                    if sent_at >= measure_from:
+                        latencies.append(time.time() - sent_at)
+                elif line == b"event: disconnect":
+                    counts["disconnected"] += 1
+    except (asyncio.IncompleteReadError, ConnectionError):
+        counts["disconnected"] += 1
+
+
+async def main(args):
+    app, server, task = await start_server(args.port)
+    latencies, writers, tasks = [], [], []
+    counts = {"frames": 0, "disconnected": 0}
+    try:
+        feeds = []
+        for index in range(args.listeners):
+            feeds.append(await open_feed(args.port, slow=index < args.slow))
+        print(f"{len(feeds)} feeds open ({args.slow} slow)", file=sys.stderr)
+        measure_from = time.time() + args.warmup
+        for index, (reader, writer) in enumerate(feeds):
+            writers.append(writer)
+            if index >= args.slow:
+                tasks.append(asyncio.create_task(listen(reader, latencies, measure_from, counts)))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}") as client:
+            end = measure_from + args.duration
+            step = 0
+            next_send = time.time()
+            while next_send < end:
+                await asyncio.sleep(max(0.0, next_send - time.time()))
+                step += 1
+                comment = {"keys": {"step": step, "sent_at": time.time(), "padding": "x" * args.size},
+                           "match_id": "bench"}
+                response = await client.post("/comment", json=comment)
+                response.raise_for_status()
+                next_send += 1 / args.rate
+        await asyncio.sleep(1.0)
+        stats = app.state.broadcaster.stats()
+    finally:
+        for writer in writers:
+            writer.close()
+        for listener in tasks:
+            listener.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.should_exit = True
+        await task
+    result = summarize(latencies, 0, args.duration)
+    result["frames_read"] = counts["frames"]
+    result["reading_listeners_disconnected"] = counts["disconnected"]
+    result["broadcaster"] = stats
+    print_result("broadcast", result)
+    return {"config": {key: value for key, value in vars(args).items() if key != "output"},
+            "cpus": os.cpu_count(), "result": result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure fan-out of module C's comment feed.")
+    parser.add_argument("--listeners", type=int, default=1000, help="Feeds to open")
+    parser.add_argument("--slow", type=int, default=10, help="Feeds that never read")
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--rate", type=float, default=20.0, help="Comments posted per second")
+    parser.add_argument("--size", type=int, default=200, help="Padding bytes per comment")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds after the feeds open")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    # Module C prints every comment; keep stdout clean for the JSON report.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,325 @@
+"""Open-loop load generator and latency benchmark for the A -> B -> C chain.
+
+Requests are scheduled on a fixed arrival process (Poisson or uniform) that
+does not wait for earlier responses, and latency is measured from the
+scheduled send time. When --concurrency requests are already in flight, new
+ones wait for a slot and that wait counts towards their latency, so a
+saturated service shows up as growing latency, not as a lower offered rate.
+
+Targets: test_a_module (A -> B -> C), test_b_module (B -> C), test_c_module
+(C only), event (B ingest) and comment (C ingest). Besides end-to-end
+latency, each target reports every hop's own time, read from the
+Server-Timing header the modules return (common/timing.py): time in the hop
+minus time waiting on its downstream, plus the network time between the hop
+and its downstream. Run from the project root:
+
+    python -m scripts.bench_chain --start subprocess --rate 200 --duration 20
+    python -m scripts.bench_chain --targets event --rate 2000 --output bench.json
+
+With --start composed the three modules run as one app (composed.main) in
+this process, calling each other in-process; the targets on modules B and C
+are then reached under its /b and /c mounts.
+
+Results are printed, and written as JSON with --output, so runs can be
+compared between releases.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from common import codec
+from scripts.observations import synthetic_episode
+from scripts.run_modules import MODULES, STARTUP_ORDER, is_healthy, module_command, socket_path
+
+
+COMPOSED_PREFIXES = {'a': '', 'b': '/b', 'c': '/c'}
+
+
+def _base_url(key, composed=False):
+    if composed:
+        return f"http://127.0.0.1:{os.environ['MODULE_A_PORT']}{COMPOSED_PREFIXES[key]}"
+    if socket_path(key):
+        return "http://localhost"
+    return f"http://127.0.0.1:{os.environ[MODULES[key]['port_var']]}"
+
+
+TARGETS = {
+    'test_a_module': ('a', 'GET', '/test_a_module'),
+    'test_b_module': ('b', 'GET', '/test_b_module'),
+    'test_c_module': ('c', 'GET', '/test_c_module'),
+    'event': ('b', 'POST', '/event'),
+    'comment': ('c', 'POST', '/comment'),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def parse_server_timing(value):
+    """{entry name: milliseconds} of a Server-Timing header; repeated entries (retries, hedges) add up."""
+    durations = {}
+    for entry in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, *params = entry.split(";")
+        for param in params:
+            key, _, number = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    durations[name.strip()] = durations.get(name.strip(), 0.0) + float(number)
+                except ValueError:
+                    pass
+    return durations
+
+
+def _percentiles(values):
+    values = sorted(values)
+    return {'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99), 'p999': percentile(values, 0.999)}
+
+
+def summarize_hops(timings):
+    """Per-hop percentiles from the parsed Server-Timing of each measured response.
+
+    A hop's own time is its total less the time it waited on its downstream;
+    its network time is the part of that wait the downstream did not report.
+    """
+    services = sorted({name[:-len("-total")] for timing in timings for name in timing if name.endswith("-total")})
+    hops = {}
+    for service in services:
+        measured = [timing for timing in timings if f"{service}-total" in timing]
+        hops[service] = {
+            'responses': len(measured),
+            'own_ms': _percentiles([timing[f"{service}-total"] - timing.get(f"{service}-downstream", 0.0)
+                                    for timing in measured]),
+            'network_ms': _percentiles([timing.get(f"{service}-network", 0.0) for timing in measured]),
+        }
+    return hops
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'latency_ms': None,
+    }
+    if latencies:
+        summary['latency_ms'] = {
+            'mean': sum(latencies) / len(latencies) * 1e3,
+            'p50': percentile(latencies, 0.50) * 1e3,
+            'p95': percentile(latencies, 0.95) * 1e3,
+            'p99': percentile(latencies, 0.99) * 1e3,
+            'p999': percentile(latencies, 0.999) * 1e3,
+            'max': latencies[-1] * 1e3,
+        }
+    return summary
+
+
+class Bodies:
+    """Cycles through pre-encoded request bodies so encoding stays off the clock."""
+
+    def __init__(self, target, content_type, count=500):
+        self.content_type = content_type
+        episode = synthetic_episode(count)
+        if target == 'event':
+            payloads = [{'match_id': 'bench', 'step': observation} for observation in episode]
+        else:
+            payloads = [{'keys': observation} for observation in episode]
+        self._bodies = [codec.encode(payload, content_type) for payload in payloads]
+        self._next = 0
+
+    def next(self):
+        body = self._bodies[self._next % len(self._bodies)]
+        self._next += 1
+        return body
+
+
+async def drive(client, target, rate, duration, warmup, concurrency, arrival, content_type, rng, composed=False):
+    key, method, path = TARGETS[target]
+    url = _base_url(key, composed) + path
+    bodies = Bodies(target, content_type) if method == 'POST' else None
+    headers = {'content-type': content_type} if bodies else {}
+    slots = asyncio.Semaphore(concurrency)
+    latencies, timings, errors, tasks = [], [], [0], []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    measure_from = start + warmup
+    end = measure_from + duration
+
+    async def one(scheduled, body):
+        async with slots:
+            try:
+                response = await client.request(method, url, content=body, headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+        if scheduled < measure_from:
+            return
+        if ok:
+            latencies.append(loop.time() - scheduled)
+            timings.append(parse_server_timing(response.headers.get("server-timing")))
+        else:
+            errors[0] += 1
+
+    scheduled = start
+    while scheduled < end:
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(scheduled, bodies.next() if bodies else None)))
+        scheduled += rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+    await asyncio.gather(*tasks)
+    result = summarize(latencies, errors[0], duration)
+    result['hops'] = summarize_hops(timings)
+    return result
+
+
+def start_subprocesses(keys):
+    processes = []
+    for key in [key for key in STARTUP_ORDER if key in keys]:
+        command = module_command(key, workers=1)
+        processes.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        wait_healthy(key)
+    return processes
+
+
+async def start_composed():
+    import uvicorn
+    config = uvicorn.Config("composed.main:app", host="127.0.0.1", port=int(os.environ['MODULE_A_PORT']),
+                            log_level="warning")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return [(server, task)]
+
+
+async def start_in_process(keys):
+    import uvicorn
+    servers = []
+    for key in [key for key in STARTUP_ORDER if key in keys]:
+        path = socket_path(key)
+        address = {'uds': path} if path else {'host': "127.0.0.1", 'port': int(os.environ[MODULES[key]['port_var']])}
+        config = uvicorn.Config(MODULES[key]['main'], log_level="warning", **address)
+        server = uvicorn.Server(config)
+        servers.append((server, asyncio.create_task(server.serve())))
+        while not server.started:
+            await asyncio.sleep(0.05)
+    return servers
+
+
+def wait_healthy(key, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_healthy(key, timeout=1.0):
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"{MODULES[key]['desc']} did not become healthy within {timeout}s")
+
+
+async def main(args):
+    needed = {TARGETS[target][0] for target in args.targets}
+    # Targets on A or B need the modules downstream of them.
+    if 'a' in needed:
+        needed |= {'b', 'c'}
+    if 'b' in needed:
+        needed.add('c')
+    servers, processes = [], []
+    if args.start == 'subprocess':
+        processes = start_subprocesses(needed)
+    elif args.start == 'inprocess':
+        servers = await start_in_process(needed)
+    elif args.start == 'composed':
+        servers = await start_composed()
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            clients = {}
+            for target in args.targets:
+                key = TARGETS[target][0]
+                if key not in clients:
+                    # Modules listening on a Unix socket are reached over it.
+                    uds = socket_path(key) if args.start != 'composed' else None
+                    transport = httpx.AsyncHTTPTransport(limits=limits, uds=uds)
+                    clients[key] = await stack.enter_async_context(
+                        httpx.AsyncClient(transport=transport, timeout=args.timeout))
+                results[target] = await drive(clients[key], target, args.rate, args.duration, args.warmup,
+                                              args.concurrency, args.arrival, args.content_type, rng,
+                                              composed=args.start == 'composed')
+                print_result(target, results[target])
+    finally:
+        for server, task in reversed(servers):
+            server.should_exit = True
+            await task
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+    return {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'environment': {'python': sys.version.split()[0], 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+def print_result(target, result):
+    latency = result['latency_ms']
+    if latency is None:
+        print(f"{target:14s} no successful requests ({result['errors']} errors)", file=sys.stderr)
+        return
+    print(f"{target:14s} {result['throughput_rps']:9.1f} req/s  errors {result['errors']:5d}  "
+          f"p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  p99 {latency['p99']:8.2f}  "
+          f"p999 {latency['p999']:8.2f} ms", file=sys.stderr)
+    for service, hop in result.get('hops', {}).items():
+        own, network = hop['own_ms'], hop['network_ms']
+        print(f"{'':14s} {service}-own    p50 {own['p50']:8.2f}  p95 {own['p95']:8.2f}  p99 {own['p99']:8.2f}  "
+              f"ms   {service}-network p50 {network['p50']:8.2f}  p99 {network['p99']:8.2f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the module A -> B -> C chain.")
+    parser.add_argument("--targets", nargs='+', choices=list(TARGETS), default=list(TARGETS),
+                        help="Endpoints to drive, one after the other")
+    parser.add_argument("--start", choices=['none', 'subprocess', 'inprocess', 'composed'], default='none',
+                        help="Start the needed modules as uvicorn subprocesses, in this process, "
+                             "as one composed app in this process, or use already running ones")
+    parser.add_argument("--rate", type=float, default=100.0, help="Offered requests per second per target")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per target")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each target")
+    parser.add_argument("--concurrency", type=int, default=256, help="Maximum requests in flight")
+    parser.add_argument("--arrival", choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument("--content-type", choices=list(codec.CONTENT_TYPES), default=codec.JSON_CONTENT_TYPE,
+                        help="Body encoding for event and comment requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.start in ('inprocess', 'composed'):
+        # The modules print to stdout; keep it clean for the JSON report.
+        with contextlib.redirect_stdout(sys.stderr):
+            report = asyncio.run(main(args))
+    else:
+        report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
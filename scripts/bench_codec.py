@@ -0,0 +1,37 @@
+"""Micro-benchmark of the msgpack observation codec against the JSON path.
+
+Run from the project root:
+
+    python -m scripts.bench_codec --steps 2000
+"""
+import argparse
+import time
+
+from common import codec
+from scripts.observations import synthetic_episode
+
+
+def bench(name, encode, decode, episode):
+    start = time.perf_counter()
+    bodies = [encode(observation) for observation in episode]
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for body in bodies:
+        decode(body)
+    decode_time = time.perf_counter() - start
+    size = sum(len(body) for body in bodies) / len(bodies)
+    print(f"{name:8s} {size:10.0f} B/obs {encode_time / len(bodies) * 1e6:10.1f} us encode "
+          f"{decode_time / len(bodies) * 1e6:10.1f} us decode")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare observation wire formats.")
+    parser.add_argument("--steps", type=int, default=2000, help="Observations to encode")
+    args = parser.parse_args()
+
+    episode = synthetic_episode(args.steps)
+    for content_type in (codec.JSON_CONTENT_TYPE, codec.MSGPACK_CONTENT_TYPE):
+        bench(content_type.split("/")[1],
+              lambda observation: codec.encode(observation, content_type),
+              lambda body: codec.decode(body, content_type),
+              episode)
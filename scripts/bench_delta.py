@@ -0,0 +1,61 @@
+"""Bandwidth and CPU benchmark of delta-encoded observation streams.
+
+Replays an episode through the msgpack codec twice, once sending every full
+observation and once through DeltaEncoder/DeltaDecoder, and reports bytes and
+encode/decode time per step. Run from the project root:
+
+    python -m scripts.bench_delta --dump /tmp/dumps/episode_done_xxx.dump
+    python -m scripts.bench_delta --steps 3000 --keyframe-interval 50
+
+Without --dump a synthetic episode is used.
+"""
+import argparse
+import pickle
+import time
+
+from common import codec
+from common.delta import DeltaDecoder, DeltaEncoder
+from scripts.observations import synthetic_episode
+
+
+def load_dump_observations(dump_file):
+    # Same layout gfootball's dump writer produces: a stream of pickled steps.
+    observations = []
+    with open(dump_file, 'rb') as in_fd:
+        while True:
+            try:
+                step = pickle.load(in_fd)
+            except EOFError:
+                break
+            observation = dict(step['observation'])
+            observation.pop('frame', None)
+            observations.append(observation)
+    return observations
+
+
+def run(name, episode, make_message, read_message):
+    start = time.perf_counter()
+    bodies = [codec.encode(make_message(observation)) for observation in episode]
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for body in bodies:
+        read_message(codec.decode(body))
+    decode_time = time.perf_counter() - start
+    total = sum(len(body) for body in bodies)
+    print(f"{name:6s} {total / len(bodies):8.0f} B/step {total / 1024:10.0f} KiB total "
+          f"{encode_time / len(bodies) * 1e6:8.1f} us encode {decode_time / len(bodies) * 1e6:8.1f} us decode")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full and delta-encoded observation streams.")
+    parser.add_argument("--dump", help="gfootball .dump file to replay")
+    parser.add_argument("--steps", type=int, default=3000, help="Synthetic episode length when no dump is given")
+    parser.add_argument("--keyframe-interval", type=int, default=50)
+    args = parser.parse_args()
+
+    episode = load_dump_observations(args.dump) if args.dump else synthetic_episode(args.steps)
+    full = run("full", episode, lambda observation: observation, lambda message: message)
+    encoder, decoder = DeltaEncoder(args.keyframe_interval), DeltaDecoder()
+    delta = run("delta", episode, encoder.encode, decoder.decode)
+    print(f"delta stream is {delta / full:.1%} of the full stream")
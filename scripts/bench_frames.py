@@ -0,0 +1,114 @@
+"""Per-step cost of turning the engine's screenshot into observation frames.
+
+With render=True, every step FootballEnvCore reads the screenshot into
+observation['frame'], and deep-copies the observation for the trace and for
+the caller. This times that work on a synthetic screenshot, the way the
+environment did it before frame_view (reshape, channel concatenate,
+transpose, flip and full copies) and the way it does it now:
+
+    python -m scripts.bench_frames --width 1280 --height 720 --steps 200
+
+The engine is not needed, so rendering itself is not included: the numbers
+are the frames/s ceiling the Python side puts on a rendering environment.
+render('rgb_array'), which returns a writable contiguous copy, is timed too
+when OpenCV is installed.
+"""
+import argparse
+import ast
+import copy
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+CORE_MODULE = os.path.join(os.path.dirname(__file__), os.pardir, "module_a", "football", "gfootball", "env",
+                           "football_env_core.py")
+
+
+def load_frame_view():
+    # Only frame_view is taken from the module: importing it needs the compiled game engine.
+    with open(CORE_MODULE) as f:
+        tree = ast.parse(f.read())
+    function = next(node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "frame_view")
+    namespace = {"np": np}
+    exec(compile(ast.Module(body=[function], type_ignores=[]), CORE_MODULE, "exec"), namespace)
+    return namespace["frame_view"]
+
+
+def legacy_frame(screen, width, height):
+    frame = np.frombuffer(screen, dtype=np.uint8)
+    frame = np.reshape(frame, [width, height, 3])
+    frame = np.reshape(np.concatenate([frame[:, :, 0], frame[:, :, 1], frame[:, :, 2]]), [3, height, width])
+    frame = np.transpose(frame, [1, 2, 0])
+    return np.flip(frame, 0)
+
+
+def legacy_step(screen, width, height, observation):
+    observation["frame"] = legacy_frame(screen, width, height)
+    return copy.deepcopy(observation), copy.deepcopy(observation)
+
+
+def view_step(frame_view, screen, width, height, observation):
+    frame = observation["frame"] = frame_view(screen, width, height)
+    return copy.deepcopy(observation, {id(frame): frame}), copy.deepcopy(observation, {id(frame): frame})
+
+
+def frames_per_second(function, screens):
+    start = time.perf_counter()
+    for screen in screens:
+        function(screen)
+    return len(screens) / (time.perf_counter() - start)
+
+
+def main(args):
+    frame_view = load_frame_view()
+    rng = np.random.default_rng(0)
+    # The engine hands out a new bytes object every step.
+    screens = [rng.integers(0, 256, args.width * args.height * 3, dtype=np.uint8).tobytes()
+               for _ in range(args.distinct)] * (args.steps // args.distinct)
+    observation = {"ball": np.zeros(3), "left_team": np.zeros((11, 2)), "score": [0, 0]}
+    for screen in screens[:args.distinct]:
+        if not np.array_equal(legacy_frame(screen, args.width, args.height),
+                              frame_view(screen, args.width, args.height)):
+            raise SystemExit("frame_view differs from the previous frame extraction")
+    result = {}
+    for name, function in (("before", lambda s: legacy_step(s, args.width, args.height, dict(observation))),
+                           ("after", lambda s: view_step(frame_view, s, args.width, args.height, dict(observation)))):
+        result[f"{name}_frames_per_second"] = max(frames_per_second(function, screens) for _ in range(args.repeat))
+    try:
+        import cv2
+    except ImportError:
+        cv2 = None
+    if cv2 is not None:
+        frame = frame_view(screens[0], args.width, args.height)
+
+        def split_merge(_):
+            b, g, r = cv2.split(frame)
+            return cv2.merge((r, g, b))
+
+        def channels_reversed(_):
+            return np.ascontiguousarray(frame[..., ::-1])
+
+        if not np.array_equal(split_merge(None), channels_reversed(None)):
+            raise SystemExit("render('rgb_array') differs from the previous cv2.split / cv2.merge output")
+        result["render_before_frames_per_second"] = max(
+            frames_per_second(split_merge, screens) for _ in range(args.repeat))
+        result["render_after_frames_per_second"] = max(
+            frames_per_second(channels_reversed, screens) for _ in range(args.repeat))
+    print(f"frames  before {result['before_frames_per_second']:9.1f}  "
+          f"after {result['after_frames_per_second']:9.1f} frames/s", file=sys.stderr)
+    return {"config": vars(args), "result": result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cost of extracting rendered frames.")
+    parser.add_argument("--width", type=int, default=1280, help="render_resolution_x")
+    parser.add_argument("--height", type=int, default=720, help="render_resolution_y")
+    parser.add_argument("--steps", type=int, default=200, help="Frames per timed pass")
+    parser.add_argument("--distinct", type=int, default=4, help="Distinct synthetic screenshots cycled through")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes; the fastest is reported")
+    args = parser.parse_args()
+    json.dump(main(args), sys.stdout, indent=2)
+    print()
@@ -0,0 +1,239 @@
+"""Tail latency of module B -> module C comment forwarding, with and without hedging.
+
+Starts --replicas module C servers as separate processes on consecutive
+ports from --port. Each request stalls for --stall-ms with probability
+--stall-probability, standing in for a GC pause or a noisy neighbour. Comment
+batches for --matches matches are then sent open-loop at --rate through
+`common.hedging.Replicas`, the same path module B's queue workers use: each
+match's batches go to the replica its ID hashes to. The run is done first
+without and then with hedging:
+
+    python -m scripts.bench_hedge --replicas 2 --rate 200 --duration 20
+
+The replicas share an IDEMPOTENCY_DIR, so a hedge reaching the other replica
+is deduplicated; pass --no-shared-idempotency to see what per-process
+deduplication leaves. Each phase reports p50/p95/p99/p999 and the hedges
+sent and won. It also reports, from the replicas, the duplicates module C
+discarded by Idempotency-Key and the batches it scheduled more than once. Hedging is not free: every hedge is extra work for a replica, and
+with few, busy replicas the hedged tail can come out worse than the unhedged
+one. Compare the two phases rather than assuming a win.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from common import codec
+from common.hedging import HEDGES, Replicas
+from common.http_client import create_http_client
+from common.resilience import IDEMPOTENCY_HEADER
+from scripts.bench_chain import print_result, summarize
+from scripts.observations import synthetic_episode
+
+
+class Stalls:
+    """ASGI wrapper delaying a random fraction of HTTP requests."""
+
+    def __init__(self, app, probability, seconds, rng):
+        self.app = app
+        self.probability = probability
+        self.seconds = seconds
+        self.rng = rng
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/comments" and self.rng.random() < self.probability:
+            await asyncio.sleep(self.seconds)
+        await self.app(scope, receive, send)
+
+
+def serve(args):
+    """Run one stalling module C replica; the benchmark starts one process per replica with --serve."""
+    import uvicorn
+    from module_c.main import app
+    stalled = Stalls(app, args.stall_probability, args.stall_ms / 1e3, random.Random(args.seed))
+    uvicorn.run(stalled, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_replicas(args, idempotency_dir):
+    processes = []
+    for index in range(args.replicas):
+        port = args.port + index
+        env = dict(os.environ, MODULE_C_PORT=str(port))
+        if idempotency_dir is not None:
+            env["IDEMPOTENCY_DIR"] = idempotency_dir
+        command = [sys.executable, "-m", "scripts.bench_hedge", "--serve", "--port", str(port),
+                   "--stall-probability", str(args.stall_probability), "--stall-ms", str(args.stall_ms),
+                   "--seed", str(args.seed + index)]
+        processes.append(subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL))
+    for index in range(args.replicas):
+        wait_healthy(f"http://127.0.0.1:{args.port + index}")
+    return processes
+
+
+def wait_healthy(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Module C replica at {url} did not become healthy within {timeout}s")
+
+
+def counter_value(counter, *labels):
+    return counter._series.get(labels, 0)
+
+
+ANSWERED = 'http_requests_total{module="c",route="/comments",method="POST",status="200"}'
+
+
+async def scrape(clients):
+    """Batches answered and duplicates discarded, summed over all replicas' /metrics."""
+    answered = duplicates = 0
+    for client in clients:
+        for line in (await client.get("/metrics")).text.splitlines():
+            name, _, value = line.rpartition(" ")
+            if name == ANSWERED:
+                answered += int(float(value))
+            elif name == "idempotent_duplicates_total":
+                duplicates += int(float(value))
+    return answered, duplicates
+
+
+async def drive(replicas, bodies, rate, duration, warmup, rng):
+    latencies, errors, tasks = [], [0], []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    measure_from = start + warmup
+    end = measure_from + duration
+
+    async def one(scheduled, match_id, body):
+        headers = {"content-type": codec.MSGPACK_CONTENT_TYPE, IDEMPOTENCY_HEADER: uuid.uuid4().hex}
+
+        async def send(client):
+            response = await client.post("/comments", content=body, headers=headers)
+            response.raise_for_status()
+
+        try:
+            await replicas.call(send, replica=replicas.replica(match_id))
+            ok = True
+        except Exception:
+            ok = False
+        if scheduled < measure_from:
+            return
+        if ok:
+            latencies.append(loop.time() - scheduled)
+        else:
+            errors[0] += 1
+
+    scheduled = start
+    sent = 0
+    while scheduled < end:
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(scheduled, *bodies[sent % len(bodies)])))
+        sent += 1
+        scheduled += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return summarize(latencies, errors[0], duration), sent
+
+
+async def run(args):
+    episode = synthetic_episode(args.batch * 20)
+    bodies = []
+    for match in range(args.matches):
+        match_id = f"bench-{match}"
+        bodies.extend((match_id, codec.encode([{"keys": step, "match_id": match_id}
+                                                for step in episode[i:i + args.batch]]))
+                      for i in range(0, len(episode), args.batch))
+    random.Random(args.seed).shuffle(bodies)
+    results = {}
+    async with contextlib.AsyncExitStack() as stack:
+        urls = [f"http://127.0.0.1:{args.port + index}" for index in range(args.replicas)]
+        clients = [await stack.enter_async_context(create_http_client(url, downstream=f"bench-{index}"))
+                   for index, url in enumerate(urls)]
+        # Stats are read around the circuit breakers, which an overloaded phase may have opened.
+        admin = [await stack.enter_async_context(httpx.AsyncClient(base_url=url, timeout=10.0)) for url in urls]
+        for hedge in (False, True):
+            name = "hedged" if hedge else "unhedged"
+            replicas = Replicas(clients, "bench", hedge=hedge, percentile=args.percentile,
+                                budget_ratio=args.budget_ratio)
+            hedges, won = counter_value(HEDGES, "bench", "sent"), counter_value(HEDGES, "bench", "won")
+            answered, duplicates = await scrape(admin)
+            result, batches = await drive(replicas, bodies, args.rate, args.duration, args.warmup,
+                                          random.Random(args.seed))
+            # Stalled copies the client gave up on may still be running on a replica.
+            await asyncio.sleep(args.stall_ms / 1e3 + 0.5)
+            after_answered, after_duplicates = await scrape(admin)
+            result["hedges_sent"] = counter_value(HEDGES, "bench", "sent") - hedges
+            result["hedges_won"] = counter_value(HEDGES, "bench", "won") - won
+            result["duplicates_discarded"] = after_duplicates - duplicates
+            # Every answered copy that was not a discarded duplicate scheduled its batch; both include the warmup.
+            result["batches_sent"] = batches
+            result["batches_scheduled_twice"] = after_answered - answered - result["duplicates_discarded"] - batches
+            results[name] = result
+            print_result(name, result)
+            print(f"{'':14s} hedges sent {result['hedges_sent']}  won {result['hedges_won']}  "
+                  f"duplicates discarded {result['duplicates_discarded']}  "
+                  f"batches scheduled twice {result['batches_scheduled_twice']}", file=sys.stderr)
+    return results
+
+
+def main(args):
+    with contextlib.ExitStack() as stack:
+        idempotency_dir = (stack.enter_context(tempfile.TemporaryDirectory(prefix="bench_hedge-"))
+                           if args.shared_idempotency else None)
+        processes = start_replicas(args, idempotency_dir)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+    return {"config": {key: value for key, value in vars(args).items() if key not in ("output", "serve")},
+            "cpus": os.cpu_count(), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare comment forwarding tail latency with and without hedging.")
+    parser.add_argument("--replicas", type=int, default=2, help="Module C replica processes to start")
+    parser.add_argument("--port", type=int, default=8102, help="Port of the first replica")
+    parser.add_argument("--rate", type=float, default=200.0, help="Offered batches per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per phase")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each phase")
+    parser.add_argument("--batch", type=int, default=10, help="Comments per batch")
+    parser.add_argument("--matches", type=int, default=16, help="Matches the batches are spread over")
+    parser.add_argument("--stall-probability", type=float, default=0.02, help="Fraction of requests that stall")
+    parser.add_argument("--stall-ms", type=float, default=100.0, help="Length of a stall")
+    parser.add_argument("--percentile", type=float, default=0.95, help="Latency percentile after which to hedge")
+    parser.add_argument("--budget-ratio", type=float, default=0.1, help="Hedges allowed per call")
+    parser.add_argument("--shared-idempotency", action=argparse.BooleanOptionalAction, default=True,
+                        help="Give the replicas a shared IDEMPOTENCY_DIR")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        sys.exit()
+    report = main(args)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,97 @@
+"""Throughput and CPU cost of the shared memory observation rings.
+
+Starts --matches producer processes, each writing a synthetic episode into its
+own ring at --rate steps per second, and reads every ring in this process with
+module B's RingPoller, as a module B with SHM_RING_ENABLED=1 would:
+
+    python -m scripts.bench_shm_ring --matches 8 --rate 500 --duration 10
+
+Reports steps read per second, the latency from a step being written to the
+poller handing it on, overruns, and the CPU time the reader and the producers'
+ring writes used per step.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from common.shm_ring import RingPoller, RingWriter
+from scripts.bench_chain import print_result, summarize
+from scripts.observations import synthetic_episode
+
+
+def produce(match_id, rate, duration, slots, results):
+    episode = synthetic_episode(1000)
+    written, cpu = 0, 0.0
+    with RingWriter(match_id, slots=slots) as ring:
+        start = time.time()
+        while time.time() < start + duration:
+            next_write = start + written / rate
+            delay = next_write - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            before = time.process_time()
+            ring.write(episode[written % len(episode)])
+            cpu += time.process_time() - before
+            written += 1
+    results.put({"match_id": match_id, "written": written, "write_cpu_seconds": cpu})
+
+
+async def main(args):
+    latencies = []
+    measure_from = time.time() + args.warmup
+
+    async def on_steps(match_id, records):
+        now = time.time()
+        latencies.extend(now - timestamp for _, timestamp, _ in records if timestamp >= measure_from)
+
+    poller = RingPoller(on_steps, poll_interval=args.poll_interval / 1000, discover_interval=0.1,
+                        reader=f"bench-{os.getpid()}")
+    await poller.start()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    producers = [context.Process(target=produce, args=(f"bench-{index}", args.rate, args.warmup + args.duration,
+                                                          args.slots, results))
+                 for index in range(args.matches)]
+    for producer in producers:
+        producer.start()
+    cpu_before = time.process_time()
+    written = [await asyncio.to_thread(results.get) for _ in producers]
+    for producer in producers:
+        producer.join()
+    await asyncio.sleep(0.5)
+    reader_cpu = time.process_time() - cpu_before
+    await poller.stop()
+    total_written = sum(result["written"] for result in written)
+    result = summarize(latencies, 0, args.duration)
+    result["steps_written"] = total_written
+    result["steps_read"] = poller.steps
+    result["overruns"] = poller.overruns
+    result["reader_cpu_us_per_step"] = reader_cpu / max(poller.steps, 1) * 1e6
+    result["writer_cpu_us_per_step"] = sum(r["write_cpu_seconds"] for r in written) / max(total_written, 1) * 1e6
+    print_result("shm_ring", result)
+    return {"config": {key: value for key, value in vars(args).items() if key != "output"},
+            "cpus": os.cpu_count(), "result": result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the shared memory observation rings.")
+    parser.add_argument("--matches", type=int, default=4, help="Producer processes, one ring each")
+    parser.add_argument("--rate", type=float, default=500.0, help="Steps written per second per match")
+    parser.add_argument("--slots", type=int, default=1024, help="Slots per ring")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Poller interval in ms")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds at the start")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,63 @@
+"""Per-step cost of play_game's observation summaries.
+
+Summarizes a synthetic episode with gfootball's table-driven SummaryFormatter,
+one step at a time and as one batch, the way a dump is summarized:
+
+    python -m scripts.bench_summary --steps 3000 --repeat 5
+
+Reports microseconds per step for the first pass, with the formatter's
+caches empty, for later passes, and for summarize_batch.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+from scripts.observations import synthetic_episode
+
+SUMMARY_MODULE = os.path.join(os.path.dirname(__file__), os.pardir, "module_a", "football", "gfootball",
+                              "observation_summary.py")
+
+
+def load_summary_module():
+    # Loaded by path: importing the gfootball package needs the compiled game engine.
+    spec = importlib.util.spec_from_file_location("observation_summary", SUMMARY_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def per_step_us(function, observations):
+    start = time.perf_counter()
+    for observation in observations:
+        function(observation)
+    return (time.perf_counter() - start) / len(observations) * 1e6
+
+
+def main(args):
+    summary = load_summary_module()
+    episode = synthetic_episode(args.steps)
+    formatter = summary.SummaryFormatter()
+    first = per_step_us(formatter.summarize, episode)
+    steady = min(per_step_us(formatter.summarize, episode) for _ in range(args.repeat))
+    batch = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        formatter.summarize_batch(episode)
+        batch.append((time.perf_counter() - start) / len(episode) * 1e6)
+    result = {"first_pass_us_per_step": first, "summarize_us_per_step": steady,
+              "summarize_batch_us_per_step": min(batch)}
+    print(f"summary  first pass {first:6.2f}  steady {steady:6.2f}  batch {min(batch):6.2f} us/step",
+          file=sys.stderr)
+    return {"config": vars(args), "result": result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cost of observation summaries.")
+    parser.add_argument("--steps", type=int, default=3000, help="Steps in the synthetic episode")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes; the fastest is reported")
+    args = parser.parse_args()
+    json.dump(main(args), sys.stdout, indent=2)
+    print()
@@ -0,0 +1,72 @@
+"""Synthetic football observations for the benchmark scripts.
+
+The layout mirrors `FootballEnvCore._retrieve_observation` for an 11 vs 11
+game with one controlled player per team, so benchmarks can run without the
+game engine installed.
+"""
+import numpy as np
+
+PLAYERS = 11
+
+
+def synthetic_observation(rng, step=0, previous=None):
+    """Return one observation dict; with `previous`, players drift slightly from it."""
+    if previous is None:
+        left, right = rng.uniform(-1, 1, (PLAYERS, 2)), rng.uniform(-0.42, 0.42, (PLAYERS, 2))
+        ball = np.array([0.0, 0.0, 0.1])
+        roles = np.array([0, 1, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+        score, owner = [0, 0], (-1, -1)
+        tired = {'left_team': np.zeros(PLAYERS), 'right_team': np.zeros(PLAYERS)}
+        sticky = [np.zeros(10, dtype=np.uint8), np.zeros(10, dtype=np.uint8)]
+        controlled = [int(rng.integers(0, PLAYERS)), int(rng.integers(0, PLAYERS))]
+    else:
+        left = previous['left_team'] + rng.normal(0, 0.005, (PLAYERS, 2))
+        right = previous['right_team'] + rng.normal(0, 0.005, (PLAYERS, 2))
+        ball = previous['ball'] + np.append(rng.normal(0, 0.01, 2), 0.0)
+        roles = previous['left_team_roles']
+        score = list(previous['score'])
+        owner = (previous['ball_owned_team'], previous['ball_owned_player'])
+        if rng.random() < 0.02:
+            owner = (int(rng.integers(0, 2)), int(rng.integers(0, PLAYERS)))
+        tired = {name: previous[f'{name}_tired_factor'] for name in ('left_team', 'right_team')}
+        if step % 10 == 0:
+            tired = {name: np.minimum(factor + 0.001, 1.0) for name, factor in tired.items()}
+        sticky = [previous['left_agent_sticky_actions'][0], previous['right_agent_sticky_actions'][0]]
+        controlled = [previous['left_agent_controlled_player'][0], previous['right_agent_controlled_player'][0]]
+        for i in range(2):
+            if rng.random() < 0.05:
+                sticky[i] = (rng.random(10) < 0.1).astype(np.uint8)
+            if rng.random() < 0.02:
+                controlled[i] = int(rng.integers(0, PLAYERS))
+    observation = {
+        'ball': ball,
+        'ball_direction': rng.normal(0, 0.01, 3),
+        'ball_rotation': rng.normal(0, 0.01, 3),
+        'left_agent_sticky_actions': [sticky[0]],
+        'left_agent_controlled_player': [controlled[0]],
+        'right_agent_sticky_actions': [sticky[1]],
+        'right_agent_controlled_player': [controlled[1]],
+        'game_mode': 0,
+        'score': score,
+        'ball_owned_team': owner[0],
+        'ball_owned_player': owner[1],
+        'steps_left': 3000 - step,
+    }
+    for name, positions in (('left_team', left), ('right_team', right)):
+        observation[name] = positions
+        observation[f'{name}_direction'] = rng.normal(0, 0.01, (PLAYERS, 2))
+        observation[f'{name}_tired_factor'] = tired[name]
+        observation[f'{name}_active'] = np.ones(PLAYERS, dtype=bool)
+        observation[f'{name}_yellow_card'] = np.zeros(PLAYERS, dtype=bool)
+        observation[f'{name}_roles'] = roles
+        observation[f'{name}_designated_player'] = owner[1] if owner[0] >= 0 else 0
+    return observation
+
+
+def synthetic_episode(steps, seed=0):
+    rng = np.random.default_rng(seed)
+    episode, observation = [], None
+    for step in range(steps):
+        observation = synthetic_observation(rng, step, observation)
+        episode.append(observation)
+    return episode
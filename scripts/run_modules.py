@@ -1,6 +1,13 @@
 import argparse
+import http.client
+import signal
+import socket
 import subprocess
 import os
+import sys
+import threading
+import time
+import urllib.request
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -22,6 +29,7 @@ MODULES = {
         'dir': '.',
         'main': 'module_b.main:app',
         'port_var': 'MODULE_B_PORT',
+        'url_var': 'MODULE_B_URL',
         'desc': 'Module B (calls Module C)',
         'required_env': ['MODULE_B_PORT', 'MODULE_C_URL']
     },
@@ -29,21 +37,215 @@ MODULES = {
         'dir': '.',
         'main': 'module_c.main:app',
         'port_var': 'MODULE_C_PORT',
+        'url_var': 'MODULE_C_URL',
         'desc': 'Module C (returns result)',
         'required_env': ['MODULE_C_PORT']
     }
 }
 
-def run_module(key):
+# Downstream modules first, so each module finds its dependency up when it starts.
+STARTUP_ORDER = ['c', 'b', 'a']
+
+# uvicorn waits for open responses before shutting down, and Module C's
+# Server-Sent Events feeds never end on their own; cut them off after this.
+GRACEFUL_SHUTDOWN_SECONDS = 5
+
+def socket_path(key):
+    """Unix socket a module listens on when the URL its callers use is unix:///path."""
+    var = MODULES[key].get('url_var')
+    # MODULE_C_URL may list replicas; the first unix:// entry is the local one.
+    for url in os.environ.get(var, "").split(",") if var else []:
+        url = url.strip()
+        if url.startswith("unix://"):
+            return url[len("unix://"):]
+    return None
+
+def listen_address(key):
+    path = socket_path(key)
+    return f"unix socket {path}" if path else f"port {os.environ[MODULES[key]['port_var']]}"
+
+def module_command(key, workers=None):
+    """uvicorn command line for a module: --reload in dev mode, --workers N in production."""
     mod = MODULES[key]
-    # Check required env vars
     for var in mod['required_env']:
         require_env(var)
-    port = os.environ[mod['port_var']]
-    print(f"Starting {mod['desc']} on port {port}...")
-    subprocess.Popen([
-        "uvicorn", mod['main'], "--host", "0.0.0.0", "--port", port, "--reload"
-    ], cwd=mod['dir'], env=os.environ.copy())
+    path = socket_path(key)
+    if key == 'b' and int(os.environ.get('MODULE_B_SHARDS', '1')) > 1:
+        # Match-partitioned shard processes replace uvicorn workers and reload.
+        if path:
+            raise RuntimeError("MODULE_B_SHARDS needs module B on a TCP port, not a unix:// MODULE_B_URL")
+        return [sys.executable, "-m", "module_b.shards"]
+    if path:
+        command = ["uvicorn", mod['main'], "--uds", path]
+    else:
+        command = ["uvicorn", mod['main'], "--host", "0.0.0.0", "--port", os.environ[mod['port_var']]]
+    command += ["--timeout-graceful-shutdown", str(GRACEFUL_SHUTDOWN_SECONDS)]
+    if workers is None:
+        command.append("--reload")
+    else:
+        command += ["--workers", str(workers)]
+    return command
+
+def run_module(key):
+    mod = MODULES[key]
+    command = module_command(key)
+    print(f"Starting {mod['desc']} on {listen_address(key)}...")
+    return subprocess.Popen(command, cwd=mod['dir'], env=os.environ.copy())
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def is_healthy(key, timeout=2.0):
+    path = socket_path(key)
+    try:
+        if path:
+            connection = UnixHTTPConnection(path, timeout)
+            try:
+                connection.request("GET", "/health")
+                return connection.getresponse().status == 200
+            finally:
+                connection.close()
+        port = os.environ[MODULES[key]['port_var']]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+class Supervisor:
+    """Runs modules without reload, restarting children that crash or stop answering /health.
+
+    The supervisor sleeps on an event between health checks, so it uses no CPU
+    while idle. SIGINT/SIGTERM are forwarded to the children as SIGTERM, in
+    reverse startup order, and children still running after `grace_period`
+    seconds are killed.
+    """
+
+    def __init__(self, keys, workers, health_interval=5.0, startup_timeout=30.0,
+                 max_health_failures=3, grace_period=10.0):
+        self.keys = [key for key in STARTUP_ORDER if key in keys]
+        self.workers = workers
+        self.health_interval = health_interval
+        self.startup_timeout = startup_timeout
+        self.max_health_failures = max_health_failures
+        self.grace_period = grace_period
+        self.processes = {}
+        self.health_failures = {key: 0 for key in self.keys}
+        self.restarts = {key: 0 for key in self.keys}
+        self._stopping = threading.Event()
+
+    def _spawn(self, key):
+        mod = MODULES[key]
+        command = module_command(key, self.workers[key])
+        print(f"Starting {mod['desc']} with {self.workers[key]} worker(s): {' '.join(command)}")
+        # A new session keeps terminal Ctrl+C away from the children; the
+        # supervisor forwards it itself so shutdown happens in order.
+        self.processes[key] = subprocess.Popen(command, cwd=mod['dir'], env=os.environ.copy(),
+                                               start_new_session=True)
+        self.health_failures[key] = 0
+
+    def _wait_healthy(self, key):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline and not self._stopping.is_set():
+            if self.processes[key].poll() is not None:
+                return False
+            if is_healthy(key):
+                return True
+            self._stopping.wait(0.2)
+        return False
+
+    def _handle_signal(self, signum, frame):
+        print(f"\nReceived {signal.Signals(signum).name}, shutting down.")
+        self._stopping.set()
+
+    def _restart(self, key, reason):
+        self.restarts[key] += 1
+        print(f"{MODULES[key]['desc']} {reason}; restarting (restart #{self.restarts[key]}).")
+        self._terminate(key)
+        # Back off on repeated crashes instead of restarting in a tight loop.
+        self._stopping.wait(min(30.0, 0.5 * 2 ** (self.restarts[key] - 1)))
+        if not self._stopping.is_set():
+            self._spawn(key)
+
+    def _signal_group(self, process, signum):
+        # Each child leads its own process group, which includes its uvicorn
+        # workers; signalling the group also reaches workers orphaned by a
+        # crashed master, which would otherwise keep the port bound.
+        try:
+            os.killpg(process.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _terminate(self, key):
+        process = self.processes.get(key)
+        if process is None:
+            return
+        if process.poll() is not None:
+            self._signal_group(process, signal.SIGKILL)
+            return
+        self._signal_group(process, signal.SIGTERM)
+        try:
+            process.wait(self.grace_period)
+        except subprocess.TimeoutExpired:
+            print(f"{MODULES[key]['desc']} did not stop in {self.grace_period}s; killing it.")
+            self._signal_group(process, signal.SIGKILL)
+            process.wait()
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        try:
+            for key in self.keys:
+                self._spawn(key)
+                if not self._wait_healthy(key):
+                    if not self._stopping.is_set():
+                        print(f"{MODULES[key]['desc']} did not become healthy within {self.startup_timeout}s.")
+                        self._stopping.set()
+                    return 1
+            print("All selected modules started. Press Ctrl+C to stop.")
+            while not self._stopping.wait(self.health_interval):
+                self._check()
+            return 0
+        finally:
+            for key in reversed(self.keys):
+                self._terminate(key)
+            print("All modules stopped.")
+
+    def _check(self):
+        for key in self.keys:
+            returncode = self.processes[key].poll()
+            if returncode is not None:
+                self._restart(key, f"exited with code {returncode}")
+            elif is_healthy(key):
+                self.health_failures[key] = 0
+                self.restarts[key] = 0
+            else:
+                self.health_failures[key] += 1
+                if self.health_failures[key] >= self.max_health_failures:
+                    self._restart(key, f"failed {self.health_failures[key]} health checks")
+            if self._stopping.is_set():
+                return
+
+def parse_workers(values, keys):
+    """Parse --workers values: a bare N sets every module, k=N sets module k."""
+    workers = {key: 1 for key in keys}
+    for value in values:
+        key, _, count = value.rpartition('=')
+        if key and key not in MODULES:
+            raise argparse.ArgumentTypeError(f"Unknown module in --workers: {key}")
+        if not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"Invalid worker count in --workers: {value}")
+        for target in ([key] if key else keys):
+            if target in workers:
+                workers[target] = int(count)
+    return workers
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run selected FastAPI modules.")
@@ -54,6 +256,25 @@ if __name__ == "__main__":
         required=True,
         help="Which modules to run (choose any of: a, b, c)"
     )
+    parser.add_argument(
+        "--prod",
+        action="store_true",
+        help="Production mode: no reload, multiple workers, health checks and automatic restarts"
+    )
+    parser.add_argument(
+        "--workers",
+        nargs='+',
+        default=[],
+        help="Worker processes in production mode, e.g. '4' for all modules or 'a=2 b=4 c=1'"
+    )
+    parser.add_argument("--health-interval", type=float, default=5.0,
+                        help="Seconds between health checks in production mode")
+    parser.add_argument("--startup-timeout", type=float, default=30.0,
+                        help="Seconds to wait for each module to become healthy in production mode")
+    parser.add_argument("--max-health-failures", type=int, default=3,
+                        help="Consecutive failed health checks before a module is restarted")
+    parser.add_argument("--grace-period", type=float, default=10.0,
+                        help="Seconds a module gets to shut down before it is killed")
     args = parser.parse_args()
 
     print("Using environment variables:")
@@ -62,12 +283,30 @@ if __name__ == "__main__":
             print(f"  {var}: {os.environ.get(var)}")
     print()
 
-    for key in args.modules:
-        run_module(key)
+    if args.prod:
+        try:
+            workers = parse_workers(args.workers, args.modules)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+        supervisor = Supervisor(
+            args.modules,
+            workers,
+            health_interval=args.health_interval,
+            startup_timeout=args.startup_timeout,
+            max_health_failures=args.max_health_failures,
+            grace_period=args.grace_period,
+        )
+        raise SystemExit(supervisor.run())
+
+    processes = [run_module(key) for key in args.modules]
 
     print("All selected modules started. Press Ctrl+C to stop.")
     try:
-        while True:
-            pass
+        for process in processes:
+            process.wait()
     except KeyboardInterrupt:
-        print("\nShutting down.") 
\ No newline at end of file
+        print("\nShutting down.")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()